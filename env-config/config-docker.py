@@ -137,6 +137,52 @@ SECURITYGROUP_INSTANCE_DETAIL = 'FULL'
 CORE_THREADS = 25
 MAX_THREADS = 30
 
+# Threads used by a single CloudAux watcher to slurp its accounts and regions in parallel.
+# 1 slurps every region sequentially.  SLURP_MAX_THREADS_PER_ACCOUNT (optional) caps the
+# number of regions of any one account that are slurped at the same time.
+SLURP_MAX_THREADS = 1
+SLURP_MAX_THREADS_PER_ACCOUNT = None
+
+# Threads used by a batched watcher to fetch the details of the items in a batch.
+# 1 fetches them one at a time.
+SLURP_BATCH_MAX_THREADS = 1
+
+# Batched watchers save their progress per account and technology, so a restarted job resumes
+# at the next unprocessed batch.  Progress older than this many seconds is thrown away.
+BATCH_CHECKPOINT_TTL = 86400
+
+# Assumed role credentials are cached and shared by all watchers in a process.
+# They are refreshed this many seconds before they expire.
+STS_REFRESH_BEFORE_EXPIRY = 300
+
+# Seconds before the cached list of regions for an account and service is refreshed (in the background).
+REGION_CACHE_TTL = 86400
+
+# AWS calls are paced per (account, region, service) by a rate limiter shared by all watchers.
+# Each key starts at AWS_RATE_LIMIT_INITIAL calls per second.  Every throttled call multiplies the
+# rate by AWS_RATE_LIMIT_DECREASE and every successful call adds AWS_RATE_LIMIT_INCREASE to it,
+# within [AWS_RATE_LIMIT_MIN, AWS_RATE_LIMIT_MAX].
+AWS_RATE_LIMIT_INITIAL = 50
+AWS_RATE_LIMIT_MIN = 0.5
+AWS_RATE_LIMIT_MAX = 100
+AWS_RATE_LIMIT_INCREASE = 0.05
+AWS_RATE_LIMIT_DECREASE = 0.5
+
+# The auditors look up which account an S3 bucket, user ID, VPC, VPC endpoint or CIDR belongs to.
+# Items changed since the last load are picked up at most every OBJECT_STORE_CHECK_INTERVAL seconds,
+# and everything is reloaded every OBJECT_STORE_TTL seconds.
+OBJECT_STORE_CHECK_INTERVAL = 60
+OBJECT_STORE_TTL = 86400
+
+# The expanded actions and action summaries of IAM statements are shared by every statement with the
+# same actions.  This many of them are kept.
+POLICY_ACTION_CACHE_SIZE = 10000
+
+# Processes used by an auditor to run its checks.  With more than 1, the items are split across a pool of
+# worker processes and the issues they find are merged back in item order.  The workers are forked when the
+# scheduler or the audit_changes command starts, before any database connection is opened or thread started.
+AUDIT_PROCESSES = 1
+
 # SSO SETTINGS:
 ACTIVE_PROVIDERS = [] # "ping", "google" or "onelogin"
 if os.getenv('SECURITY_MONKEY_ACTIVE_PROVIDERS'):
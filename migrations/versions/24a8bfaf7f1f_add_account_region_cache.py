@@ -0,0 +1,34 @@
+"""Add the account_region_cache table for cached region discovery.
+
+Revision ID: 24a8bfaf7f1f
+Revises: 8cf43589ca8b
+Create Date: 2026-10-17 09:12:40.114512
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '24a8bfaf7f1f'
+down_revision = '8cf43589ca8b'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table('account_region_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('service', sa.String(length=64), nullable=False),
+        sa.Column('regions', postgresql.JSON(), nullable=True),
+        sa.Column('date_refreshed', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('account_id', 'service')
+    )
+    op.create_index('ix_account_region_cache_account_id', 'account_region_cache', ['account_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_account_region_cache_account_id', table_name='account_region_cache')
+    op.drop_table('account_region_cache')
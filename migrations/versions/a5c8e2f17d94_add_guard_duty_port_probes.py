@@ -0,0 +1,57 @@
+"""Add the guarddutyportprobe table.
+
+Run `monkey store_guard_duty_port_probes` after upgrading to extract the port probes of the
+findings that are already stored.
+
+Revision ID: a5c8e2f17d94
+Revises: f3b6d9a2c4e1
+Create Date: 2026-10-17 20:12:05.118342
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a5c8e2f17d94'
+down_revision = 'f3b6d9a2c4e1'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('guarddutyportprobe',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('account_identifier', sa.String(length=32), nullable=True),
+        sa.Column('region', sa.String(length=32), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('severity', sa.Float(), nullable=True),
+        sa.Column('probe_count', sa.Integer(), nullable=True),
+        sa.Column('first_seen', sa.String(length=32), nullable=True),
+        sa.Column('last_seen', sa.String(length=32), nullable=True),
+        sa.Column('resource_type', sa.String(length=64), nullable=True),
+        sa.Column('instance_id', sa.String(length=64), nullable=True),
+        sa.Column('instance_name', sa.String(length=256), nullable=True),
+        sa.Column('local_port', sa.Integer(), nullable=True),
+        sa.Column('local_port_name', sa.String(length=64), nullable=True),
+        sa.Column('remote_ip_v4', sa.String(length=45), nullable=True),
+        sa.Column('lat', sa.Float(), nullable=True),
+        sa.Column('lon', sa.Float(), nullable=True),
+        sa.Column('city_name', sa.String(length=128), nullable=True),
+        sa.Column('country_name', sa.String(length=128), nullable=True),
+        sa.Column('asn', sa.String(length=32), nullable=True),
+        sa.Column('asn_org', sa.String(length=256), nullable=True),
+        sa.Column('isp', sa.String(length=256), nullable=True),
+        sa.Column('org', sa.String(length=256), nullable=True),
+        sa.ForeignKeyConstraint(['item_id'], ['item.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_guarddutyportprobe_item_id', 'guarddutyportprobe', ['item_id'], unique=True)
+    op.create_index('ix_guarddutyportprobe_country_name', 'guarddutyportprobe', ['country_name'], unique=False)
+    op.create_index('ix_guarddutyportprobe_lat_lon', 'guarddutyportprobe', ['lat', 'lon'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_guarddutyportprobe_lat_lon', table_name='guarddutyportprobe')
+    op.drop_index('ix_guarddutyportprobe_country_name', table_name='guarddutyportprobe')
+    op.drop_index('ix_guarddutyportprobe_item_id', table_name='guarddutyportprobe')
+    op.drop_table('guarddutyportprobe')
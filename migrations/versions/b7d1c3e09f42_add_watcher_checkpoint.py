@@ -0,0 +1,36 @@
+"""Add the watcher_checkpoint table so batched watchers can resume.
+
+Revision ID: b7d1c3e09f42
+Revises: 24a8bfaf7f1f
+Create Date: 2026-10-17 10:02:17.381904
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b7d1c3e09f42'
+down_revision = '24a8bfaf7f1f'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table('watcher_checkpoint',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('tech_id', sa.Integer(), nullable=False),
+        sa.Column('total_list', postgresql.JSON(), nullable=True),
+        sa.Column('batched_size', sa.Integer(), nullable=False),
+        sa.Column('batch_counter', sa.Integer(), nullable=False),
+        sa.Column('date_created', sa.DateTime(), nullable=False),
+        sa.Column('date_updated', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+        sa.ForeignKeyConstraint(['tech_id'], ['technology.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('account_id', 'tech_id')
+    )
+
+
+def downgrade():
+    op.drop_table('watcher_checkpoint')
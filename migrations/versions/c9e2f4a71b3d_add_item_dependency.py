@@ -0,0 +1,34 @@
+"""Add the itemdependency table so changed support items only reaudit their dependents.
+
+Revision ID: c9e2f4a71b3d
+Revises: b7d1c3e09f42
+Create Date: 2026-10-17 14:21:40.518237
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c9e2f4a71b3d'
+down_revision = 'b7d1c3e09f42'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('itemdependency',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('auditor_class', sa.String(length=128), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('support_item_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['item_id'], ['item.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['support_item_id'], ['item.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_itemdependency_item_id', 'itemdependency', ['item_id'], unique=False)
+    op.create_index('ix_itemdependency_support_item_id', 'itemdependency', ['support_item_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_itemdependency_support_item_id', table_name='itemdependency')
+    op.drop_index('ix_itemdependency_item_id', table_name='itemdependency')
+    op.drop_table('itemdependency')
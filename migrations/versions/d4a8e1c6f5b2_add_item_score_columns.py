@@ -0,0 +1,50 @@
+"""Store the item scores and issue counts on the item table, and backfill them.
+
+Revision ID: d4a8e1c6f5b2
+Revises: c9e2f4a71b3d
+Create Date: 2026-10-17 15:03:12.904416
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8e1c6f5b2'
+down_revision = 'c9e2f4a71b3d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+BACKFILL = """
+UPDATE item
+SET score = totals.score,
+    unjustified_score = totals.unjustified_score,
+    issue_count = totals.issue_count
+FROM (
+    SELECT itemaudit.item_id,
+           SUM(itemaudit.score) AS score,
+           COALESCE(SUM(CASE WHEN itemaudit.justified = FALSE THEN itemaudit.score END), 0) AS unjustified_score,
+           COUNT(itemaudit.id) AS issue_count
+    FROM itemaudit
+    JOIN auditorsettings ON itemaudit.auditor_setting_id = auditorsettings.id
+    WHERE itemaudit.fixed = FALSE AND auditorsettings.disabled = FALSE
+    GROUP BY itemaudit.item_id
+) AS totals
+WHERE item.id = totals.item_id
+"""
+
+
+def upgrade():
+    op.add_column('item', sa.Column('score', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('item', sa.Column('unjustified_score', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('item', sa.Column('issue_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(BACKFILL)
+    op.create_index('ix_item_score', 'item', ['score'], unique=False)
+    op.create_index('ix_item_unjustified_score', 'item', ['unjustified_score'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_item_unjustified_score', table_name='item')
+    op.drop_index('ix_item_score', table_name='item')
+    op.drop_column('item', 'issue_count')
+    op.drop_column('item', 'unjustified_score')
+    op.drop_column('item', 'score')
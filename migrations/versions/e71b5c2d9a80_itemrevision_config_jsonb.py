@@ -0,0 +1,28 @@
+"""Store itemrevision.config as JSONB, with GIN indexes for the searchconfig filters.
+
+Revision ID: e71b5c2d9a80
+Revises: d4a8e1c6f5b2
+Create Date: 2026-10-17 15:48:26.117052
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e71b5c2d9a80'
+down_revision = 'd4a8e1c6f5b2'
+
+from alembic import op
+
+
+def upgrade():
+    op.execute('ALTER TABLE itemrevision ALTER COLUMN config TYPE JSONB USING config::jsonb')
+    # Containment (@>) and JSONPath (@?) searches:
+    op.execute('CREATE INDEX ix_itemrevision_config_path_ops ON itemrevision USING gin (config jsonb_path_ops)')
+    # Substring searches (ILIKE) on the config text:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE INDEX ix_itemrevision_config_trgm ON itemrevision USING gin ((config::text) gin_trgm_ops)')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_itemrevision_config_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_itemrevision_config_path_ops')
+    op.execute('ALTER TABLE itemrevision ALTER COLUMN config TYPE JSON USING config::json')
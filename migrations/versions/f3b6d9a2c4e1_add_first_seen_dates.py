@@ -0,0 +1,56 @@
+"""Store when items and issues were first seen, and backfill them.
+
+Revision ID: f3b6d9a2c4e1
+Revises: e71b5c2d9a80
+Create Date: 2026-10-17 18:41:27.530918
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f3b6d9a2c4e1'
+down_revision = 'e71b5c2d9a80'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+BACKFILL_ITEMS = """
+UPDATE item
+SET first_seen = revisions.first_seen
+FROM (
+    SELECT item_id, MIN(date_created) AS first_seen
+    FROM itemrevision
+    GROUP BY item_id
+) AS revisions
+WHERE item.id = revisions.item_id
+"""
+
+# Items without any revisions:
+BACKFILL_REMAINING_ITEMS = "UPDATE item SET first_seen = (now() AT TIME ZONE 'utc') WHERE first_seen IS NULL"
+
+# When an issue was created was never recorded, so existing issues get the date their item was first seen:
+BACKFILL_ISSUES = """
+UPDATE itemaudit
+SET date_created = item.first_seen
+FROM item
+WHERE itemaudit.item_id = item.id
+"""
+
+
+def upgrade():
+    op.add_column('item', sa.Column('first_seen', sa.DateTime(), nullable=True))
+    op.add_column('itemaudit', sa.Column('date_created', sa.DateTime(), nullable=True))
+    op.execute(BACKFILL_ITEMS)
+    op.execute(BACKFILL_REMAINING_ITEMS)
+    op.execute(BACKFILL_ISSUES)
+    op.alter_column('item', 'first_seen', nullable=False)
+    op.alter_column('itemaudit', 'date_created', nullable=False)
+    op.create_index('ix_item_first_seen', 'item', ['first_seen'], unique=False)
+    op.create_index('ix_itemaudit_date_created', 'itemaudit', ['date_created'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_itemaudit_date_created', table_name='itemaudit')
+    op.drop_index('ix_item_first_seen', table_name='item')
+    op.drop_column('itemaudit', 'date_created')
+    op.drop_column('item', 'first_seen')
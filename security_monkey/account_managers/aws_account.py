@@ -42,10 +42,13 @@ class AWSAccountManager(AccountManager):
                        'requires a \'list_buckets\' API call against AWS to obtain.')
     role_name_label = ("Optional custom role name, otherwise the default 'SecurityMonkey' is used. "
                        "When deploying roles via CloudFormation, this is the Physical ID of the generated IAM::ROLE.")
+    skip_regions_label = ("Optional comma separated list of regions that Security Monkey should never scan "
+                          "in this account, such as opt-in regions that are not enabled.")
     custom_field_configs = [
         CustomFieldConfig('canonical_id', "Canonical ID", True, s3_canonical_id),
         CustomFieldConfig('s3_name', 'S3 Name', True, s3_name_label),
-        CustomFieldConfig('role_name', 'Role Name', True, role_name_label)
+        CustomFieldConfig('role_name', 'Role Name', True, role_name_label),
+        CustomFieldConfig('skip_regions', 'Skip Regions', True, skip_regions_label)
     ]
 
     def __init__(self):
@@ -27,17 +27,22 @@ from security_monkey import app, db
 from security_monkey.watcher import ChangeItem
 from security_monkey.common.jinja import get_jinja_env
 from security_monkey.datastore import User, AuditorSettings, Item, ItemAudit, Technology, Account, ItemAuditScore, AccountPatternAuditScore
+from security_monkey.datastore import ItemDependency, update_item_scores
 from security_monkey.common.utils import send_email
 from security_monkey.account_manager import get_account_by_name
 from security_monkey.alerters.custom_alerter import report_auditor_changes
-from security_monkey.datastore import Account, Item, Technology, NetworkWhitelistEntry
+from security_monkey.datastore import Account, Item, Technology
+from security_monkey.common.object_store import ObjectStore
+from security_monkey.common.config_hash import hash_config
+from security_monkey.common.policy_cache import CachedPolicy
+from security_monkey.common.audit_pool import audit_in_processes
 from policyuniverse.arn import ARN
-from sqlalchemy import and_
+from sqlalchemy import and_, exists, inspect, or_
+from sqlalchemy.orm import joinedload, subqueryload
+from sqlalchemy.orm.attributes import set_committed_value
 from collections import defaultdict
-from threading import Lock
+import datetime
 import json
-import netaddr
-import ipaddr
 import re
 
 
@@ -141,15 +146,6 @@ class AuditorType(type):
                     auditor_registry[cls.index].append(cls)
 
 
-def add(to, key, value):
-    if not key:
-        return
-    if key in to:
-        to[key].add(value)
-    else:
-        to[key] = set([value])
-
-
 class Auditor(object):
     """
     This class (and subclasses really) run a number of rules against the configurations
@@ -162,8 +158,11 @@ class Auditor(object):
     __metaclass__ = AuditorType
     support_auditor_indexes = []
     support_watcher_indexes = []
-    OBJECT_STORE = defaultdict(dict)
-    OBJECT_STORE_LOCK = Lock()
+    # Support indexes whose items the checks pass to add_support_dependencies.  A change to one
+    # of these only reaudits the items that depended on the changed support items.  New support
+    # items are assumed to matter only once an item referencing them changes (and is audited).
+    support_dependency_indexes = []
+    OBJECT_STORE = ObjectStore()
 
     def __init__(self, accounts=None, debug=False):
         self.datastore = datastore.Datastore()
@@ -174,7 +173,11 @@ class Auditor(object):
         self.emails = []
         self.current_support_items = {}
         self.override_scores = None
+        self.account_override_scores = {}
         self.current_method_name = None
+        self.same_accounts = {}
+        self.policy_cache = None
+        self.config_hashes = {}
 
         if type(self.team_emails) in (str, unicode):
             self.emails.append(self.team_emails)
@@ -200,10 +203,27 @@ class Auditor(object):
         item in this list is the dpath to one of the resource policies.
         
         The `policy_keys` defaults to ['Policy'] unless overriden by a subclass.
+
+        While audit_objects runs, the policies are parsed once per item and shared by
+        all of the checks, along with anything the checks compute from them.  The item's
+        config is hashed once per audit pass for the cache key.
         
         Returns:
             list of Policy objects
         """
+        if self.policy_cache is None:
+            return self._parse_policies(item, policy_keys)
+
+        config_hash = self.config_hashes.get(id(item))
+        if config_hash is None:
+            config_hash = self.config_hashes[id(item)] = hash_config(item.config)
+
+        key = (id(item), tuple(policy_keys), config_hash)
+        if key not in self.policy_cache:
+            self.policy_cache[key] = [CachedPolicy(policy) for policy in self._parse_policies(item, policy_keys)]
+        return list(self.policy_cache[key])
+
+    def _parse_policies(self, item, policy_keys):
         import dpath.util
         from dpath.exceptions import PathNotFound
         from policyuniverse.policy import Policy
@@ -266,180 +286,25 @@ class Auditor(object):
 
     @classmethod
     def _load_object_store(cls):
-        with cls.OBJECT_STORE_LOCK:
-            if not cls.OBJECT_STORE:
-                cls._load_s3_buckets()
-                cls._load_userids()
-                cls._load_accounts()
-                cls._load_elasticips()
-                cls._load_vpcs()
-                cls._load_vpces()
-                cls._load_natgateways()
-                cls._load_network_whitelist()
-                cls._merge_cidrs()
-
-
-    @classmethod
-    def _merge_cidrs(cls):
-        """
-        We learned about CIDRs from the following functions:
-        -   _load_elasticips()
-        -   _load_vpcs()
-        -   _load_vpces()
-        -   _load_natgateways()
-        -   _load_network_whitelist()
-
-        These cidr's are stored in the OBJECT_STORE in a way that is not optimal:
-
-            OBJECT_STORE['cidr']['54.0.0.1'] = set(['123456789012'])
-            OBJECT_STORE['cidr']['54.0.0.0'] = set(['123456789012'])
-            ...
-            OBJECT_STORE['cidr']['54.0.0.255/32'] = set(['123456789012'])
-
-        The above example is attempting to illustrate that account `123456789012`
-        contains `54.0.0.0/24`, maybe from 256 elastic IPs.
-
-        If a resource policy were attempting to ingress this range as a `/24` instead
-        of as individual IPs, it would not work.  We need to use the `cidr_merge`
-        method from the `netaddr` library.  We need to preserve the account identifiers
-        that are associated with each cidr as well.
-
-        # Using:
-        # https://netaddr.readthedocs.io/en/latest/tutorial_01.html?highlight=summarize#summarizing-list-of-addresses-and-subnets
-        # import netaddr
-        # netaddr.cidr_merge(ip_list)
-
-        Step 1: Group CIDRs by account:
-        #   ['123456789012'] = ['IP', 'IP']
-
-        Step 2:
-        Merge each account's cidr's separately and repalce the OBJECT_STORE['cidr'] entry.
-
-        Return:
-            `None`.  Mutates the cls.OBJECT_STORE['cidr'] datastructure.
-        """
-        if not 'cidr' in cls.OBJECT_STORE:
-            return
-
-        # step 1
-        merged = defaultdict(set)
-        for cidr, accounts in cls.OBJECT_STORE['cidr'].items():
-            for account in accounts:
-                merged[account].add(cidr)
-
-        del cls.OBJECT_STORE['cidr']
-
-        # step 2
-        for account, cidrs in merged.items():
-            merged_cidrs = netaddr.cidr_merge(cidrs)
-            for cidr in merged_cidrs:
-                add(cls.OBJECT_STORE['cidr'], str(cidr), account)
-
-    @classmethod
-    def _load_s3_buckets(cls):
-        """Store the S3 bucket ARNs from all our accounts"""
-        results = cls._load_related_items('s3')
-        for item in results:
-            add(cls.OBJECT_STORE['s3'], item.name, item.account.identifier)
-
-    @classmethod
-    def _load_vpcs(cls):
-        """Store the VPC IDs. Also, extract & store network/NAT ranges."""
-        results = cls._load_related_items('vpc')
-        for item in results:
-            add(cls.OBJECT_STORE['vpc'], item.latest_config.get('id'), item.account.identifier)
-            add(cls.OBJECT_STORE['cidr'], item.latest_config.get('cidr_block'), item.account.identifier)
-
-            vpcnat_tags = unicode(item.latest_config.get('tags', {}).get('vpcnat', ''))
-            vpcnat_tag_cidrs = vpcnat_tags.split(',')
-            for vpcnat_tag_cidr in vpcnat_tag_cidrs:
-                add(cls.OBJECT_STORE['cidr'], vpcnat_tag_cidr.strip(), item.account.identifier)
-
-    @classmethod
-    def _load_vpces(cls):
-        """Store the VPC Endpoint IDs."""
-        results = cls._load_related_items('endpoint')
-        for item in results:
-            add(cls.OBJECT_STORE['vpce'], item.latest_config.get('id'), item.account.identifier)
-
-    @classmethod
-    def _load_elasticips(cls):
-        """Store the Elastic IPs."""
-        results = cls._load_related_items('elasticip')
-        for item in results:
-            add(cls.OBJECT_STORE['cidr'], item.latest_config.get('public_ip'), item.account.identifier)
-            add(cls.OBJECT_STORE['cidr'], item.latest_config.get('private_ip_address'), item.account.identifier)
-
-    @classmethod
-    def _load_natgateways(cls):
-        """Store the NAT Gateway CIDRs."""
-        results = cls._load_related_items('natgateway')
-        for gateway in results:
-            for address in gateway.latest_config.get('nat_gateway_addresses', []):
-                add(cls.OBJECT_STORE['cidr'], address['public_ip'], gateway.account.identifier)
-                add(cls.OBJECT_STORE['cidr'], address['private_ip'], gateway.account.identifier)
-
-    @classmethod
-    def _load_network_whitelist(cls):
-        """Stores the Network Whitelist CIDRs."""
-        whitelist_entries = NetworkWhitelistEntry.query.all()
-        for entry in whitelist_entries:
-            add(cls.OBJECT_STORE['cidr'], entry.cidr, '000000000000')
-
-    @classmethod
-    def _load_userids(cls):
-        """Store the UserIDs from all IAMUsers and IAMRoles."""
-        user_results = cls._load_related_items('iamuser')
-        role_results = cls._load_related_items('iamrole')
-
-        for item in user_results:
-            add(cls.OBJECT_STORE['userid'], item.latest_config.get('UserId'), item.account.identifier)
-
-        for item in role_results:
-            add(cls.OBJECT_STORE['userid'], item.latest_config.get('RoleId'), item.account.identifier)
-
-    @classmethod
-    def _load_accounts(cls):
-        """Store the account IDs of all friendly/thirdparty accounts."""
-        friendly_accounts = Account.query.filter(Account.third_party == False).all()
-        third_party = Account.query.filter(Account.third_party == True).all()
-
-        cls.OBJECT_STORE['ACCOUNTS']['DESCRIPTIONS'] = list()
-        cls.OBJECT_STORE['ACCOUNTS']['FRIENDLY'] = set()
-        cls.OBJECT_STORE['ACCOUNTS']['THIRDPARTY'] = set()
-
-        for account in friendly_accounts:
-            add(cls.OBJECT_STORE['ACCOUNTS'], 'FRIENDLY', account.identifier)
-            cls.OBJECT_STORE['ACCOUNTS']['DESCRIPTIONS'].append(dict(
-                name=account.name,
-                identifier=account.identifier,
-                label='friendly',
-                s3_name=account.getCustom('s3_name'),
-                s3_canonical_id=account.getCustom('canonical_id')))
-
-        for account in third_party:
-            add(cls.OBJECT_STORE['ACCOUNTS'], 'THIRDPARTY', account.identifier)
-            cls.OBJECT_STORE['ACCOUNTS']['DESCRIPTIONS'].append(dict(
-                name=account.name,
-                identifier=account.identifier,
-                label='thirdparty',
-                s3_name=account.getCustom('s3_name'),
-                s3_canonical_id=account.getCustom('canonical_id')))
-
-    @staticmethod
-    def _load_related_items(technology_name):
-        query = Item.query.join((Technology, Technology.id == Item.tech_id))
-        query = query.filter(Technology.name==technology_name)
-        return query.all()
+        cls.OBJECT_STORE.refresh()
 
     def _get_account(self, key, value):
         """ _get_account('s3_name', 'blah') """
         if key == 'aws':
             return dict(name='AWS', identifier='AWS')
-        for account in self.OBJECT_STORE['ACCOUNTS']['DESCRIPTIONS']:
+        accounts = self.OBJECT_STORE['ACCOUNTS']
+        if key in accounts['BY_FIELD']:
+            return accounts['BY_FIELD'][key].get(value.lower())
+        for account in accounts['DESCRIPTIONS']:
             if unicode(account.get(key, '')).lower() == value.lower():
                 return account
 
+    def _get_same_account(self, account_name):
+        """ The Account an item is in.  These are cached for the rest of the audit. """
+        if account_name not in self.same_accounts:
+            self.same_accounts[account_name] = Account.query.filter(Account.name == account_name).first()
+        return self.same_accounts[account_name]
+
     def inspect_entity(self, entity, item):
         """A entity can represent an:
         
@@ -458,7 +323,7 @@ class Auditor(object):
             'FRIENDLY' - The who is in an account Security Monkey knows about.
             'UNKNOWN' - The who is in an account Security Monkey does not know about.
         """
-        same = Account.query.filter(Account.name == item.account).first()
+        same = self._get_same_account(item.account)
 
         if entity.category in ['arn', 'principal']:
             return self.inspect_entity_arn(entity, same, item)
@@ -497,11 +362,10 @@ class Auditor(object):
     def inspect_entity_account(self, entity, account_number, same):
 
         # Enrich the entity with account data if available.
-        for account in self.OBJECT_STORE['ACCOUNTS']['DESCRIPTIONS']:
-            if account['identifier'] == account_number:
-                entity.account_name = account['name']
-                entity.account_identifier = account['identifier']
-                break
+        account = self.OBJECT_STORE['ACCOUNTS']['BY_IDENTIFIER'].get(account_number)
+        if account:
+            entity.account_name = account['name']
+            entity.account_identifier = account['identifier']
 
         if account_number == '000000000000':
             return 'SAME'
@@ -527,10 +391,8 @@ class Auditor(object):
 
     def inspect_entity_cidr(self, entity, same):
         values = set()
-        for str_cidr in self.OBJECT_STORE.get('cidr', []):
-            if ipaddr.IPNetwork(entity.value) in ipaddr.IPNetwork(str_cidr):
-                for account in self.OBJECT_STORE['cidr'].get(str_cidr, []):
-                    values.add(self.inspect_entity_account(entity, account, same))
+        for account in self.OBJECT_STORE['cidr_index'].lookup(entity.value):
+            values.add(self.inspect_entity_account(entity, account, same))
         if not values:
             return set(['UNKNOWN'])
         return values
@@ -611,9 +473,8 @@ class Auditor(object):
         if notes and len(notes) > 1024:
             notes = notes[0:1024]
 
-        if not self.override_scores:
-            query = ItemAuditScore.query.filter(ItemAuditScore.technology == self.index)
-            self.override_scores = query.all()
+        if self.override_scores is None:
+            self._load_override_scores()
 
         # Check for override scores to apply
         score = self._check_for_override_score(score, item.account)
@@ -646,112 +507,182 @@ class Auditor(object):
         Subclasses must ensure this is called through super.
         """
         self._load_object_store()
+        self.same_accounts = {}
 
     def audit_objects(self):
         """
         Inspect all of the auditor's items.
         """
         app.logger.debug("Asked to audit {} Objects".format(len(self.items)))
+        methods = self.prepare_checks()
+
+        processes = app.config.get('AUDIT_PROCESSES', 1)
+        if not (processes > 1 and len(self.items) > 1 and audit_in_processes(self, methods)):
+            for item in self.items:
+                self.run_checks(item, methods)
+
+        self.policy_cache = None
+        self.config_hashes = {}
+        self.override_scores = None
+
+    def prepare_checks(self):
+        """
+        Loads what the checks need and returns the enabled (method name, method) checks.
+        The audit workers call this on their own copy of the auditor.
+        """
         self.prep_for_audit()
         self.current_support_items = {}
-        query = ItemAuditScore.query.filter(ItemAuditScore.technology == self.index)
-        self.override_scores = query.all()
-
-        methods = [getattr(self, method_name) for method_name in dir(self) if method_name.find("check_") == 0]
+        self._load_override_scores()
+
+        # If the check function is disabled by an entry on Settings/Audit Issue Scores
+        # the function will not be run and any previous issues will be cleared
+        methods = []
+        for method_name in self.get_check_names():
+            self.current_method_name = method_name
+            if not self._is_current_method_disabled():
+                methods.append((method_name, getattr(self, method_name)))
         app.logger.debug("methods: {}".format(methods))
-        for item in self.items:
-            for method in methods:
-                self.current_method_name = method.func_name
-                # If the check function is disabled by an entry on Settings/Audit Issue Scores
-                # the function will not be run and any previous issues will be cleared
-                if not self._is_current_method_disabled():
-                    method(item)
 
-        self.override_scores = None
+        self.policy_cache = {}
+        self.config_hashes = {}
+        return methods
+
+    def run_checks(self, item, methods):
+        """ Runs the (method name, method) checks on the item, in order. """
+        item.support_item_ids = set()
+        for method_name, method in methods:
+            self.current_method_name = method_name
+            method(item)
+
+    @classmethod
+    def get_check_names(cls):
+        """ The names of the auditor's check_ methods.  These are only looked up once per auditor class. """
+        if 'check_names' not in cls.__dict__:
+            cls.check_names = tuple([name for name in dir(cls) if name.startswith('check_')])
+        return cls.check_names
+
+    def _load_override_scores(self):
+        """
+        Loads the Audit Issue Scores settings for this auditor's technology, keyed by method.
+        The score that applies to each method and account is worked out once per audit run.
+        """
+        query = ItemAuditScore.query.filter(ItemAuditScore.technology == self.index)
+        self.override_scores = {override_score.method: override_score for override_score in query.all()}
+        self.account_override_scores = {}
+
+    def _get_current_override_score(self):
+        if not self.override_scores or self.current_method_name is None:
+            return None
+        return self.override_scores.get(self.current_method_name + ' (' + self.__class__.__name__ + ')')
 
     def _is_current_method_disabled(self):
         """
         Determines whether this method has been marked as disabled based on Audit Issue Scores
         settings.
         """
-        for override_score in self.override_scores:
-            if override_score.method == self.current_method_name + ' (' + self.__class__.__name__ + ')':
-                return override_score.disabled
-
-        return False
+        override_score = self._get_current_override_score()
+        return bool(override_score and override_score.disabled)
 
     def read_previous_items(self):
         """
         Pulls the last-recorded configuration from the database.
         :return: List of all items for the given technology and the given account.
         """
-        prev_list = []
-        for account in self.accounts:
-            prev = self.datastore.get_all_ctype_filtered(tech=self.index, account=account, include_inactive=False)
-            # Returns a map of {Item: ItemRevision}
-            for item in prev:
-                item_revision = prev[item]
-                new_item = ChangeItem(index=self.index,
-                                      region=item.region,
-                                      account=item.account.name,
-                                      name=item.name,
-                                      arn=item.arn,
-                                      new_config=item_revision.config)
-                new_item.audit_issues = []
-                new_item.db_item = item
-                prev_list.append(new_item)
-        return prev_list
+        return list(self.iter_previous_items())
 
     def read_previous_items_for_account(self, index, account):
         """
         Pulls the last-recorded configuration from the database.
         :return: List of all items for the given technology and the given account.
         """
-        prev_list = []
-        prev = self.datastore.get_all_ctype_filtered(tech=index, account=account, include_inactive=False)
-        # Returns a map of {Item: ItemRevision}
-        for item in prev:
-            item_revision = prev[item]
-            new_item = ChangeItem(index=self.index,
-                                  region=item.region,
-                                  account=item.account.name,
-                                  name=item.name,
-                                  arn=item.arn,
-                                  new_config=item_revision.config)
-            new_item.audit_issues = []
-            new_item.db_item = item
-            prev_list.append(new_item)
-
-        return prev_list
+        return list(self._iter_previous_items(index, account))
+
+    def iter_previous_items(self):
+        """
+        Streams the last-recorded configuration from the database.
+        :return: Generator of all items for the given technology and the given accounts.
+        """
+        for account in self.accounts:
+            for item in self._iter_previous_items(self.index, account):
+                yield item
+
+    def _iter_previous_items(self, index, account):
+        # One joined query per account, with the configs loaded along with the items:
+        for item, item_revision in self.datastore.iter_all_ctype_filtered(tech=index, account=account,
+                                                                          include_inactive=False):
+            yield self._change_item(item, item_revision)
+
+    def _change_item(self, item, item_revision):
+        new_item = ChangeItem(index=self.index,
+                              region=item.region,
+                              account=item.account.name,
+                              name=item.name,
+                              arn=item.arn,
+                              new_config=item_revision.config)
+        new_item.audit_issues = []
+        new_item.db_item = item
+        return new_item
+
+    def read_dependent_items(self, support_item_ids):
+        """
+        Pulls the last-recorded configuration of the items that depended on any of the support
+        items when this auditor last audited them, along with the items it has never audited
+        with their dependencies recorded.
+        :return: List of those items for the given technology and the given accounts.
+        """
+        auditor_class = self.__class__.__name__
+        dependent = db.session.query(ItemDependency.item_id).filter(
+            ItemDependency.auditor_class == auditor_class,
+            ItemDependency.support_item_id.in_(set(support_item_ids)))
+        tracked = exists().where(and_(
+            ItemDependency.item_id == Item.id,
+            ItemDependency.auditor_class == auditor_class,
+            ItemDependency.support_item_id == None))
+
+        items = []
+        for account in self.accounts:
+            query = self.datastore._ctype_filtered_query(tech=self.index, account=account)
+            for item, item_revision in query.filter(or_(Item.id.in_(dependent.subquery()), ~tracked)):
+                items.append(self._change_item(item, item_revision))
+        return items
 
     def save_issues(self):
         """
         Save all new issues.  Delete all fixed issues.
+
+        The items, their issues and the auditor settings are loaded up front in a few
+        queries, and all of the changes are written with a single commit.
         """
         app.logger.debug("\n\nSaving Issues.")
 
         # Work around for issue where previous get's may cause commit to fail
         db.session.rollback()
-        for item in self.items:
-            changes = False
-            loaded = False
-            if not hasattr(item, 'db_item'):
-                loaded = True
-                item.db_item = self.datastore._get_item(item.index, item.region, item.account, item.name)
+        loaded = self._load_db_items()
+        self._load_db_issues()
 
+        orphaned_items = set()
+        orphans = []
+        for item in self.items:
             for issue in item.db_item.issues:
                 if not issue.auditor_setting:
-                    self._set_auditor_setting_for_issue(issue)
+                    orphaned_items.add(id(item))
+                    orphans.append((item.db_item.tech_id, item.db_item.account_id, issue))
+        self._set_auditor_settings(orphans)
+
+        now = datetime.datetime.utcnow()
+        new_issues = []
+        changed_items = []
+        for item in self.items:
+            changes = id(item) in orphaned_items
 
             existing_issues = {'{cls} -- {key}'.format(
                 cls=issue.auditor_setting.auditor_class,
                 key=issue.key()): issue for issue in list(item.db_item.issues)}
 
-            new_issues = item.audit_issues
-            new_issue_keys = [issue.key() for issue in new_issues]
+            new_issue_keys = [issue.key() for issue in item.audit_issues]
 
             # New/Regressions/Existing Issues
-            for new_issue in new_issues:
+            for new_issue in item.audit_issues:
                 new_issue_key = '{cls} -- {key}'.format(cls=self.__class__.__name__, key=new_issue.key())
 
                 if new_issue_key not in existing_issues:
@@ -760,7 +691,9 @@ class Auditor(object):
                     app.logger.debug("Saving NEW issue {}".format(new_issue))
                     item.found_new_issue = True
                     item.confirmed_new_issues.append(new_issue)
+                    new_issue.date_created = now
                     item.db_item.issues.append(new_issue)
+                    new_issues.append((item.db_item.tech_id, item.db_item.account_id, new_issue))
                     continue
                 
                 existing_issue = existing_issues[new_issue_key]
@@ -793,14 +726,177 @@ class Auditor(object):
 
             if changes:
                 db.session.add(item.db_item)
+                changed_items.append(item.db_item)
             else:
-                if loaded:
+                if id(item) in loaded:
                     db.session.expunge(item.db_item)
 
+        self._set_auditor_settings(new_issues)
+        orphaned_item_ids = self._create_auditor_settings()
+        self._save_support_dependencies()
+        db.session.flush()
+        update_item_scores([db_item.id for db_item in changed_items] + orphaned_item_ids)
         db.session.commit()
-        self._create_auditor_settings()
         report_auditor_changes(self)
 
+    def _save_support_dependencies(self):
+        """
+        Replaces the recorded dependencies of the items that were audited, if this auditor
+        tracks any.  Nothing is committed.
+        """
+        items = [item for item in self.items if getattr(item, 'support_item_ids', None) is not None]
+        if not self.support_dependency_indexes or not items:
+            return
+
+        db.session.flush()
+        auditor_class = self.__class__.__name__
+        item_ids = set([item.db_item.id for item in items])
+        ItemDependency.query.filter(ItemDependency.auditor_class == auditor_class,
+                                    ItemDependency.item_id.in_(item_ids)).delete(synchronize_session=False)
+
+        rows = []
+        for item in items:
+            for support_item_id in set([None]) | item.support_item_ids:
+                rows.append(dict(auditor_class=auditor_class, item_id=item.db_item.id,
+                                 support_item_id=support_item_id))
+        db.session.execute(ItemDependency.__table__.insert(), rows)
+
+    def _load_db_items(self):
+        """
+        Finds the db_item of every item that doesn't have one yet, with a single query.
+        Items that are not in the database yet are added, along with any missing technology,
+        and flushed together without committing: save_issues commits them with the issues.
+        :return: the ids of the items whose db_item was loaded here.
+        """
+        items = [item for item in self.items if not hasattr(item, 'db_item')]
+        if not items:
+            return set()
+
+        query = db.session.query(Item, Technology.name, Account.name)
+        query = query.join((Technology, Item.tech_id == Technology.id)).join((Account, Item.account_id == Account.id))
+        query = query.filter(Technology.name.in_(set([item.index for item in items])))
+        query = query.filter(Account.name.in_(set([item.account for item in items])))
+        query = query.filter(Item.name.in_(set([item.name for item in items])))
+
+        found = defaultdict(list)
+        for db_item, technology, account in query:
+            found[(technology, db_item.region, account, db_item.name)].append(db_item)
+
+        missing = []
+        for item in items:
+            db_items = found.get((item.index, item.region, item.account, item.name), [])
+            if len(db_items) > 1:
+                # DB needs to be cleaned up and a bug needs to be found if this ever happens.
+                raise Exception("Found multiple items for tech: {} region: {} account: {} and name: {}"
+                                .format(item.index, item.region, item.account, item.name))
+            if db_items:
+                item.db_item = db_items[0]
+            else:
+                missing.append(item)
+
+        if missing:
+            self._add_db_items(missing)
+
+        return set([id(item) for item in items])
+
+    def _add_db_items(self, items):
+        """ Adds the db_item of each item, and any technology that doesn't exist yet, in one flush. """
+        account_names = set([item.account for item in items])
+        accounts = {account.name: account for account in Account.query.filter(Account.name.in_(account_names))}
+        missing_accounts = account_names - set(accounts)
+        if missing_accounts:
+            raise Exception("Account with name [{}] not found.".format(missing_accounts.pop()))
+
+        tech_names = set([item.index for item in items])
+        technologies = {tech.name: tech for tech in Technology.query.filter(Technology.name.in_(tech_names))}
+        for name in tech_names - set(technologies):
+            app.logger.info("Creating a new Technology: {}".format(name))
+            technologies[name] = Technology(name=name)
+            db.session.add(technologies[name])
+
+        added = dict()
+        for item in items:
+            key = (item.index, item.region, item.account, item.name)
+            if key not in added:
+                added[key] = Item(technology=technologies[item.index], region=item.region,
+                                  account=accounts[item.account], name=item.name)
+                db.session.add(added[key])
+            item.db_item = added[key]
+
+        db.session.flush()
+
+    def _load_db_issues(self):
+        """
+        Loads the issues of every db_item that hasn't loaded them yet, along with their
+        auditor settings and sub items, in one query each.
+        """
+        db_items = [item.db_item for item in self.items if 'issues' in inspect(item.db_item).unloaded]
+        if not db_items:
+            return
+
+        issues = defaultdict(list)
+        query = ItemAudit.query.filter(ItemAudit.item_id.in_(set([db_item.id for db_item in db_items])))
+        query = query.options(joinedload(ItemAudit.auditor_setting), subqueryload(ItemAudit.sub_items))
+        for issue in query.order_by(ItemAudit.id):
+            issues[issue.item_id].append(issue)
+
+        for db_item in db_items:
+            set_committed_value(db_item, 'issues', issues[db_item.id])
+
+    def _create_auditor_settings(self):
+        """
+        Checks to see if an AuditorSettings entry exists for each issue.
+        If it does not, one will be created with disabled set to false.
+        :return: the ids of the items whose issues were assigned an entry.
+        """
+        app.logger.debug("Creating/Assigning Auditor Settings in account {} and tech {}".format(self.accounts, self.index))
+
+        query = db.session.query(ItemAudit, Item.tech_id, Item.account_id)
+        query = query.join((Item, Item.id == ItemAudit.item_id))
+        query = query.join((Technology, Technology.id == Item.tech_id))
+        query = query.filter(Technology.name == self.index)
+        issues = query.filter(ItemAudit.auditor_setting_id == None).all()
+
+        self._set_auditor_settings([(tech_id, account_id, issue) for issue, tech_id, account_id in issues])
+        app.logger.debug("Done Creating/Assigning Auditor Settings in account {} and tech {}".format(self.accounts, self.index))
+        return [issue.item_id for issue, _, _ in issues]
+
+    def _set_auditor_settings(self, issues):
+        """
+        Links each (tech_id, account_id, issue) to this auditor's AuditorSettings entry for
+        the technology, account and issue text.  The existing entries are loaded with a
+        single query and any missing ones are created.  Nothing is committed.
+        """
+        if not issues:
+            return
+
+        query = AuditorSettings.query.filter(AuditorSettings.auditor_class == self.__class__.__name__)
+        query = query.filter(AuditorSettings.tech_id.in_(set([tech_id for tech_id, _, _ in issues])))
+        query = query.filter(AuditorSettings.account_id.in_(set([account_id for _, account_id, _ in issues])))
+
+        auditor_settings = dict()
+        for auditor_setting in query.order_by(AuditorSettings.id):
+            key = (auditor_setting.tech_id, auditor_setting.account_id, auditor_setting.issue_text)
+            auditor_settings.setdefault(key, auditor_setting)
+
+        for tech_id, account_id, issue in issues:
+            key = (tech_id, account_id, issue.issue)
+            if key not in auditor_settings:
+                auditor_settings[key] = AuditorSettings(
+                    tech_id=tech_id,
+                    account_id=account_id,
+                    disabled=False,
+                    issue_text=issue.issue,
+                    auditor_class=self.__class__.__name__
+                )
+                db.session.add(auditor_settings[key])
+                app.logger.debug("Created AuditorSetting: {} - {} - {}".format(
+                    issue.issue,
+                    self.index,
+                    account_id))
+
+            issue.auditor_setting = auditor_settings[key]
+
     def email_report(self, report):
         """
         Given a report, send an email using SES.
@@ -845,61 +941,6 @@ class Auditor(object):
         """
         return True
 
-    def _create_auditor_settings(self):
-        """
-        Checks to see if an AuditorSettings entry exists for each issue.
-        If it does not, one will be created with disabled set to false.
-        """
-        app.logger.debug("Creating/Assigning Auditor Settings in account {} and tech {}".format(self.accounts, self.index))
-
-        query = ItemAudit.query
-        query = query.join((Item, Item.id == ItemAudit.item_id))
-        query = query.join((Technology, Technology.id == Item.tech_id))
-        query = query.filter(Technology.name == self.index)
-        issues = query.filter(ItemAudit.auditor_setting_id == None).all()
-
-        for issue in issues:
-            self._set_auditor_setting_for_issue(issue)
-
-        db.session.commit()
-        app.logger.debug("Done Creating/Assigning Auditor Settings in account {} and tech {}".format(self.accounts, self.index))
-
-    def _set_auditor_setting_for_issue(self, issue):
-
-        auditor_setting = AuditorSettings.query.filter(
-            and_(
-                AuditorSettings.tech_id == issue.item.tech_id,
-                AuditorSettings.account_id == issue.item.account_id,
-                AuditorSettings.issue_text == issue.issue,
-                AuditorSettings.auditor_class == self.__class__.__name__
-            )
-        ).first()
-
-        if auditor_setting:
-            auditor_setting.issues.append(issue)
-            db.session.add(auditor_setting)
-            return auditor_setting
-
-        auditor_setting = AuditorSettings(
-            tech_id=issue.item.tech_id,
-            account_id=issue.item.account_id,
-            disabled=False,
-            issue_text=issue.issue,
-            auditor_class=self.__class__.__name__
-        )
-
-        auditor_setting.issues.append(issue)
-        db.session.add(auditor_setting)
-        db.session.commit()
-        db.session.refresh(auditor_setting)
-
-        app.logger.debug("Created AuditorSetting: {} - {} - {}".format(
-            issue.issue,
-            self.index,
-            issue.item.account.name))
-
-        return auditor_setting
-
     def get_auditor_support_items(self, auditor_index, account):
         for index in self.support_auditor_indexes:
             if index == auditor_index:
@@ -936,10 +977,23 @@ class Auditor(object):
 
         raise Exception("Watcher {} is not configured as a data support watcher for {}".format(watcher_index, self.index))
 
+    def add_support_dependencies(self, item, support_items):
+        """
+        Records that the item's audit depends on the support items (ChangeItems or Items), so the
+        item is reaudited when any of them change.  See support_dependency_indexes.
+        """
+        if getattr(item, 'support_item_ids', None) is None:
+            item.support_item_ids = set()
+        for support_item in support_items:
+            support_item = getattr(support_item, 'db_item', support_item)
+            if support_item.id is not None:
+                item.support_item_ids.add(support_item.id)
+
     def link_to_support_item_issues(self, item, sub_item, sub_issue_message=None, issue_message=None, issue=None, score=None):
         """
         Creates a new issue that is linked to an issue in a support auditor
         """
+        self.add_support_dependencies(item, [sub_item])
         matching_issues = []
         for sub_issue in sub_item.issues:
             if sub_issue.fixed:
@@ -962,6 +1016,7 @@ class Auditor(object):
         """
         Creates a new issue that is linked a support watcher item
         """
+        self.add_support_dependencies(item, [sub_item])
         if issue is None:
             issue = self.add_issue(score, issue_message, item)
         issue.sub_items.append(sub_item)
@@ -979,29 +1034,36 @@ class Auditor(object):
                based overrides
         :return:
         """
-        for override_score in self.override_scores:
-            # Look for an oberride entry that applies to
-            if override_score.method == self.current_method_name + ' (' + self.__class__.__name__ + ')':
-                # Check for account pattern override where a field in the account matches
-                # one configured in Settings/Audit Issue Scores
-                account = get_account_by_name(account)
-                for account_pattern_score in override_score.account_pattern_scores:
-                    if getattr(account, account_pattern_score.account_field, None):
-                        # Standard account field, such as identifier or notes
-                        account_pattern_value = getattr(account, account_pattern_score.account_field)
-                    else:
-                        # If there is no attribute, this is an account custom field
-                        account_pattern_value = account.getCustom(account_pattern_score.account_field)
-
-                    if account_pattern_value is not None:
-                        # Override the score based on the matching pattern
-                        if account_pattern_value == account_pattern_score.account_pattern:
-                            app.logger.debug("Overriding score based on config {}:{} {}/{}".format(self.index, self.current_method_name + '(' + self.__class__.__name__ + ')', score, account_pattern_score.score))
-                            score = account_pattern_score.score
-                            break
-                else:
-                    # No specific override pattern fund. use the generic override score
-                    app.logger.debug("Overriding score based on config {}:{} {}/{}".format(self.index, self.current_method_name + '(' + self.__class__.__name__ + ')', score, override_score.score))
-                    score = override_score.score
+        # Look for an override entry that applies to the current method
+        override_score = self._get_current_override_score()
+        if not override_score:
+            return score
+
+        key = (override_score.method, account)
+        if key not in self.account_override_scores:
+            self.account_override_scores[key] = self._find_account_override_score(override_score, account)
+
+        app.logger.debug("Overriding score based on config {}:{} {}/{}".format(
+            self.index, override_score.method, score, self.account_override_scores[key]))
+        return self.account_override_scores[key]
+
+    def _find_account_override_score(self, override_score, account):
+        # Check for account pattern override where a field in the account matches
+        # one configured in Settings/Audit Issue Scores
+        if override_score.account_pattern_scores:
+            account = get_account_by_name(account)
+        for account_pattern_score in override_score.account_pattern_scores:
+            if getattr(account, account_pattern_score.account_field, None):
+                # Standard account field, such as identifier or notes
+                account_pattern_value = getattr(account, account_pattern_score.account_field)
+            else:
+                # If there is no attribute, this is an account custom field
+                account_pattern_value = account.getCustom(account_pattern_score.account_field)
+
+            if account_pattern_value is not None:
+                # Override the score based on the matching pattern
+                if account_pattern_value == account_pattern_score.account_pattern:
+                    return account_pattern_score.score
 
-        return score
+        # No specific override pattern found. Use the generic override score
+        return override_score.score
@@ -131,6 +131,7 @@ class ELBAuditor(Auditor):
     i_am_plural = ELB.i_am_plural
     # support_watcher_indexes = [SecurityGroup.index]
     support_auditor_indexes = [SecurityGroup.index]
+    support_dependency_indexes = [SecurityGroup.index]
 
     def __init__(self, accounts=None, debug=False):
         super(ELBAuditor, self).__init__(accounts=accounts, debug=debug)
@@ -176,6 +177,7 @@ class ELBAuditor(Auditor):
             security_group_ids = set(elb_item.config.get('SecurityGroups', []))
             sg_auditor_items = self.get_auditor_support_items(SecurityGroup.index, elb_item.account)
             security_auditor_groups = [sg for sg in sg_auditor_items if sg.config.get('id') in security_group_ids]
+            self.add_support_dependencies(elb_item, security_auditor_groups)
 
             for sg in security_auditor_groups:
                 for issue in sg.db_item.issues:
@@ -35,6 +35,7 @@ class ELBv2Auditor(Auditor):
     i_am_plural = ELBv2.i_am_plural
     # support_watcher_indexes = [SecurityGroup.index]
     support_auditor_indexes = [SecurityGroup.index]
+    support_dependency_indexes = [SecurityGroup.index]
 
     def __init__(self, accounts=None, debug=False):
         super(ELBv2Auditor, self).__init__(accounts=accounts, debug=debug)
@@ -66,6 +67,7 @@ class ELBv2Auditor(Auditor):
             security_group_ids = set(alb.config.get('SecurityGroups', []))
             sg_auditor_items = self.get_auditor_support_items(SecurityGroup.index, alb.account)
             security_auditor_groups = [sg for sg in sg_auditor_items if sg.config.get('id') in security_group_ids]
+            self.add_support_dependencies(alb, security_auditor_groups)
 
             for sg in security_auditor_groups:
                 for issue in sg.db_item.issues:
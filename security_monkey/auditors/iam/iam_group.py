@@ -29,6 +29,7 @@ class IAMGroupAuditor(IAMPolicyAuditor):
     i_am_singular = IAMGroup.i_am_singular
     i_am_plural = IAMGroup.i_am_plural
     support_auditor_indexes = [ManagedPolicy.index]
+    support_dependency_indexes = [ManagedPolicy.index]
 
     def __init__(self, accounts=None, debug=False):
         super(IAMGroupAuditor, self).__init__(accounts=accounts, debug=debug)
@@ -208,6 +208,7 @@ class IAMPolicyAuditor(Auditor):
                 mp_arn = mp_item.config.get('arn', mp_item.config.get('Arn'))
                 if mp_arn == item_mp_arn:
                     found = True
+                    self.add_support_dependencies(iam_item, [mp_item])
                     if mp_item.db_item.issues:
                         self.link_to_support_item_issues(iam_item, mp_item.db_item, None, "Found issue(s) in attached Managed Policy")
 
@@ -30,6 +30,7 @@ class IAMRoleAuditor(IAMPolicyAuditor, ResourcePolicyAuditor):
     i_am_singular = IAMRole.i_am_singular
     i_am_plural = IAMRole.i_am_plural
     support_auditor_indexes = [ManagedPolicy.index]
+    support_dependency_indexes = [ManagedPolicy.index]
 
     def __init__(self, accounts=None, debug=False):
         super(IAMRoleAuditor, self).__init__(accounts=accounts, debug=debug)
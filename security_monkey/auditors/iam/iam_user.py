@@ -34,6 +34,7 @@ class IAMUserAuditor(IAMPolicyAuditor):
     i_am_singular = IAMUser.i_am_singular
     i_am_plural = IAMUser.i_am_plural
     support_auditor_indexes = [ManagedPolicy.index]
+    support_dependency_indexes = [ManagedPolicy.index]
 
     def __init__(self, accounts=None, debug=False):
         super(IAMUserAuditor, self).__init__(accounts=accounts, debug=debug)
@@ -29,6 +29,7 @@ class RDSDBInstanceAuditor(Auditor):
     i_am_singular = RDSDBInstance.i_am_singular
     i_am_plural = RDSDBInstance.i_am_plural
     support_auditor_indexes = [SecurityGroup.index]
+    support_dependency_indexes = [SecurityGroup.index]
 
     def __init__(self, accounts=None, debug=False):
         super(RDSDBInstanceAuditor, self).__init__(accounts=accounts, debug=debug)
@@ -51,6 +52,7 @@ class RDSDBInstanceAuditor(Auditor):
             security_group_ids = {sg['VpcSecurityGroupId'] for sg in security_groups}
             sg_auditor_items = self.get_auditor_support_items(SecurityGroup.index, item.account)
             security_auditor_groups = [sg for sg in sg_auditor_items if sg.config.get('id') in security_group_ids]
+            self.add_support_dependencies(item, security_auditor_groups)
 
             for sg in security_auditor_groups:
                 for issue in sg.db_item.issues:
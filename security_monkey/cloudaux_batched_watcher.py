@@ -1,6 +1,8 @@
 from security_monkey.cloudaux_watcher import CloudAuxWatcher
 from security_monkey.cloudaux_watcher import CloudAuxChangeItem
 from security_monkey.decorators import record_exception
+from security_monkey.common.fanout import fan_out
+from security_monkey import app
 from cloudaux.decorators import iter_account_region
 
 
@@ -13,13 +15,13 @@ class CloudAuxBatchedWatcher(CloudAuxWatcher):
 
     def slurp_list(self):
         self.prep_for_batch_slurp()
+        if self.resume_from_checkpoint():
+            return self.total_list, {}
 
         @record_exception(source='{index}-watcher'.format(index=self.index), pop_exception_fields=True)
         def invoke_list_method(**kwargs):
-            return self.list_method(**kwargs['conn_dict'])
+            return self._rate_limited_call(self.list_method, **kwargs['conn_dict'])
 
-        @iter_account_region(self.service_name, accounts=self.account_identifiers,
-            regions=self._get_regions(), conn_type='dict')
         def get_item_list(**kwargs):
             kwargs, exception_map = self._add_exception_fields_to_kwargs(**kwargs)
             items = invoke_list_method(**kwargs)
@@ -30,7 +32,7 @@ class CloudAuxBatchedWatcher(CloudAuxWatcher):
 
             return items, exception_map
 
-        items, exception_map = self._flatten_iter_response(get_item_list())
+        items, exception_map = self._slurp_account_regions(get_item_list)
         self.total_list.extend(items)
 
         return items, exception_map
@@ -38,7 +40,7 @@ class CloudAuxBatchedWatcher(CloudAuxWatcher):
     def slurp(self):
         @record_exception(source='{index}-watcher'.format(index=self.index), pop_exception_fields=True)
         def invoke_get_method(item, **kwargs):
-            return self.get_method(item, **kwargs['conn_dict'])
+            return self._rate_limited_call(self.get_method, item, **kwargs['conn_dict'])
 
         @iter_account_region(self.service_name, accounts=self.account_identifiers,
             regions=self._get_regions(), conn_type='dict')
@@ -47,16 +49,24 @@ class CloudAuxBatchedWatcher(CloudAuxWatcher):
             kwargs, exception_map = self._add_exception_fields_to_kwargs(**kwargs)
             item_counter = self.batch_counter * self.batched_size
             while self.batched_size - len(item_list) > 0 and not self.done_slurping:
-                cursor = self.total_list[item_counter]
-                item_name = self.get_name_from_list_output(cursor)
-                if item_name and self.check_ignore_list(item_name):
+                # Pick the next items that can still fit into this batch:
+                calls = list()
+                while self.batched_size - len(item_list) - len(calls) > 0 and not self.done_slurping:
+                    cursor = self.total_list[item_counter]
+                    item_name = self.get_name_from_list_output(cursor)
                     item_counter += 1
                     if item_counter == len(self.total_list):
                         self.done_slurping = True
-                    continue
+                    if item_name and self.check_ignore_list(item_name):
+                        continue
+                    calls.append(dict(item=cursor, name=item_name, **kwargs))
+
+                # Fetch their details, possibly in parallel, but keep them in list order:
+                results = fan_out(invoke_get_method, calls, max_threads=app.config.get('SLURP_BATCH_MAX_THREADS', 1))
+                for call, item_details in zip(calls, results):
+                    if not item_details:
+                        continue
 
-                item_details = invoke_get_method(cursor, name=item_name, **kwargs)
-                if item_details:
                     # Determine which region to record the item into.
                     # Some tech, like IAM, is global and so we record it as 'universal' by setting an override_region
                     # Some tech, like S3, requires an initial connection to us-east-1, though a buckets actual region may be different.  Extract the actual region from item_details.
@@ -64,13 +74,10 @@ class CloudAuxBatchedWatcher(CloudAuxWatcher):
                     record_region = self.override_region or \
                         item_details.get('Region') or kwargs['conn_dict']['region']
                     item = CloudAuxChangeItem.from_item(
-                        name=item_name,
+                        name=call['name'],
                         item=item_details,
                         record_region=record_region, **kwargs)
                     item_list.append(item)
-                item_counter += 1
-                if item_counter == len(self.total_list):
-                    self.done_slurping = True
             self.batch_counter += 1
             return item_list, exception_map
 
@@ -1,7 +1,9 @@
 from security_monkey.watcher import Watcher, ChangeItem
 from security_monkey.decorators import record_exception
+from security_monkey.common.fanout import fan_out
+from security_monkey.common.rate_limiter import rate_limiter
 from cloudaux.decorators import iter_account_region
-from security_monkey import AWS_DEFAULT_REGION
+from security_monkey import app, AWS_DEFAULT_REGION
 
 class CloudAuxWatcher(Watcher):
     index = 'abstract'
@@ -19,8 +21,7 @@ class CloudAuxWatcher(Watcher):
         super(CloudAuxWatcher, self).__init__(accounts=accounts, debug=debug)
 
     def _get_account_name(self, identifier):
-        idx = 0
-        for ident in self.account_identifiers:
+        for idx, ident in enumerate(self.account_identifiers):
             if ident == identifier:
                 return self.accounts[idx]
 
@@ -30,13 +31,25 @@ class CloudAuxWatcher(Watcher):
         return account.getCustom("role_name") or 'SecurityMonkey'
 
     def _get_regions(self):
-        from security_monkey.decorators import get_regions
+        from security_monkey.common.regions import get_available_regions
         from security_monkey.datastore import Account
         # pick an arbitrary account:
         identifier = self.account_identifiers[0]
         account = Account.query.filter(Account.identifier == identifier).first()
-        _, regions = get_regions(account, self.service_name)
-        return regions
+        if not self.service_name:
+            return [AWS_DEFAULT_REGION]
+        return get_available_regions(account, self.service_name)
+
+    def _get_skipped_regions(self):
+        """ Returns a dict mapping each account identifier to the regions it should not be slurped in. """
+        # Watchers that pin their own connection region (S3, IAM, ...) are never skipped:
+        if self._get_regions.__func__ is not CloudAuxWatcher._get_regions.__func__:
+            return dict()
+
+        from security_monkey.common.regions import get_skipped_regions
+        from security_monkey.datastore import Account
+        accounts = Account.query.filter(Account.identifier.in_(self.account_identifiers)).all()
+        return {account.identifier: get_skipped_regions(account) for account in accounts}
 
     def _add_exception_fields_to_kwargs(self, **kwargs):
         exception_map = dict()
@@ -49,6 +62,14 @@ class CloudAuxWatcher(Watcher):
         del kwargs['conn_dict']['service_type']
         return kwargs, exception_map
 
+    def _rate_limited_call(self, func, *args, **conn_dict):
+        """
+        Calls a cloudaux list or get function through the process-wide rate limiter,
+        keyed on the account, region and service in the conn_dict.
+        """
+        key = (conn_dict['account_number'], conn_dict['region'], self.service_name or self.index)
+        return rate_limiter.call(key, func, *args, **conn_dict)
+
     def _flatten_iter_response(self, response):
         """
         The cloudaux iter_account_region decorator returns a list of tuples.
@@ -62,19 +83,42 @@ class CloudAuxWatcher(Watcher):
             exception_map.update(result[1])
         return items, exception_map
 
+    def _slurp_account_regions(self, slurp_func):
+        """
+        Calls slurp_func once for every (account, region) pair and flattens the responses.
+
+        By default, each pair is processed sequentially.  Setting SLURP_MAX_THREADS above 1
+        processes the pairs on a bounded thread pool instead, so a run takes roughly as long as
+        its slowest region.  SLURP_MAX_THREADS_PER_ACCOUNT optionally caps how many regions of
+        any single account are in flight at once.
+        """
+        @iter_account_region(self.service_name, accounts=self.account_identifiers,
+            regions=self._get_regions(), conn_type='dict')
+        def get_account_region_kwargs(**kwargs):
+            return kwargs
+
+        skipped = self._get_skipped_regions()
+        calls = [kwargs for kwargs in get_account_region_kwargs()
+                 if kwargs['conn_dict']['region'] not in skipped.get(kwargs['conn_dict']['account_number'], [])]
+
+        response = fan_out(
+            slurp_func, calls,
+            max_threads=app.config.get('SLURP_MAX_THREADS', 1),
+            key=lambda kwargs: kwargs['conn_dict']['account_number'],
+            max_threads_per_key=app.config.get('SLURP_MAX_THREADS_PER_ACCOUNT'))
+        return self._flatten_iter_response(response)
+
     def slurp(self):
         self.prep_for_slurp()
 
         @record_exception(source='{index}-watcher'.format(index=self.index), pop_exception_fields=True)
         def invoke_list_method(**kwargs):
-            return self.list_method(**kwargs['conn_dict'])
+            return self._rate_limited_call(self.list_method, **kwargs['conn_dict'])
 
         @record_exception(source='{index}-watcher'.format(index=self.index), pop_exception_fields=True)
         def invoke_get_method(item, **kwargs):
-            return self.get_method(item, **kwargs['conn_dict'])
+            return self._rate_limited_call(self.get_method, item, **kwargs['conn_dict'])
 
-        @iter_account_region(self.service_name, accounts=self.account_identifiers,
-            regions=self._get_regions(), conn_type='dict')
         def slurp_items(**kwargs):
             kwargs, exception_map = self._add_exception_fields_to_kwargs(**kwargs)
 
@@ -103,7 +147,7 @@ class CloudAuxWatcher(Watcher):
                     results.append(item)
 
             return results, exception_map
-        return self._flatten_iter_response(slurp_items())
+        return self._slurp_account_regions(slurp_items)
 
 class CloudAuxChangeItem(ChangeItem):
     def __init__(self, index=None, account=None, region=AWS_DEFAULT_REGION, name=None, arn=None, config={}):
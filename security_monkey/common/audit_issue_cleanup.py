@@ -22,7 +22,7 @@
 """
 
 from security_monkey.auditor import auditor_registry
-from security_monkey.datastore import AuditorSettings, Account, Technology, Datastore
+from security_monkey.datastore import AuditorSettings, Account, Technology, Datastore, update_item_scores
 from security_monkey.watcher import ChangeItem
 from security_monkey import app, db
 
@@ -77,4 +77,6 @@ def _delete_issues(settings):
                 if issue.auditor_setting_id == settings.id:
                     item.confirmed_fixed_issues.append(issue)
 
+    item_ids = [issue.item_id for issue in settings.issues]
     db.session.delete(settings)
+    update_item_scores(item_ids)
@@ -0,0 +1,178 @@
+"""
+.. module: security_monkey.common.audit_pool
+    :platform: Unix
+    :synopsis: Runs an auditor's checks on its items in a pool of worker processes.
+
+.. version:: $$VERSION$$
+
+"""
+import math
+import threading
+import uuid
+from multiprocessing import Pool
+
+from sqlalchemy.orm import joinedload, subqueryload
+
+from security_monkey import app, db
+from security_monkey.datastore import Item, ItemAudit
+
+ISSUE_FIELDS = ('score', 'issue', 'notes', 'action_instructions', 'background_info', 'origin', 'origin_summary',
+                'class_uuid', 'fixed', 'justified', 'justified_user_id', 'justification', 'justified_date')
+
+_pool = None
+_pool_processes = 0
+_pool_lock = threading.Lock()
+
+# In a worker: (run id, auditor, checks) for the audit run it last worked on.
+_prepared = None
+
+
+def start_audit_pool(processes=None):
+    """
+    Forks the AUDIT_PROCESSES workers, unless they are already running or only one process is
+    configured.  Forking copies any lock another thread holds (logging, boto, the connection
+    pool) in its locked state, so this must be called before any other thread is started: the
+    scheduler calls it first thing.  No database connection is carried over into the workers.
+
+    :return: the pool, or None if there isn't one.
+    """
+    global _pool, _pool_processes
+    processes = processes or app.config.get('AUDIT_PROCESSES', 1)
+    with _pool_lock:
+        if _pool is not None or processes <= 1:
+            return _pool
+
+        if threading.active_count() > 1:
+            app.logger.warn("Not starting the audit workers, as other threads are already running.  "
+                            "The auditors will run their checks in this process.")
+            return None
+
+        db.session.remove()
+        db.engine.dispose()
+        _pool = Pool(processes=processes, initializer=_init_worker)
+        _pool_processes = processes
+        return _pool
+
+
+def stop_audit_pool():
+    global _pool, _pool_processes
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool.join()
+            _pool = None
+            _pool_processes = 0
+
+
+def _init_worker():
+    global _prepared
+    _prepared = None
+
+
+def _export_issue(issue):
+    return {field: getattr(issue, field) for field in ISSUE_FIELDS}, [item.id for item in issue.sub_items]
+
+
+def _get_auditor(run_id, auditor_class, accounts, method_names):
+    """ Prepares a copy of the auditor once per audit run, with this worker's own session. """
+    global _prepared
+    if _prepared is None or _prepared[0] != run_id:
+        auditor = auditor_class(accounts=accounts)
+        auditor.prepare_checks()
+        methods = [(method_name, getattr(auditor, method_name)) for method_name in method_names]
+        _prepared = (run_id, auditor, methods)
+    return _prepared[1], _prepared[2]
+
+
+def _audit_shard(task):
+    """
+    Audits the (index, item) pairs of the shard.
+    :return: [(index, issue count before the audit, exported issues, support item ids)]
+    """
+    run_id, auditor_class, accounts, method_names, shard = task
+    try:
+        auditor, methods = _get_auditor(run_id, auditor_class, accounts, method_names)
+        results = []
+        for index, item in shard:
+            existing = len(item.audit_issues)
+            auditor.run_checks(item, methods)
+            results.append((index, existing, [_export_issue(issue) for issue in item.audit_issues],
+                            item.support_item_ids))
+        return results
+    finally:
+        db.session.remove()
+
+
+def _load_db_items(items):
+    """
+    Loads the issues (with their sub items and auditor settings) of the items' DB items, which
+    is everything the checks read from them, and puts the loaded DB items back on the items.
+    The workers get pickled, detached copies, so an attribute that wasn't loaded here raises
+    instead of lazy loading through a connection that belongs to this process.
+    """
+    item_ids = set([item.db_item.id for item in items if getattr(item, 'db_item', None) is not None])
+    if not item_ids:
+        return
+
+    query = Item.query.filter(Item.id.in_(item_ids)).options(
+        subqueryload(Item.issues).subqueryload(ItemAudit.sub_items),
+        subqueryload(Item.issues).joinedload(ItemAudit.auditor_setting))
+    db_items = {db_item.id: db_item for db_item in query}
+    for item in items:
+        if getattr(item, 'db_item', None) is not None:
+            item.db_item = db_items[item.db_item.id]
+
+
+def audit_in_processes(auditor, methods):
+    """
+    Splits the auditor's items into contiguous shards, runs the checks on each shard in one of
+    the pool's workers and adds the issues found back to the items, in item order.
+
+    Each worker prepares its own copy of the auditor once per run (its object store, override
+    scores and support items come from its own session).  Each item is still audited by every
+    check in the same order, so the issues and their de-duplication are the same as when the
+    items are audited one after the other.  Anything else a check changes stays in the worker.
+
+    The pool is never forked here: by now, the items are loaded in this process's session
+    and other threads may be running.  Without a pool started by start_audit_pool, the caller
+    runs the checks itself.
+
+    :return: False if there is no pool to run the checks in.
+    """
+    with _pool_lock:
+        pool, processes = _pool, _pool_processes
+    if pool is None:
+        return False
+
+    _load_db_items(auditor.items)
+    indexes = range(len(auditor.items))
+    size = int(math.ceil(len(indexes) / float(processes * 4)))
+    run_id = uuid.uuid4().hex
+    method_names = [method_name for method_name, _ in methods]
+    tasks = [(run_id, type(auditor), auditor.accounts, method_names,
+              [(index, auditor.items[index]) for index in indexes[start:start + size]])
+             for start in range(0, len(indexes), size)]
+
+    app.logger.debug("Auditing {} {} items in {} processes".format(len(indexes), auditor.index, processes))
+    results = [result for shard in pool.map(_audit_shard, tasks) for result in shard]
+
+    sub_item_ids = set([sub_item_id for _, _, issues, _ in results for _, ids in issues for sub_item_id in ids])
+    sub_items = dict()
+    if sub_item_ids:
+        sub_items = {item.id: item for item in Item.query.filter(Item.id.in_(sub_item_ids))}
+
+    for index, existing, issues, support_item_ids in results:
+        item = auditor.items[index]
+        item.support_item_ids = support_item_ids
+        for position, (fields, ids) in enumerate(issues):
+            if position < existing:
+                issue = item.audit_issues[position]
+            else:
+                issue = ItemAudit(**fields)
+                item.audit_issues.append(issue)
+
+            linked = set([sub_item.id for sub_item in issue.sub_items])
+            for sub_item_id in ids:
+                if sub_item_id not in linked:
+                    issue.sub_items.append(sub_items[sub_item_id])
+    return True
@@ -0,0 +1,223 @@
+"""
+.. module: security_monkey.common.config_hash
+    :platform: Unix
+    :synopsis: Hashes item configurations in a single pass.
+
+.. version:: $$VERSION$$
+
+"""
+import fnmatch
+import hashlib
+import json
+from copy import deepcopy
+
+import dpath.util
+from dpath.exceptions import PathNotFound
+
+from security_monkey.common.utils import sub_dict
+
+PRIMITIVES = frozenset([int, str, unicode, bool, float, type(None)])
+CONTAINERS = frozenset([dict, list])
+INFINITY = float('inf')
+
+encode_string = json.encoder.encode_basestring_ascii
+
+
+class UnsupportedPath(Exception):
+    """ An ephemeral path the single pass walk can't apply the way dpath.util.delete does. """
+
+
+def hash_config(config):
+    """
+    Returns the MD5 of json.dumps(sub_dict(config), sort_keys=True) -- the hash stored on items.
+    """
+    return hash_item(config, [])[0]
+
+
+def hash_item(config, ephemeral_paths):
+    """
+    Walks the config once and returns both its complete hash and its durable hash, which is the
+    hash of the config with every ephemeral path (dpath glob, '$' separated) removed.
+
+    Dicts are fed to the digests key by key without copying them.  Lists have to be sorted
+    before they are written, so their (sanitized) elements are still collected.
+
+    The hashes are identical to the ones computed by copying the config, deleting the ephemeral
+    paths with dpath and hashing the JSON dump, so stored hashes stay valid.
+
+    :return: (complete_hash, durable_hash)
+    """
+    patterns = tuple(tuple(path.lstrip('$').split('$')) for path in ephemeral_paths)
+    if type(config) is not dict or any('**' in pattern for pattern in patterns):
+        return _copy_and_hash(config, ephemeral_paths)
+
+    complete = hashlib.md5()  # nosec: not used for security
+    durable = hashlib.md5() if patterns else None  # nosec: not used for security
+    try:
+        _feed_dict(config, patterns, complete, durable)
+    except UnsupportedPath:
+        return _copy_and_hash(config, ephemeral_paths)
+
+    complete_hash = complete.hexdigest()
+    return complete_hash, durable.hexdigest() if durable else complete_hash
+
+
+def _copy_and_hash(config, ephemeral_paths):
+    """ The original implementation: copy, delete the ephemeral paths, then hash the JSON dump. """
+    durable_item = deepcopy(config)
+    for path in ephemeral_paths:
+        try:
+            dpath.util.delete(durable_item, path, separator='$')
+        except PathNotFound:
+            pass
+
+    return _hash_dump(config), _hash_dump(durable_item)
+
+
+def _hash_dump(config):
+    item_str = json.dumps(sub_dict(config), sort_keys=True)
+    return hashlib.md5(item_str).hexdigest()  # nosec: not used for security
+
+
+def _descend(key, patterns, is_dict_key):
+    """
+    Matches one path element against the remaining segments of the ephemeral paths.
+    :return: (True if the key itself is ephemeral, the patterns left to match below the key)
+    """
+    # dpath never looks below dict keys that start with a '+':
+    if is_dict_key and isinstance(key, basestring) and key.startswith('+'):
+        return False, ()
+
+    name = key if isinstance(key, basestring) else str(key)
+    ephemeral = False
+    remaining = []
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(name, pattern[0]):
+            if len(pattern) == 1:
+                ephemeral = True
+            else:
+                remaining.append(pattern[1:])
+
+    return ephemeral, tuple(remaining)
+
+
+def _encode_key(key):
+    if isinstance(key, basestring):
+        return encode_string(key)
+    if isinstance(key, float):
+        return encode_string(_encode_float(key))
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if key is None:
+        return '"null"'
+    if isinstance(key, (int, long)):
+        return encode_string(str(key))
+    raise TypeError("key {!r} is not a string".format(key))
+
+
+def _encode_float(value):
+    if value != value:
+        return 'NaN'
+    if value == INFINITY:
+        return 'Infinity'
+    if value == -INFINITY:
+        return '-Infinity'
+    return repr(value)
+
+
+def _encode_primitive(value):
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if type(value) is int:
+        return str(value)
+    if type(value) is float:
+        return _encode_float(value)
+    return encode_string(value)
+
+
+def _feed(value, patterns, complete, durable):
+    kind = type(value)
+    if kind is dict:
+        _feed_dict(value, patterns, complete, durable)
+    elif kind is list:
+        _feed_list(value, patterns, complete, durable)
+    else:
+        encoded = _encode_primitive(value)
+        complete.update(encoded)
+        if durable:
+            durable.update(encoded)
+
+
+def _feed_dict(value, patterns, complete, durable):
+    complete.update('{')
+    if durable:
+        durable.update('{')
+
+    complete_separator = durable_separator = ''
+    for key in sorted(value):
+        child = value[key]
+        if type(child) not in PRIMITIVES and type(child) not in CONTAINERS:
+            continue
+
+        ephemeral, child_patterns = _descend(key, patterns, True) if patterns else (False, ())
+        entry = _encode_key(key) + ': '
+        complete.update(complete_separator + entry)
+        complete_separator = ', '
+
+        if ephemeral:
+            _feed(child, (), complete, None)
+            continue
+
+        if durable:
+            durable.update(durable_separator + entry)
+            durable_separator = ', '
+        _feed(child, child_patterns, complete, durable)
+
+    complete.update('}')
+    if durable:
+        durable.update('}')
+
+
+def _feed_list(value, patterns, complete, durable):
+    # Lists are sorted before they are dumped, so their elements need to be collected:
+    encoded = json.dumps(_sanitize(value, ()), sort_keys=True)
+    complete.update(encoded)
+    if durable:
+        if patterns:
+            encoded = json.dumps(_sanitize(value, patterns), sort_keys=True)
+        durable.update(encoded)
+
+
+def _sanitize(value, patterns):
+    """ sub_dict / sub_list, leaving out ephemeral paths. """
+    kind = type(value)
+    if kind is dict:
+        result = {}
+        for key, child in value.iteritems():
+            if type(child) not in PRIMITIVES and type(child) not in CONTAINERS:
+                continue
+            ephemeral, child_patterns = _descend(key, patterns, True) if patterns else (False, ())
+            if not ephemeral:
+                result[key] = _sanitize(child, child_patterns)
+        return result
+
+    if kind is list:
+        result = []
+        for index, child in enumerate(value):
+            ephemeral, child_patterns = _descend(index, patterns, False) if patterns else (False, ())
+            if ephemeral:
+                # dpath pops list elements one at a time, shifting the ones after them:
+                raise UnsupportedPath()
+            if type(child) not in PRIMITIVES and type(child) not in CONTAINERS:
+                continue
+            result.append(_sanitize(child, child_patterns))
+        result.sort()
+        return result
+
+    return value
@@ -0,0 +1,45 @@
+"""
+.. module: security_monkey.common.config_search
+    :platform: Unix
+    :synopsis: Turns the searchconfig argument into a filter on the revision configs.
+
+.. version:: $$VERSION$$
+
+"""
+import json
+
+from sqlalchemy import String, Text, literal
+from sqlalchemy.sql.expression import cast
+
+from security_monkey.datastore import ItemRevision
+
+JSONPATH_PREFIXES = ('$.', '$[')
+
+
+def searchconfig_filter(search):
+    """
+    Returns the filter matching the revision configs for a searchconfig argument:
+
+    - A JSON object or array matches the configs that contain it:
+        {"Tags": {"Environment": "prod"}}
+    - A JSONPath (starting with `$.` or `$[`) matches the configs it selects anything in.
+      This needs Postgres 12 or later:
+        $.ip_permissions[*].ip_ranges[*] ? (@ == "0.0.0.0/0")
+    - Anything else is matched case insensitively anywhere in the config text, as before.
+
+    The first two use the jsonb_path_ops GIN index on itemrevision.config and the last one
+    uses the trigram index on config::text.
+    """
+    stripped = search.strip()
+    if stripped.startswith(('{', '[')):
+        try:
+            contained = json.loads(stripped)
+        except ValueError:
+            pass
+        else:
+            return ItemRevision.config.op('@>')(contained)
+
+    if stripped.startswith(JSONPATH_PREFIXES):
+        return ItemRevision.config.op('@?')(literal(stripped, String))
+
+    return cast(ItemRevision.config, Text).ilike('%{}%'.format(search))
@@ -0,0 +1,53 @@
+"""
+.. module: security_monkey.common.fanout
+    :platform: Unix
+    :synopsis: Runs a list of calls on a bounded thread pool, preserving result order.
+
+.. version:: $$VERSION$$
+
+"""
+from multiprocessing.pool import ThreadPool
+from threading import BoundedSemaphore
+
+from security_monkey import db
+
+
+def fan_out(func, calls, max_threads=1, key=None, max_threads_per_key=None):
+    """
+    Invokes `func(**kwargs)` for every kwargs dict in `calls`.
+
+    With `max_threads` of 1 (the default) the calls are made one after another on the
+    calling thread, exactly like a plain loop.  Otherwise they are spread over a pool of
+    at most `max_threads` threads.  When `key` and `max_threads_per_key` are supplied,
+    no more than `max_threads_per_key` calls sharing the same `key(kwargs)` run at once.
+
+    :return: list of results, in the same order as `calls`.
+    """
+    calls = list(calls)
+    max_threads = min(max_threads or 1, len(calls))
+    if max_threads <= 1:
+        return [func(**kwargs) for kwargs in calls]
+
+    semaphores = dict()
+    if key and max_threads_per_key:
+        for kwargs in calls:
+            semaphores.setdefault(key(kwargs), BoundedSemaphore(max_threads_per_key))
+
+    def invoke(kwargs):
+        semaphore = semaphores.get(key(kwargs)) if semaphores else None
+        if semaphore:
+            semaphore.acquire()
+        try:
+            return func(**kwargs)
+        finally:
+            if semaphore:
+                semaphore.release()
+            # The scoped session is per-thread; don't leave one open on the pool thread:
+            db.session.remove()
+
+    pool = ThreadPool(max_threads)
+    try:
+        return pool.map(invoke, calls, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,315 @@
+"""
+.. module: security_monkey.common.object_store
+    :platform: Unix
+    :synopsis: The lookup tables the auditors use to find out which account an entity belongs to.
+
+.. version:: $$VERSION$$
+
+"""
+import time
+from threading import Lock
+
+import ipaddr
+import netaddr
+from sqlalchemy import func
+
+from security_monkey import app, db
+from security_monkey.datastore import Account, AccountTypeCustomValues, Item, ItemRevision, NetworkWhitelistEntry, \
+    Technology
+
+WHITELIST_ACCOUNT = '000000000000'
+STORE_KEYS = ('s3', 'userid', 'vpc', 'vpce', 'cidr')
+ACCOUNT_FIELDS = ('name', 'identifier', 'label', 's3_name', 's3_canonical_id')
+
+
+def add(to, key, value):
+    if not key:
+        return
+    if key in to:
+        to[key].add(value)
+    else:
+        to[key] = set([value])
+
+
+def _text(*path):
+    """ Selects a single field out of the latest config, so the rest of it never leaves the database. """
+    return ItemRevision.config[path if len(path) > 1 else path[0]].astext
+
+
+def _vpcnat_cidrs(tag):
+    return [cidr.strip() for cidr in unicode(tag or '').split(',')]
+
+
+def _nat_gateway_cidrs(addresses):
+    cidrs = []
+    for address in addresses or []:
+        cidrs.extend([address['public_ip'], address['private_ip']])
+    return cidrs
+
+
+# technology: [(store key, column, function turning the column into a list of values or None)]
+EXTRACTORS = {
+    's3': [('s3', Item.name, None)],
+    'iamuser': [('userid', _text('UserId'), None)],
+    'iamrole': [('userid', _text('RoleId'), None)],
+    'vpc': [('vpc', _text('id'), None),
+            ('cidr', _text('cidr_block'), None),
+            ('cidr', _text('tags', 'vpcnat'), _vpcnat_cidrs)],
+    'endpoint': [('vpce', _text('id'), None)],
+    'elasticip': [('cidr', _text('public_ip'), None),
+                  ('cidr', _text('private_ip_address'), None)],
+    'natgateway': [('cidr', ItemRevision.config['nat_gateway_addresses'], _nat_gateway_cidrs)]
+}
+
+
+def merge_cidrs(cidrs):
+    """
+    The CIDRs are collected one address at a time:
+
+        cidrs['54.0.0.0'] = set(['123456789012'])
+        ...
+        cidrs['54.0.0.255'] = set(['123456789012'])
+
+    A resource policy allowing `54.0.0.0/24` would not match any of those, so each account's
+    CIDRs are merged with `netaddr.cidr_merge`, keeping the account identifiers:
+
+        cidrs['54.0.0.0/24'] = set(['123456789012'])
+    """
+    by_account = dict()
+    for cidr, accounts in cidrs.items():
+        for account in accounts:
+            add(by_account, account, cidr)
+
+    merged = dict()
+    for account, account_cidrs in by_account.items():
+        for cidr in netaddr.cidr_merge(account_cidrs):
+            add(merged, str(cidr), account)
+    return merged
+
+
+class CidrIndex(object):
+    """
+    Finds every CIDR that contains a network.
+
+    The CIDRs are keyed by (prefix length, network bits), so a lookup is one hash probe for
+    each prefix length in use that is no longer than the network's own prefix.  This gives the
+    same answer as testing `ipaddr.IPNetwork(value) in ipaddr.IPNetwork(cidr)` for every CIDR.
+    """
+
+    def __init__(self, cidrs):
+        self._prefixes = {4: dict(), 6: dict()}
+        for cidr, accounts in cidrs.items():
+            network = ipaddr.IPNetwork(cidr)
+            prefixes = self._prefixes[network.version]
+            key = self._key(network, network.prefixlen)
+            prefixes[key] = prefixes.get(key, frozenset()) | frozenset(accounts)
+
+        self._lengths = {version: sorted(set([length for length, _ in prefixes]))
+                         for version, prefixes in self._prefixes.items()}
+
+    def __len__(self):
+        return sum([len(prefixes) for prefixes in self._prefixes.values()])
+
+    @staticmethod
+    def _key(network, length):
+        return length, int(network.network) >> (network.max_prefixlen - length)
+
+    def lookup(self, value):
+        """
+        :return: the set of accounts owning a CIDR that contains the network or address.
+        """
+        accounts = set()
+        if not len(self):
+            return accounts
+
+        network = ipaddr.IPNetwork(value)
+        prefixes = self._prefixes[network.version]
+        for length in self._lengths[network.version]:
+            if length > network.prefixlen:
+                break
+            accounts.update(prefixes.get(self._key(network, length), ()))
+        return accounts
+
+
+def _freeze(store):
+    return {key: frozenset(accounts) for key, accounts in store.items()}
+
+
+def _accounts(descriptions):
+    """
+    DESCRIPTIONS lists the friendly, then the third party accounts.  BY_IDENTIFIER and BY_FIELD
+    index the first description for each identifier, and for each lower cased field value.
+    """
+    by_identifier = dict()
+    by_field = {field: dict() for field in ACCOUNT_FIELDS}
+    for account in descriptions:
+        by_identifier.setdefault(account['identifier'], account)
+        for field, index in by_field.items():
+            index.setdefault(unicode(account.get(field, '')).lower(), account)
+
+    return dict(
+        DESCRIPTIONS=tuple(descriptions),
+        FRIENDLY=frozenset([account['identifier'] for account in descriptions if account['label'] == 'friendly']),
+        THIRDPARTY=frozenset([account['identifier'] for account in descriptions if account['label'] == 'thirdparty']),
+        BY_IDENTIFIER=by_identifier,
+        BY_FIELD=by_field)
+
+
+def _empty_snapshot():
+    snapshot = {key: dict() for key in STORE_KEYS}
+    snapshot['ACCOUNTS'] = _accounts(())
+    snapshot['cidr_index'] = CidrIndex(dict())
+    return snapshot
+
+
+class ObjectStore(object):
+    """
+    Maps S3 buckets, user IDs, VPCs, VPC endpoints and CIDRs to the account identifiers they
+    belong to, and describes the friendly and third party accounts.
+
+    Readers get a snapshot that is never modified.  A refresh builds a new snapshot and swaps
+    it in, so a reader keeps a consistent view for as long as it holds on to one.
+
+    Only the config fields that are needed are selected.  After the first load, a refresh only
+    selects the items whose latest revision is newer than the highest one seen so far (the
+    watermark).  This is checked at most every OBJECT_STORE_CHECK_INTERVAL seconds, and
+    everything is reloaded every OBJECT_STORE_TTL seconds.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+        self._items = dict()  # item id: (account id, [(store key, value)])
+        self._watermark = None
+        self._loaded_at = None
+        self._checked_at = None
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        return snapshot if snapshot is not None else _empty_snapshot()
+
+    def __getitem__(self, key):
+        return self.snapshot[key]
+
+    def __contains__(self, key):
+        return key in self.snapshot
+
+    def __iter__(self):
+        return iter(self.snapshot)
+
+    def __len__(self):
+        return len(self._snapshot or ())
+
+    def get(self, key, default=None):
+        return self.snapshot.get(key, default)
+
+    def keys(self):
+        return self.snapshot.keys()
+
+    def clear(self):
+        """ Throws everything away.  The next refresh reloads it all. """
+        with self._lock:
+            self._snapshot = None
+            self._items = dict()
+            self._watermark = None
+            self._loaded_at = None
+            self._checked_at = None
+
+    def refresh(self, force=False):
+        """
+        Loads the store if it is empty or due for a refresh.
+        :return: the current snapshot.
+        """
+        with self._lock:
+            now = time.time()
+            if force or self._snapshot is None \
+                    or now - self._loaded_at >= app.config.get('OBJECT_STORE_TTL', 86400):
+                self._items = dict()
+                self._watermark = None
+                self._loaded_at = now
+            elif now - self._checked_at < app.config.get('OBJECT_STORE_CHECK_INTERVAL', 60):
+                return self._snapshot
+
+            self._checked_at = now
+            self._snapshot = self._load()
+            return self._snapshot
+
+    def _load(self):
+        watermark, count = db.session.query(func.max(Item.latest_revision_id), func.count(Item.id)).join(
+            (Technology, Technology.id == Item.tech_id)).filter(Technology.name.in_(EXTRACTORS.keys())).one()
+
+        if self._watermark is not None and (watermark is None or watermark < self._watermark):
+            # The revisions we have seen are gone:
+            self._items = dict()
+            self._watermark = None
+
+        if self._watermark is None or watermark > self._watermark:
+            for technology in EXTRACTORS:
+                self._load_items(technology, self._watermark)
+
+        if count != len(self._items):
+            # Items were deleted:
+            query = db.session.query(Item.id).join((Technology, Technology.id == Item.tech_id))
+            existing = set([row[0] for row in query.filter(Technology.name.in_(EXTRACTORS.keys()))])
+            for item_id in set(self._items) - existing:
+                del self._items[item_id]
+
+        self._watermark = watermark
+        return self._build()
+
+    def _load_items(self, technology, watermark):
+        extractors = EXTRACTORS[technology]
+        query = db.session.query(Item.id, Item.account_id, *[column for _, column, _ in extractors])
+        query = query.join((Technology, Technology.id == Item.tech_id)).filter(Technology.name == technology)
+        query = query.outerjoin((ItemRevision, ItemRevision.id == Item.latest_revision_id))
+        if watermark is not None:
+            query = query.filter(Item.latest_revision_id > watermark)
+
+        for row in query:
+            entries = []
+            for (key, _, values), value in zip(extractors, row[2:]):
+                for entry in values(value) if values else [value]:
+                    if entry:
+                        entries.append((key, entry))
+            self._items[row[0]] = (row[1], entries)
+
+    def _build(self):
+        accounts = db.session.query(Account.id, Account.name, Account.identifier, Account.third_party).filter(
+            Account.third_party != None).order_by(Account.id).all()
+
+        custom_values = db.session.query(AccountTypeCustomValues.account_id, AccountTypeCustomValues.name,
+                                         AccountTypeCustomValues.value).filter(
+            AccountTypeCustomValues.name.in_(['s3_name', 'canonical_id']))
+        custom = {(account_id, name): value for account_id, name, value in custom_values}
+
+        all_identifiers = dict(db.session.query(Account.id, Account.identifier))
+
+        store = {key: dict() for key in STORE_KEYS}
+        for account_id, entries in self._items.values():
+            identifier = all_identifiers.get(account_id)
+            for key, value in entries:
+                add(store[key], value, identifier)
+
+        for (cidr,) in db.session.query(NetworkWhitelistEntry.cidr):
+            add(store['cidr'], cidr, WHITELIST_ACCOUNT)
+
+        store['cidr'] = merge_cidrs(store['cidr'])
+        snapshot = {key: _freeze(values) for key, values in store.items()}
+        snapshot['cidr_index'] = CidrIndex(snapshot['cidr'])
+
+        descriptions = []
+        for label in ('friendly', 'thirdparty'):
+            for account_id, name, identifier, third_party in accounts:
+                if third_party == (label == 'thirdparty'):
+                    descriptions.append(dict(
+                        name=name,
+                        identifier=identifier,
+                        label=label,
+                        s3_name=custom.get((account_id, 's3_name')),
+                        s3_canonical_id=custom.get((account_id, 'canonical_id'))))
+
+        snapshot['ACCOUNTS'] = _accounts(descriptions)
+
+        app.logger.debug("Object store loaded {} items up to revision {}".format(len(self._items), self._watermark))
+        return snapshot
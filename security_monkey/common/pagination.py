@@ -0,0 +1,128 @@
+"""
+.. module: security_monkey.common.pagination
+    :platform: Unix
+    :synopsis: Pages through the list endpoints by page number or by cursor.
+
+.. version:: $$VERSION$$
+
+"""
+import base64
+import datetime
+import json
+
+from sqlalchemy import and_, or_, tuple_
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class InvalidCursor(Exception):
+    """ The cursor was not created by this module, or for a different ordering. """
+
+
+class KeysetPage(object):
+    """ A page of a keyset paginated query, with the cursor of the next page (None on the last page). """
+
+    def __init__(self, items, next_cursor, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.total = total
+        self.page = None
+
+
+def add_pagination_arguments(reqparse, count=30):
+    reqparse.add_argument('count', type=int, default=count, location='args')
+    reqparse.add_argument('page', type=int, default=1, location='args')
+    reqparse.add_argument('cursor', type=str, default=None, location='args')
+    reqparse.add_argument('total', type=str, default=None, location='args')
+
+
+def pop_pagination_arguments(args):
+    """ Removes the page, count, cursor and total arguments from the parsed arguments. """
+    return dict([(name, args.pop(name, None)) for name in ('page', 'count', 'cursor', 'total')])
+
+
+def paginate(query, pagination, sort_keys, error_out=True):
+    """
+    Orders the query by sort_keys, a list of (expression, descending) ending with a unique,
+    non null key, and returns one page of it.
+
+    Without a `cursor` argument, this is Flask-SQLAlchemy's paginate(page, count): an OFFSET
+    and a COUNT(*) over the whole query.  With one (an empty cursor asks for the first page),
+    the query seeks past the sort key values of the last row of the previous page, so every
+    page costs the same, and returns a KeysetPage.  Its total is only counted when the
+    `total` argument is "true".
+
+    :param pagination: the arguments returned by pop_pagination_arguments.
+    :raises InvalidCursor: if the cursor can't be decoded.
+    """
+    if pagination['cursor'] is None:
+        query = query.order_by(*[_direction(expression, descending) for expression, descending in sort_keys])
+        return query.paginate(pagination['page'], pagination['count'], error_out)
+
+    with_total = (pagination['total'] or '').lower() == 'true'
+    return keyset_paginate(query, sort_keys, pagination['count'], pagination['cursor'], with_total)
+
+
+def keyset_paginate(query, sort_keys, count, cursor='', with_total=False):
+    """ See paginate. """
+    total = query.order_by(None).count() if with_total else None
+
+    if cursor:
+        query = query.filter(_after(sort_keys, decode_cursor(cursor, len(sort_keys))))
+
+    single_entity = len(query.column_descriptions) == 1
+    labels = [expression.label('sort_key_{}'.format(position))
+              for position, (expression, _) in enumerate(sort_keys)]
+    query = query.add_columns(*labels)
+    query = query.order_by(*[_direction(expression, descending) for expression, descending in sort_keys])
+    rows = query.limit(count + 1).all()
+
+    next_cursor = None
+    if len(rows) > count:
+        rows = rows[:count]
+        next_cursor = encode_cursor(list(rows[-1])[-len(sort_keys):])
+
+    items = [row[0] if single_entity else row for row in rows]
+    return KeysetPage(items, next_cursor, total)
+
+
+def encode_cursor(values):
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime.datetime):
+            value = {'datetime': value.strftime(DATETIME_FORMAT)}
+        encoded.append(value)
+    return base64.urlsafe_b64encode(json.dumps(encoded))
+
+
+def decode_cursor(cursor, length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        if not isinstance(values, list) or len(values) != length:
+            raise ValueError(cursor)
+        return [datetime.datetime.strptime(value['datetime'], DATETIME_FORMAT) if isinstance(value, dict) else value
+                for value in values]
+    except (TypeError, ValueError, KeyError):
+        raise InvalidCursor(cursor)
+
+
+def _direction(expression, descending):
+    return expression.desc() if descending else expression.asc()
+
+
+def _after(sort_keys, values):
+    """ The rows that come after the values, in the order of the sort keys. """
+    expressions = [expression for expression, _ in sort_keys]
+    directions = set([descending for _, descending in sort_keys])
+    if len(directions) == 1:
+        # A row comparison, which Postgres can answer from an index on the sort keys:
+        if directions.pop():
+            return tuple_(*expressions) < tuple_(*values)
+        return tuple_(*expressions) > tuple_(*values)
+
+    clauses = []
+    for position, (expression, descending) in enumerate(sort_keys):
+        equal = [key == value for key, value in zip(expressions[:position], values[:position])]
+        beyond = expression < values[position] if descending else expression > values[position]
+        clauses.append(and_(*(equal + [beyond])))
+    return or_(*clauses)
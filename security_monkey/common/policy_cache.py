@@ -0,0 +1,117 @@
+"""
+.. module: security_monkey.common.policy_cache
+    :platform: Unix
+    :synopsis: Parsed policies that remember what the auditor checks have asked of them.
+
+.. version:: $$VERSION$$
+
+"""
+from collections import OrderedDict
+from threading import Lock
+
+from security_monkey import app
+
+
+class LRUCache(object):
+    """ A bounded, thread safe mapping that forgets the least recently used entries first. """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key, compute):
+        """ Returns the entry for the key, calling compute() to create it if it is missing. """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                value = self.entries.pop(key)
+                self.entries[key] = value
+                return value
+            self.misses += 1
+
+        value = compute()
+        max_size = self.max_size or app.config.get('POLICY_ACTION_CACHE_SIZE', 10000)
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self.lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Statements with the same actions expand to the same actions, whichever item they are in:
+action_cache = LRUCache()
+
+
+class _Memoized(object):
+    """ Delegates to the wrapped policyuniverse object and keeps the results of the expensive calls. """
+
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+        self._results = dict()
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def _memoize(self, name, compute):
+        if name not in self._results:
+            self._results[name] = compute()
+        return self._results[name]
+
+
+class CachedStatement(_Memoized):
+    """
+    A policyuniverse Statement whose expanded actions, action summary and principals are computed once.
+    The expanded actions and action summary are also shared with every other statement with the same
+    actions through the action_cache.
+    """
+
+    @property
+    def actions_key(self):
+        """ The statement's Effect, Action and NotAction, which are all its expansions depend on. """
+        def values(name):
+            value = self._wrapped.statement.get(name) or []
+            return tuple(sorted(value if isinstance(value, list) else [value]))
+
+        return self._wrapped.effect, values('Action'), values('NotAction')
+
+    @property
+    def actions_expanded(self):
+        return self._memoize('actions_expanded', lambda: action_cache.get(
+            ('actions_expanded', self.actions_key), lambda: self._wrapped.actions_expanded))
+
+    def action_summary(self):
+        return self._memoize('action_summary', lambda: action_cache.get(
+            ('action_summary', self.actions_key), self._wrapped.action_summary))
+
+    def whos_allowed(self):
+        return self._memoize('whos_allowed', self._wrapped.whos_allowed)
+
+
+class CachedPolicy(_Memoized):
+    """ A policyuniverse Policy whose statements and internet accessibility are computed once. """
+
+    def __init__(self, policy):
+        super(CachedPolicy, self).__init__(policy)
+        self.statements = [CachedStatement(statement) for statement in policy.statements]
+
+    def is_internet_accessible(self):
+        return self._memoize('is_internet_accessible', self._wrapped.is_internet_accessible)
+
+    def internet_accessible_actions(self):
+        return self._memoize('internet_accessible_actions', self._wrapped.internet_accessible_actions)
+
+    def whos_allowed(self):
+        return self._memoize('whos_allowed', self._wrapped.whos_allowed)
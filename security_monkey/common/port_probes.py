@@ -0,0 +1,78 @@
+"""
+.. module: security_monkey.common.port_probes
+    :platform: Unix
+    :synopsis: Extracts the port probes of GuardDuty findings into the guarddutyportprobe table.
+
+.. version:: $$VERSION$$
+
+"""
+from security_monkey import db
+from security_monkey.datastore import GuardDutyPortProbe
+
+
+def _get(value, *path):
+    """
+    Follows the path through nested dicts, ignoring the case of the keys: the findings from the
+    GuardDuty API use PascalCase, and the CloudWatch events posted to /api/1/gde use camelCase.
+    """
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        key = key.lower()
+        value = next((v for k, v in value.items() if k.lower() == key), None)
+    return value
+
+
+def port_probe_fields(config):
+    """
+    :param config: a GuardDuty finding, or a CloudWatch event with the finding in its detail.
+    :return: the GuardDutyPortProbe columns for the first probe of the finding, which is the one
+             the world map shows, or None if the finding isn't a port probe.
+    """
+    finding = _get(config, 'detail')
+    if not isinstance(finding, dict):
+        finding = config
+
+    details = _get(finding, 'Service', 'Action', 'PortProbeAction', 'PortProbeDetails')
+    if not details:
+        return None
+
+    detail = details[0]
+    remote = _get(detail, 'RemoteIpDetails')
+    asn = _get(remote, 'Organization', 'Asn')
+    tags = _get(finding, 'Resource', 'InstanceDetails', 'Tags') or []
+    instance_names = [_get(tag, 'Value') for tag in tags if _get(tag, 'Key') == 'Name']
+
+    return dict(
+        account_identifier=_get(finding, 'AccountId'),
+        region=_get(finding, 'Region'),
+        description=_get(finding, 'Description'),
+        severity=_get(finding, 'Severity'),
+        probe_count=_get(finding, 'Service', 'Count'),
+        first_seen=_get(finding, 'Service', 'EventFirstSeen'),
+        last_seen=_get(finding, 'Service', 'EventLastSeen'),
+        resource_type=_get(finding, 'Resource', 'ResourceType'),
+        instance_id=_get(finding, 'Resource', 'InstanceDetails', 'InstanceId'),
+        instance_name=instance_names[0] if instance_names else 'NA',
+        local_port=_get(detail, 'LocalPortDetails', 'Port'),
+        local_port_name=_get(detail, 'LocalPortDetails', 'PortName'),
+        remote_ip_v4=_get(remote, 'IpAddressV4'),
+        lat=_get(remote, 'GeoLocation', 'Lat'),
+        lon=_get(remote, 'GeoLocation', 'Lon'),
+        city_name=_get(remote, 'City', 'CityName'),
+        country_name=_get(remote, 'Country', 'CountryName'),
+        asn=unicode(asn) if asn is not None else None,
+        asn_org=_get(remote, 'Organization', 'AsnOrg'),
+        isp=_get(remote, 'Organization', 'Isp'),
+        org=_get(remote, 'Organization', 'Org'))
+
+
+def store_port_probe(item_id, config):
+    """
+    Replaces the port probe of the item with the one in its new config.  This must be called
+    whenever a new revision of a GuardDuty item is stored.  Nothing is committed.
+    """
+    GuardDutyPortProbe.query.filter(GuardDutyPortProbe.item_id == item_id).delete(synchronize_session=False)
+    fields = port_probe_fields(config)
+    if fields:
+        db.session.add(GuardDutyPortProbe(item_id=item_id, **fields))
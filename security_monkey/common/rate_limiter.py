@@ -0,0 +1,145 @@
+"""
+.. module: security_monkey.common.rate_limiter
+    :platform: Unix
+    :synopsis: Process-wide adaptive (AIMD) token bucket rate limiter for AWS API calls.
+
+.. version:: $$VERSION$$
+
+"""
+from threading import Lock
+import time
+
+from boto.exception import BotoServerError
+from botocore.exceptions import ClientError
+
+from security_monkey import app
+
+THROTTLING_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'TooManyRequestsException',
+    'SlowDown'
+])
+
+
+def is_throttling_error(exception):
+    """ Returns True if the exception is AWS telling us to slow down. """
+    if isinstance(exception, BotoServerError):  # Boto
+        return exception.error_code in THROTTLING_ERROR_CODES
+    if isinstance(exception, ClientError):  # Botocore
+        return exception.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+    return False
+
+
+class TokenBucket(object):
+    """
+    Hands out tokens at `rate` per second.  The rate is learned with AIMD: every
+    successful call adds `increase` to it, every throttled call multiplies it by
+    `decrease`.  It always stays within [min_rate, max_rate].
+    """
+
+    def __init__(self, rate, min_rate, max_rate, increase, decrease):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.tokens = 1.0
+        self.last_refill = time.time()
+        self.calls = 0
+        self.throttles = 0
+        self.lock = Lock()
+
+    def _refill(self, now):
+        # Up to one second's worth of tokens can be saved up for a burst:
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """
+        Takes a token, sleeping until one is available.  Tokens are reserved up front so
+        concurrent callers queue up fairly instead of all waking at the same time.
+        :return: the number of seconds slept.
+        """
+        with self.lock:
+            self._refill(time.time())
+            self.tokens -= 1
+            self.calls += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttled(self):
+        with self.lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # Drain the bucket so nobody else bursts into the same throttling:
+            self.tokens = min(self.tokens, 0.0)
+
+    def state(self):
+        with self.lock:
+            return dict(rate=self.rate, tokens=self.tokens, calls=self.calls, throttles=self.throttles)
+
+
+class RateLimiter(object):
+    """ Keeps one TokenBucket per (account, region, service) key. """
+
+    def __init__(self):
+        self.buckets = dict()
+        self.lock = Lock()
+
+    def bucket(self, key):
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(
+                    rate=app.config.get('AWS_RATE_LIMIT_INITIAL', 50),
+                    min_rate=app.config.get('AWS_RATE_LIMIT_MIN', 0.5),
+                    max_rate=app.config.get('AWS_RATE_LIMIT_MAX', 100),
+                    increase=app.config.get('AWS_RATE_LIMIT_INCREASE', 0.05),
+                    decrease=app.config.get('AWS_RATE_LIMIT_DECREASE', 0.5))
+            return self.buckets[key]
+
+    def call(self, key, func, *args, **kwargs):
+        """
+        Calls func once a token is available for the key.  Throttled calls slow the
+        key down and are retried; any other exception is raised to the caller.
+        """
+        bucket = self.bucket(key)
+        attempts = 0
+        while True:
+            attempts += 1
+            bucket.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                bucket.throttled()
+                app.logger.warn("Being rate-limited by AWS on {}. Slowing down to {:.2f} calls per second. "
+                                "Attempt {}".format(key, bucket.rate, attempts))
+                continue
+
+            bucket.succeeded()
+            return result
+
+    def state(self):
+        """ Returns {key: {rate, tokens, calls, throttles}} for every key seen so far. """
+        with self.lock:
+            buckets = self.buckets.items()
+        return {key: bucket.state() for key, bucket in buckets}
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+rate_limiter = RateLimiter()
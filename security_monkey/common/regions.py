@@ -0,0 +1,102 @@
+"""
+.. module: security_monkey.common.regions
+    :platform: Unix
+    :synopsis: Cached, per-account region discovery.
+
+.. version:: $$VERSION$$
+
+"""
+import datetime
+from threading import Lock, Thread
+
+from security_monkey import app, db, ARN_PARTITION
+from security_monkey.common.sts_connect import assume_role, get_session
+from security_monkey.datastore import Account, AccountRegionCache
+
+_refreshing = set()
+_refreshing_lock = Lock()
+
+
+def get_skipped_regions(account):
+    """
+    Returns the set of regions that should never be scanned for the given account.
+    These come from the comma separated `skip_regions` custom field on the account.
+    """
+    skip_regions = account.getCustom('skip_regions') or ''
+    return set([region.strip() for region in skip_regions.split(',') if region.strip()])
+
+
+def fetch_available_regions(account, service_name):
+    """ Asks AWS which regions the service is available in. This assumes a role into the account. """
+    session = get_session(assume_role(account))
+    return session.get_available_regions(service_name, partition_name=ARN_PARTITION)
+
+
+def get_available_regions(account, service_name):
+    """
+    Returns the regions the service is available in for the account.
+
+    The answer is stored in the account_region_cache table.  A missing entry is fetched
+    right away.  An entry older than REGION_CACHE_TTL seconds is returned as-is and
+    refreshed on a background thread, so watchers never wait on STS for a stale entry.
+    """
+    cached = AccountRegionCache.query.filter(
+        AccountRegionCache.account_id == account.id,
+        AccountRegionCache.service == service_name).first()
+
+    if not cached:
+        return refresh_available_regions(account, service_name)
+
+    ttl = datetime.timedelta(seconds=app.config.get('REGION_CACHE_TTL', 86400))
+    if cached.date_refreshed + ttl < datetime.datetime.utcnow():
+        _refresh_in_background(account.id, service_name)
+
+    return list(cached.regions)
+
+
+def refresh_available_regions(account, service_name):
+    """ Fetches the regions for the account and service and stores them in the cache. """
+    regions = fetch_available_regions(account, service_name)
+
+    cached = AccountRegionCache.query.filter(
+        AccountRegionCache.account_id == account.id,
+        AccountRegionCache.service == service_name).first()
+    if not cached:
+        cached = AccountRegionCache(account_id=account.id, service=service_name)
+
+    cached.regions = regions
+    cached.date_refreshed = datetime.datetime.utcnow()
+    try:
+        db.session.add(cached)
+        db.session.commit()
+    except Exception as e:
+        # Another worker may have cached the same entry first.  The regions are still good:
+        app.logger.debug("Unable to cache regions for {}/{}: {}".format(account.name, service_name, e))
+        db.session.rollback()
+
+    return list(regions)
+
+
+def _refresh_in_background(account_id, service_name):
+    key = (account_id, service_name)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def refresh():
+        try:
+            account = Account.query.filter(Account.id == account_id).first()
+            if account:
+                refresh_available_regions(account, service_name)
+        except Exception as e:
+            app.logger.warn("Unable to refresh the regions for account {} and service {}: {}".format(
+                account_id, service_name, e))
+        finally:
+            db.session.remove()
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    thread = Thread(target=refresh, name='region-refresh-{}-{}'.format(account_id, service_name))
+    thread.daemon = True
+    thread.start()
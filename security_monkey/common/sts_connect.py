@@ -23,7 +23,135 @@ from security_monkey.datastore import Account
 import botocore.session
 import boto3
 import boto
-from security_monkey import app, AWS_DEFAULT_REGION, ARN_PREFIX
+from security_monkey import app, AWS_DEFAULT_REGION, ARN_PREFIX, ARN_PARTITION
+
+from threading import Lock
+import calendar
+import time
+import weakref
+
+# Assumed role credentials and the boto3 clients built from them are shared by every
+# watcher in this process.  Keyed on (account identifier, role name, partition):
+_role_cache = {}
+_client_cache = {}
+_cache_locks = {}
+_cache_lock = Lock()
+
+# The account identifier of every live connection made here, for the rate limiter:
+_connection_accounts = weakref.WeakKeyDictionary()
+
+
+def get_role_name(account):
+    """ Returns the name of the role Security Monkey assumes into the given account. """
+    role_name = account.getCustom("role_name")
+    return role_name if role_name else 'SecurityMonkey'
+
+
+def _expires_at(role):
+    """ Seconds since the epoch at which the assumed role credentials expire. """
+    expiration = role['Credentials']['Expiration']
+    if isinstance(expiration, basestring):
+        import dateutil.parser
+        expiration = dateutil.parser.parse(expiration)
+    return calendar.timegm(expiration.utctimetuple())
+
+
+def _key_lock(key):
+    with _cache_lock:
+        if key not in _cache_locks:
+            _cache_locks[key] = Lock()
+        return _cache_locks[key]
+
+
+def assume_role(account):
+    """
+    Returns the sts.assume_role() response for Security Monkey's role in the given account.
+
+    The response is cached per (account identifier, role name, partition) and is only
+    refreshed once the credentials come within STS_REFRESH_BEFORE_EXPIRY seconds of expiring.
+    Concurrent callers for the same account wait on the one assume_role call in flight.
+    """
+    role_name = get_role_name(account)
+    key = (account.identifier, role_name, ARN_PARTITION)
+    refresh_margin = app.config.get('STS_REFRESH_BEFORE_EXPIRY', 300)
+
+    with _key_lock(key):
+        role = _role_cache.get(key)
+        if role and _expires_at(role) - time.time() > refresh_margin:
+            return role
+
+        sts = boto3.client('sts', region_name=AWS_DEFAULT_REGION)
+        arn = ARN_PREFIX + ':iam::' + account.identifier + ':role/' + role_name
+        role = sts.assume_role(RoleArn=arn, RoleSessionName='secmonkey')
+        app.logger.debug("Assumed role {} for {}".format(arn, account.name))
+
+        with _cache_lock:
+            _role_cache[key] = role
+            # Clients built from the previous credentials are stale now:
+            for client_key in [client_key for client_key in _client_cache if client_key[0] == key]:
+                del _client_cache[client_key]
+
+        return role
+
+
+def _remember_account(conn, role):
+    """ Records the account the role was assumed into as the account of the connection. """
+    arn = role.get('AssumedRoleUser', {}).get('Arn')
+    if arn and conn is not None:
+        with _cache_lock:
+            _connection_accounts[conn] = arn.split(':')[4]
+    return conn
+
+
+def get_connection_account(conn):
+    """ Returns the identifier of the account a connection made by connect() is for, or None. """
+    try:
+        with _cache_lock:
+            return _connection_accounts.get(conn)
+    except TypeError:  # Not weak referenceable
+        return None
+
+
+def get_session(role, region=AWS_DEFAULT_REGION):
+    """ Returns a new boto3.Session for the given sts.assume_role() response. """
+    return boto3.Session(
+        aws_access_key_id=role['Credentials']['AccessKeyId'],
+        aws_secret_access_key=role['Credentials']['SecretAccessKey'],
+        aws_session_token=role['Credentials']['SessionToken'],
+        region_name=region
+    )
+
+
+def get_client(account, tech, region=AWS_DEFAULT_REGION):
+    """
+    Returns a boto3 client for the given account, service and region.
+
+    boto3 clients are thread-safe, so a single client per (account, tech, region) is
+    shared by every watcher in the process until the underlying credentials are refreshed.
+    """
+    role = assume_role(account)
+    key = (account.identifier, get_role_name(account), ARN_PARTITION)
+    client_key = (key, tech, region)
+
+    with _cache_lock:
+        client = _client_cache.get(client_key)
+    if client:
+        return client
+
+    # boto3 sessions are not thread-safe, so each client gets its own session:
+    client = _remember_account(get_session(role, region=region).client(tech), role)
+    with _cache_lock:
+        if _role_cache.get(key) is role:
+            client = _client_cache.setdefault(client_key, client)
+    return client
+
+
+def clear_credential_cache():
+    """ Forgets all cached assumed role credentials and clients. """
+    with _cache_lock:
+        _role_cache.clear()
+        _client_cache.clear()
+
 
 def connect(account_name, connection_type, **args):
     """
@@ -47,17 +175,13 @@ def connect(account_name, connection_type, **args):
             in the target account with full read only privileges.
     """
     region = AWS_DEFAULT_REGION
+    account = None
 
     if 'assumed_role' in args:
         role = args['assumed_role']
     else:
         account = Account.query.filter(Account.name == account_name).first()
-        sts = boto3.client('sts', region_name=region)
-        role_name = 'SecurityMonkey'
-        if account.getCustom("role_name") and account.getCustom("role_name") != '':
-            role_name = account.getCustom("role_name")
-        arn =ARN_PREFIX + ':iam::' + account.identifier +':role/' + role_name
-        role = sts.assume_role(RoleArn=arn, RoleSessionName='secmonkey')
+        role = assume_role(account)
 
     if connection_type == 'botocore':
         botocore_session = botocore.session.get_session()
@@ -76,23 +200,21 @@ def connect(account_name, connection_type, **args):
     if 'boto3' in connection_type:
         # Should be called in this format: boto3.iam.client
         _, tech, api = connection_type.split('.')
-        session = boto3.Session(
-            aws_access_key_id=role['Credentials']['AccessKeyId'],
-            aws_secret_access_key=role['Credentials']['SecretAccessKey'],
-            aws_session_token=role['Credentials']['SessionToken'],
-            region_name=region
-        )
+        if api == 'client' and account:
+            return get_client(account, tech, region=region)
+
+        session = get_session(role, region=region)
         if api == 'resource':
             return session.resource(tech)
-        return session.client(tech)
+        return _remember_account(session.client(tech), role)
 
     module = __import__("boto.{}".format(connection_type))
     for subm in connection_type.split('.'):
         module = getattr(module, subm)
 
-    return module.connect_to_region(
+    return _remember_account(module.connect_to_region(
         region,
         aws_access_key_id=role['Credentials']['AccessKeyId'],
         aws_secret_access_key=role['Credentials']['SecretAccessKey'],
         security_token=role['Credentials']['SessionToken']
-    )
+    ), role)
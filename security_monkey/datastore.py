@@ -21,27 +21,36 @@
 
 """
 import datetime
-import hashlib
-import json
 import traceback
-from copy import deepcopy
 
-import dpath.util
-from dpath.exceptions import PathNotFound
 from flask_security.core import UserMixin, RoleMixin
 from sqlalchemy import BigInteger
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Unicode, Text
-from sqlalchemy import select, func
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Unicode, Text, Float
+from sqlalchemy import select, func, or_
 from sqlalchemy.dialects.postgresql import CIDR
 from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import deferred
-from sqlalchemy.orm import relationship, column_property
-from sqlalchemy.schema import ForeignKey, UniqueConstraint
+from sqlalchemy.orm import deferred, undefer
+from sqlalchemy.orm import relationship
+from sqlalchemy.schema import ForeignKey, Index, UniqueConstraint
 
 from auth.models import RBACUserMixin
 from security_monkey import db, app
-from security_monkey.common.utils import sub_dict
+from security_monkey.common.config_hash import hash_config, hash_item
+
+class JSONB(JSON):
+    """
+    Postgres JSONB.  SQLAlchemy 0.9.2 predates its JSONB type, so this is the JSON type, which
+    psycopg2 decodes natively either way, with the JSONB name in DDL.  The `->` and `->>`
+    operators work the same on both.
+    """
+
+
+@compiles(JSONB, 'postgresql')
+def _compile_jsonb(type_, compiler, **kw):
+    return 'JSONB'
+
 
 association_table = db.Table(
     'association',
@@ -79,6 +88,7 @@ class Account(db.Model):
     unique_const = UniqueConstraint('account_type_id', 'identifier')
 
     exceptions = relationship("ExceptionLogs", backref="account", cascade="all, delete, delete-orphan")
+    region_cache = relationship("AccountRegionCache", backref="account", cascade="all, delete, delete-orphan")
 
     def getCustom(self, name):
         for field in self.custom_fields:
@@ -99,6 +109,37 @@ class AccountTypeCustomValues(db.Model):
     unique_const = UniqueConstraint('account_id', 'name')
 
 
+class AccountRegionCache(db.Model):
+    """
+    Caches the regions a service is available in for an account, so watchers
+    don't need to assume a role just to discover them.
+    """
+    __tablename__ = "account_region_cache"
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey("account.id"), nullable=False, index=True)
+    service = Column(String(64), nullable=False)
+    regions = Column(JSON)
+    date_refreshed = Column(DateTime(), default=datetime.datetime.utcnow, nullable=False)
+    __table_args__ = (UniqueConstraint('account_id', 'service'), )
+
+
+class WatcherCheckpoint(db.Model):
+    """
+    Remembers how far a batched watcher got through an account and technology, so a
+    restarted run can resume at the next unprocessed batch instead of starting over.
+    """
+    __tablename__ = "watcher_checkpoint"
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey("account.id"), nullable=False)
+    tech_id = Column(Integer, ForeignKey("technology.id"), nullable=False)
+    total_list = deferred(Column(JSON))
+    batched_size = Column(Integer, nullable=False)
+    batch_counter = Column(Integer, nullable=False, default=0)
+    date_created = Column(DateTime(), default=datetime.datetime.utcnow, nullable=False)
+    date_updated = Column(DateTime(), default=datetime.datetime.utcnow, nullable=False)
+    __table_args__ = (UniqueConstraint('account_id', 'tech_id'), )
+
+
 class AnchoreConfig(db.Model):
     """
     Defines the values for custom fields defined in Anchore Configuration Data.
@@ -211,6 +252,7 @@ class ItemAudit(db.Model):
     justified_user_id = Column(Integer, ForeignKey("user.id"), nullable=True, index=True)
     justification = Column(String(512))
     justified_date = Column(DateTime(), default=datetime.datetime.utcnow, nullable=True)
+    date_created = Column(DateTime(), default=datetime.datetime.utcnow, nullable=False, index=True)
     item_id = Column(Integer, ForeignKey("item.id"), nullable=False, index=True)
     auditor_setting_id = Column(Integer, ForeignKey("auditorsettings.id"), nullable=True, index=True)
     sub_items = relationship("Item", secondary=issue_item_association, backref="super_issues")
@@ -269,6 +311,12 @@ class Item(db.Model):
     tech_id = Column(Integer, ForeignKey("technology.id"), nullable=False, index=True)
     account_id = Column(Integer, ForeignKey("account.id"), nullable=False, index=True)
     latest_revision_id = Column(Integer, nullable=True)
+    # When the item was created, which is the date of its first revision:
+    first_seen = Column(DateTime(), default=datetime.datetime.utcnow, nullable=False, index=True)
+    # The totals of the open issues whose auditor settings are enabled, kept by update_item_scores:
+    score = Column(Integer, nullable=False, default=0, server_default='0', index=True)
+    unjustified_score = Column(Integer, nullable=False, default=0, server_default='0', index=True)
+    issue_count = Column(Integer, nullable=False, default=0, server_default='0')
     comments = relationship("ItemComment", backref="revision", cascade="all, delete, delete-orphan", order_by="ItemComment.date_created")
     revisions = relationship("ItemRevision", backref="item", cascade="all, delete, delete-orphan", order_by="desc(ItemRevision.date_created)", lazy="dynamic")
     issues = relationship("ItemAudit", backref="item", cascade="all, delete, delete-orphan")
@@ -276,59 +324,6 @@ class Item(db.Model):
     issues = relationship("ItemAudit", backref="item", cascade="all, delete, delete-orphan", foreign_keys="ItemAudit.item_id")
     exceptions = relationship("ExceptionLogs", backref="item", cascade="all, delete, delete-orphan")
 
-    @hybrid_property
-    def score(self):
-        return db.session.query(
-            func.cast(
-                func.sum(ItemAudit.score),
-                Integer)
-        ).filter(
-            ItemAudit.item_id == self.id,
-            ItemAudit.auditor_setting_id == AuditorSettings.id,
-            ItemAudit.fixed == False,
-            AuditorSettings.disabled == False).one()[0] or 0
-
-    @score.expression
-    def score(cls):
-        return select([func.sum(ItemAudit.score)]). \
-            where(ItemAudit.item_id == cls.id). \
-            where(ItemAudit.auditor_setting_id == AuditorSettings.id). \
-            where(ItemAudit.fixed == False). \
-            where(AuditorSettings.disabled == False). \
-            label('item_score')
-
-    @hybrid_property
-    def unjustified_score(self):
-        return db.session.query(
-            func.cast(
-                func.sum(ItemAudit.score),
-                Integer)
-        ).filter(
-            ItemAudit.item_id == self.id,
-            ItemAudit.justified == False,
-            ItemAudit.fixed == False,
-            ItemAudit.auditor_setting_id == AuditorSettings.id,
-            AuditorSettings.disabled == False).one()[0] or 0
-
-    @unjustified_score.expression
-    def unjustified_score(cls):
-        return select([func.sum(ItemAudit.score)]). \
-            where(ItemAudit.item_id == cls.id). \
-            where(ItemAudit.justified == False). \
-            where(ItemAudit.fixed == False). \
-            where(ItemAudit.auditor_setting_id == AuditorSettings.id). \
-            where(AuditorSettings.disabled == False). \
-            label('item_unjustified_score')
-
-    issue_count = column_property(
-        select([func.count(ItemAudit.id)])
-        .where(ItemAudit.item_id == id)
-        .where(ItemAudit.fixed == False)
-        .where(ItemAudit.auditor_setting_id == AuditorSettings.id)
-        .where(AuditorSettings.disabled == False),
-        deferred=True
-    )
-
     @hybrid_property
     def latest_config(self):
         """Returns the config from the latest item revision."""
@@ -336,6 +331,19 @@ class Item(db.Model):
             ).filter(ItemRevision.id==self.latest_revision_id).one().config
 
 
+class ItemDependency(db.Model):
+    """
+    The support items an auditor looked at the last time it audited an item, so a change to a
+    support item only needs the items that depend on it to be reaudited.  Every audited item also
+    gets a row without a support item, which marks it as tracked.
+    """
+    __tablename__ = "itemdependency"
+    id = Column(Integer, primary_key=True)
+    auditor_class = Column(String(128), nullable=False)
+    item_id = Column(Integer, ForeignKey("item.id", ondelete="CASCADE"), nullable=False, index=True)
+    support_item_id = Column(Integer, ForeignKey("item.id", ondelete="CASCADE"), nullable=True, index=True)
+
+
 class ItemComment(db.Model):
     """
     The Web UI allows users to add comments to items.
@@ -365,7 +373,8 @@ class ItemRevision(db.Model):
     __tablename__ = "itemrevision"
     id = Column(Integer, primary_key=True)
     active = Column(Boolean())
-    config = deferred(Column(JSON))
+    # GIN indexed with jsonb_path_ops, and with gin_trgm_ops on config::text (see config_search):
+    config = deferred(Column(JSONB))
     date_created = Column(DateTime(), default=datetime.datetime.utcnow, nullable=False, index=True)
     date_last_ephemeral_change = Column(DateTime(), nullable=True, index=True)
     item_id = Column(Integer, ForeignKey("item.id"), nullable=False, index=True)
@@ -519,7 +528,39 @@ class GuardDutyEvent(db.Model):
     date_created = Column(DateTime(), default=datetime.datetime.utcnow, nullable=False, index=True)
     item_id = Column(Integer, ForeignKey("item.id"), nullable=False, index=True)
 
-    
+
+class GuardDutyPortProbe(db.Model):
+    """
+    The first port probe of the GuardDuty finding in an item's latest revision, extracted when the
+    finding is stored, so the world map and top 10 countries don't have to read the configs.
+    """
+    __tablename__ = "guarddutyportprobe"
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey("item.id", ondelete="CASCADE"), nullable=False, unique=True, index=True)
+    account_identifier = Column(String(32))
+    region = Column(String(32))
+    description = Column(Text())
+    severity = Column(Float)
+    probe_count = Column(Integer)
+    first_seen = Column(String(32))
+    last_seen = Column(String(32))
+    resource_type = Column(String(64))
+    instance_id = Column(String(64))
+    instance_name = Column(String(256))
+    local_port = Column(Integer)
+    local_port_name = Column(String(64))
+    remote_ip_v4 = Column(String(45))
+    lat = Column(Float)
+    lon = Column(Float)
+    city_name = Column(String(128))
+    country_name = Column(String(128), index=True)
+    asn = Column(String(32))
+    asn_org = Column(String(256))
+    isp = Column(String(256))
+    org = Column(String(256))
+    __table_args__ = (Index('ix_guarddutyportprobe_lat_lon', 'lat', 'lon'), )
+
+
 class Datastore(object):
     def __init__(self, debug=False):
         pass
@@ -561,46 +602,43 @@ class Datastore(object):
         :param item: dictionary, representing an item tracked in security_monkey
         :return: hash of the sorted json dump of the item with all ephemeral paths removed.
         """
-        durable_item = deepcopy(item)
-        for path in ephemeral_paths:
-            try:
-                dpath.util.delete(durable_item, path, separator='$')
-            except PathNotFound:
-                pass
-        return self.hash_config(durable_item)
+        return hash_item(item, ephemeral_paths)[1]
 
     def hash_config(self, config):
         """
         Finds the hash for a config.
-        Calls sub_dict, which is a recursive method which sorts lists which may be buried in the structure.
-        Dumps the config to json with sort_keys set.
-        Grabs an MD5 hash.
         :param config: dict describing item
         :return: 32 character string (MD5 Hash)
         """
-        item = sub_dict(config)
-        item_str = json.dumps(item, sort_keys=True)
-        item_hash = hashlib.md5(item_str) # nosec: not used for security
-        return item_hash.hexdigest()
+        return hash_config(config)
 
-    def get_all_ctype_filtered(self, tech=None, account=None, region=None, name=None, include_inactive=False):
+    def _ctype_filtered_query(self, tech=None, account=None, region=None, name=None, include_inactive=False):
         """
-        Returns a list of Items joined with their most recent ItemRevision,
-        potentially filtered by the criteria above.
+        Items joined with their most recent ItemRevision (and its config), filtered by the criteria above.
         """
-        item_map = {}
-        query = Item.query
+        query = db.session.query(Item, ItemRevision) \
+            .join((ItemRevision, Item.latest_revision_id == ItemRevision.id)) \
+            .options(undefer(ItemRevision.config))
         if tech:
             query = query.join((Technology, Item.tech_id == Technology.id)).filter(Technology.name == tech)
         if account:
             query = query.join((Account, Item.account_id == Account.id)).filter(Account.name == account)
+        if region:
+            query = query.filter(Item.region == region)
+        if name:
+            query = query.filter(Item.name == name)
+        if not include_inactive:
+            query = query.filter(ItemRevision.active == True)  # noqa
 
-        filter_by = {'region': region, 'name': name}
-        for k, v in filter_by.items():
-            if not v:
-                del filter_by[k]
+        return query
 
-        query = query.filter_by(**filter_by)
+    def get_all_ctype_filtered(self, tech=None, account=None, region=None, name=None, include_inactive=False):
+        """
+        Returns a list of Items joined with their most recent ItemRevision,
+        potentially filtered by the criteria above.
+        """
+        query = self._ctype_filtered_query(tech=tech, account=account, region=region, name=name,
+                                           include_inactive=include_inactive)
 
         attempt = 1
         while True:
@@ -616,16 +654,18 @@ class Datastore(object):
                 if attempt > 5:
                     raise Exception("Too many retries for database connections.")
 
-        for item in items:
-            if not item.latest_revision_id:
-                app.logger.debug("There are no itemrevisions for this item: {}".format(item.id))
-                continue
-            most_recent = ItemRevision.query.get(item.latest_revision_id)
-            if not most_recent.active and not include_inactive:
-                continue
-            item_map[item] = most_recent
+        return dict(items)
 
-        return item_map
+    def iter_all_ctype_filtered(self, tech=None, account=None, region=None, name=None, include_inactive=False,
+                                yield_per=1000):
+        """
+        Same as get_all_ctype_filtered, but streams (Item, ItemRevision) tuples from a server side cursor,
+        `yield_per` rows at a time, instead of loading every item at once.
+        """
+        query = self._ctype_filtered_query(tech=tech, account=account, region=region, name=name,
+                                           include_inactive=include_inactive)
+        for item, item_revision in query.yield_per(yield_per):
+            yield item, item_revision
 
     def get(self, ctype, region, account, name):
         """
@@ -663,34 +703,44 @@ class Datastore(object):
         if arn:
             item.arn = arn
 
-        item.latest_revision_complete_hash = self.hash_config(config)
-        item.latest_revision_durable_hash = self.durable_hash(
+        item.latest_revision_complete_hash, item.latest_revision_durable_hash = hash_item(
             config,
             self.ephemeral_paths_for_tech(tech=ctype))
 
+        now = datetime.datetime.utcnow()
         if ephemeral:
             item_revision = item.revisions.first()
             item_revision.config = config
-            item_revision.date_last_ephemeral_change = datetime.datetime.utcnow()
+            item_revision.date_last_ephemeral_change = now
         else:
-            item_revision = ItemRevision(active=active_flag, config=config)
+            item_revision = ItemRevision(active=active_flag, config=config, date_created=now)
+            if not item.latest_revision_id:
+                # This is the item's first revision:
+                item.first_seen = now
             item.revisions.append(item_revision)
 
+        issues_changed = False
         # Add new issues
         for new_issue in new_issues:
             nk = "{}/{}".format(new_issue.issue, new_issue.notes)
             if nk not in ["{}/{}".format(old_issue.issue, old_issue.notes) for old_issue in item.issues]:
+                new_issue.date_created = now
                 item.issues.append(new_issue)
                 db.session.add(new_issue)
+                issues_changed = True
 
         # Delete old issues
         for old_issue in item.issues:
             ok = "{}/{}".format(old_issue.issue, old_issue.notes)
             if ok not in ["{}/{}".format(new_issue.issue, new_issue.notes) for new_issue in new_issues]:
                 db.session.delete(old_issue)
+                issues_changed = True
 
         db.session.add(item)
         db.session.add(item_revision)
+        if issues_changed:
+            db.session.flush()
+            update_item_scores([item.id])
         db.session.commit()
 
         self._set_latest_revision(item)
@@ -744,6 +794,51 @@ class Datastore(object):
         return item
 
 
+def _item_score_expressions():
+    """ The item's score, unjustified score and issue count, computed from its issues. """
+    def aggregate(column, *criteria):
+        query = select([func.coalesce(column, 0)]).where(ItemAudit.item_id == Item.id)
+        query = query.where(ItemAudit.auditor_setting_id == AuditorSettings.id)
+        query = query.where(ItemAudit.fixed == False).where(AuditorSettings.disabled == False)
+        for criterion in criteria:
+            query = query.where(criterion)
+        return query.as_scalar()
+
+    return dict(
+        score=aggregate(func.sum(ItemAudit.score)),
+        unjustified_score=aggregate(func.sum(ItemAudit.score), ItemAudit.justified == False),
+        issue_count=aggregate(func.count(ItemAudit.id)))
+
+
+def update_item_scores(item_ids):
+    """
+    Recomputes the stored score, unjustified_score and issue_count of the items with a single
+    UPDATE.  This must be called whenever issues are added, fixed, justified or removed, or their
+    auditor settings are enabled or disabled.  Pending changes are flushed first, so the scores
+    are written in the same transaction as the issues.  Nothing is committed.
+    """
+    item_ids = set([item_id for item_id in item_ids if item_id is not None])
+    if not item_ids:
+        return
+
+    db.session.flush()
+    db.session.execute(Item.__table__.update().where(Item.id.in_(item_ids)).values(**_item_score_expressions()))
+
+
+def find_inconsistent_item_scores():
+    """
+    :return: (item id, stored score, unjustified score, issue count, computed score, unjustified
+             score, issue count) for every item whose stored scores don't match its issues.
+    """
+    expressions = _item_score_expressions()
+    query = db.session.query(Item.id, Item.score, Item.unjustified_score, Item.issue_count,
+                             expressions['score'], expressions['unjustified_score'], expressions['issue_count'])
+    query = query.filter(or_(Item.score != expressions['score'],
+                             Item.unjustified_score != expressions['unjustified_score'],
+                             Item.issue_count != expressions['issue_count']))
+    return query.order_by(Item.id).all()
+
+
 def store_exception(source, location, exception, ttl=None):
     """
     Method to store exceptions in the database.
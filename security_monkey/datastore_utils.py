@@ -1,12 +1,9 @@
-import hashlib
-import json
-
 import datetime
-import dpath.util
-from dpath.exceptions import PathNotFound
-from copy import deepcopy
+
+from sqlalchemy import bindparam
 
 from security_monkey import datastore, app
+from security_monkey.common import config_hash
 from cloudaux.orchestration.aws.arn import ARN
 from security_monkey.datastore import Item, ItemRevision, ItemAudit
 
@@ -14,46 +11,120 @@ prims = [int, str, unicode, bool, float, type(None)]
 
 
 def persist_item(item, db_item, technology, account, complete_hash, durable_hash, durable):
-    if not db_item:
-        if account.account_type.name != "AWS":
-            db_item = create_item(item, technology, account)
-        else:
-            db_item = create_item_aws(item, technology, account)
+    persister = BatchPersister(technology, account)
+    persister.add(item, db_item, complete_hash, durable_hash, durable)
+    persister.commit()
 
-    if db_item.latest_revision_complete_hash == complete_hash:
-        app.logger.debug("Change persister doesn't see any change. Ignoring...")
-        return
 
-    # Create the new revision
-    if durable:
-        revision = create_revision(item.config, db_item)
-        db_item.revisions.append(revision)
+class BatchPersister(object):
+    """
+    Collects the new revisions and item updates for a batch of items and writes them in one transaction.
 
-    # Ephemeral -- update the existing revision:
-    else:
-        revision = db_item.revisions.first()
-        revision.date_last_ephemeral_change = datetime.datetime.utcnow()
-        revision.config = item.config
-        app.logger.debug("Persisting EPHEMERAL change to item: {technology}/{account}/{item}".format(
-            technology=technology.name, account=account.name, item=db_item.name
-        ))
+    New items and new revisions are each inserted with a single multi-row INSERT ... RETURNING,
+    and the hashes and latest_revision_id of every item are then set with one UPDATE statement.
+    """
 
-    db_item.latest_revision_complete_hash = complete_hash
-    db_item.latest_revision_durable_hash = durable_hash
+    def __init__(self, technology, account):
+        self.technology = technology
+        self.account = account
+        self.pending = []
 
-    datastore.db.session.add(db_item)
-    datastore.db.session.add(revision)
-    datastore.db.session.commit()
+    def add(self, item, db_item, complete_hash, durable_hash, durable):
+        """ Queues the change that detect_change found for item. Takes the same arguments as persist_item. """
+        if not db_item:
+            if self.account.account_type.name != "AWS":
+                db_item = create_item(item, self.technology, self.account)
+            else:
+                db_item = create_item_aws(item, self.technology, self.account)
 
-    if durable:
-        app.logger.debug("Persisting DURABLE change to item: {technology}/{account}/{item}".format(
-            technology=technology.name, account=account.name, item=db_item.name
-        ))
-        datastore.db.session.refresh(revision)
-        db_item.latest_revision_id = revision.id
-        datastore.db.session.add(revision)
-        datastore.db.session.add(db_item)
-        datastore.db.session.commit()
+        if db_item.latest_revision_complete_hash == complete_hash:
+            app.logger.debug("Change persister doesn't see any change. Ignoring...")
+            return
+
+        self.pending.append((db_item, item.config, complete_hash, durable_hash, durable))
+
+    def add_deleted(self, db_item, config, complete_hash, durable_hash):
+        """ Queues the inactive revision for an item that no longer exists. """
+        self.pending.append((db_item, config, complete_hash, durable_hash, True))
+
+    def commit(self):
+        if not self.pending:
+            return
+
+        session = datastore.db.session
+        now = datetime.datetime.utcnow()
+        try:
+            item_ids = self._insert_new_items(session, now)
+
+            # Ephemeral -- update the existing revision:
+            ephemeral = []
+            for db_item, config, _, _, durable in self.pending:
+                if durable:
+                    continue
+                app.logger.debug("Persisting EPHEMERAL change to item: {technology}/{account}/{item}".format(
+                    technology=self.technology.name, account=self.account.name, item=db_item.name
+                ))
+                revision_id = db_item.latest_revision_id or db_item.revisions.first().id
+                ephemeral.append(dict(_revision_id=revision_id, _config=config, _date=now))
+
+            if ephemeral:
+                revisions = ItemRevision.__table__
+                session.execute(revisions.update().where(revisions.c.id == bindparam('_revision_id')).values(
+                    config=bindparam('_config'), date_last_ephemeral_change=bindparam('_date')), ephemeral)
+
+            # Create the new revisions:
+            revision_ids = self._insert_new_revisions(session, item_ids, now)
+
+            items = Item.__table__
+            session.execute(items.update().where(items.c.id == bindparam('_item_id')).values(
+                latest_revision_id=bindparam('_revision_id'),
+                latest_revision_complete_hash=bindparam('_complete_hash'),
+                latest_revision_durable_hash=bindparam('_durable_hash')),
+                [dict(_item_id=item_ids[index],
+                      _revision_id=revision_ids.get(item_ids[index], db_item.latest_revision_id),
+                      _complete_hash=complete_hash,
+                      _durable_hash=durable_hash)
+                 for index, (db_item, _, complete_hash, durable_hash, _) in enumerate(self.pending)])
+
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self.pending = []
+
+    def _insert_new_items(self, session, now):
+        """ :return: the item id for every pending change, in the same order as self.pending. """
+        new_items = [db_item for db_item, _, _, _, _ in self.pending if not db_item.id]
+        inserted = {}
+        if new_items:
+            items = Item.__table__
+            rows = session.execute(items.insert().values([
+                dict(region=db_item.region, name=db_item.name, arn=db_item.arn,
+                     tech_id=db_item.tech_id, account_id=db_item.account_id, first_seen=now)
+                for db_item in new_items]).returning(items.c.id, items.c.name, items.c.region)).fetchall()
+            inserted = dict(((row.name, row.region), row.id) for row in rows)
+
+        return [db_item.id or inserted[(db_item.name, db_item.region)] for db_item, _, _, _, _ in self.pending]
+
+    def _insert_new_revisions(self, session, item_ids, now):
+        """ :return: dict of item id -> id of its new revision. """
+        values = []
+        for index, (db_item, config, _, _, durable) in enumerate(self.pending):
+            if not durable:
+                continue
+            app.logger.debug("Persisting DURABLE change to item: {technology}/{account}/{item}".format(
+                technology=self.technology.name, account=self.account.name, item=db_item.name
+            ))
+            values.append(dict(active=is_active(config), config=config, item_id=item_ids[index], date_created=now))
+
+        if not values:
+            return {}
+
+        revisions = ItemRevision.__table__
+        rows = session.execute(revisions.insert().values(values).returning(
+            revisions.c.id, revisions.c.item_id)).fetchall()
+        return dict((row.item_id, row.id) for row in rows)
 
 
 def is_active(config):
@@ -109,31 +180,76 @@ def detect_change(item, account, technology, complete_hash, durable_hash):
     :return: bool. True if the database differs from our copy of item
     """
     result = result_from_item(item, account, technology)
+    is_change, change_type, created_changed = _classify_change(item, result, complete_hash, durable_hash)
+    return is_change, change_type, result, created_changed
+
 
+def detect_changes(items, account, technology, hashes):
+    """
+    Bulk version of detect_change for a batch of items from the same account and technology.
+
+    The hashes of all items are loaded in a single query.  Only the items that have changed
+    are then loaded in full (again in a single query), so a batch without any changes makes
+    a single trip to the database.
+
+    :param items: list of items tracked by Security Monkey
+    :param hashes: list of (complete_hash, durable_hash) tuples, one for each item
+    :return: list of detect_change results, in the same order as items
+    """
+    latest = {}
+    names = set([item.name for item in items])
+    if names:
+        rows = datastore.db.session.query(
+            Item.id, Item.name, Item.region, Item.latest_revision_complete_hash, Item.latest_revision_durable_hash
+        ).filter(Item.account_id == account.id, Item.tech_id == technology.id, Item.name.in_(names)).all()
+        latest = dict(((row.name, row.region), row) for row in rows)
+
+    classified = []
+    for item, (complete_hash, durable_hash) in zip(items, hashes):
+        row = latest.get((item.name, item.region))
+        classified.append((row,) + _classify_change(item, row, complete_hash, durable_hash))
+
+    changed_ids = set([row.id for row, is_change, _, _ in classified if row and is_change])
+    db_items = {}
+    if changed_ids:
+        db_items = dict((db_item.id, db_item) for db_item in Item.query.filter(Item.id.in_(changed_ids)).all())
+
+    # Unchanged items don't need their DB item, so don't load it:
+    return [(is_change, change_type, db_items.get(row.id) if row and is_change else None, created_changed)
+            for row, is_change, change_type, created_changed in classified]
+
+
+def _classify_change(item, result, complete_hash, durable_hash):
+    """
+    Compares the hashes of item against those of its latest revision in the DB.
+
+    :param result: the DB item (or any row with its latest revision hashes), None if it doesn't exist yet
+    :return: (is_change, change_type, created_changed)
+    """
     # new item doesn't yet exist in DB
     if not result:
         app.logger.debug("Couldn't find item: {tech}/{account}/{region}/{item} in DB.".format(
             tech=item.index, account=item.account, region=item.region, item=item.name
         ))
-        return True, 'durable', result, 'created'
+        return True, 'durable', 'created'
 
     if result.latest_revision_durable_hash != durable_hash:
         app.logger.debug("Item: {tech}/{account}/{region}/{item} in DB has a DURABLE CHANGE.".format(
             tech=item.index, account=item.account, region=item.region, item=item.name
         ))
-        return True, 'durable', result, 'changed'
+        return True, 'durable', 'changed'
 
     elif result.latest_revision_complete_hash != complete_hash:
         app.logger.debug("Item: {tech}/{account}/{region}/{item} in DB has an EPHEMERAL CHANGE.".format(
             tech=item.index, account=item.account, region=item.region, item=item.name
         ))
-        return True, 'ephemeral', result, None
+        return True, 'ephemeral', None
 
     else:
         app.logger.debug("Item: {tech}/{account}/{region}/{item} in DB has NO CHANGE.".format(
             tech=item.index, account=item.account, region=item.region, item=item.name
         ))
-        return False, None, result, None
+        return False, None, None
 
 
 def result_from_item(item, account, technology):
@@ -150,6 +266,7 @@ def inactivate_old_revisions(watcher, arns, account, technology):
     ).join((ItemRevision, Item.latest_revision_id == ItemRevision.id)) \
         .filter(ItemRevision.active == True).all()  # noqa
 
+    persister = BatchPersister(technology, account)
     for db_item in result:
         app.logger.debug("Deleting {technology}/{account}/{name}".format(
             technology=technology.name, account=account.name, name=db_item.name
@@ -157,26 +274,10 @@ def inactivate_old_revisions(watcher, arns, account, technology):
 
         # Create the new revision
         config = {"Arn": db_item.arn}
-        revision = create_revision(config, db_item)
-        db_item.revisions.append(revision)
-
         complete_hash, durable_hash = hash_item(config, watcher.ephemeral_paths)
+        persister.add_deleted(db_item, config, complete_hash, durable_hash)
 
-        db_item.latest_revision_complete_hash = complete_hash
-        db_item.latest_revision_durable_hash = durable_hash
-
-        # Add the revision:
-        datastore.db.session.add(db_item)
-        datastore.db.session.add(revision)
-        datastore.db.session.commit()
-
-        # Do it again to update the latest revision ID:
-        datastore.db.session.refresh(revision)
-        db_item.latest_revision_id = revision.id
-        datastore.db.session.add(db_item)
-
-        datastore.db.session.commit()
-
+    persister.commit()
     return result
 
 
@@ -188,28 +289,17 @@ def hash_item(config, ephemeral_paths):
     :param config:
     :param item: dictionary, typically representing an item tracked in SM
                  such as an IAM role
-    :return: hash of the json dump of the item
+    :return: (complete hash, durable hash) of the json dump of the item, both from a single pass
     """
-    complete = hash_config(config)
-    durable = durable_hash(config, ephemeral_paths)
-    return complete, durable
+    return config_hash.hash_item(config, ephemeral_paths)
 
 
 def durable_hash(config, ephemeral_paths):
-    durable_item = deepcopy(config)
-    for path in ephemeral_paths:
-        try:
-            dpath.util.delete(durable_item, path, separator='$')
-        except PathNotFound:
-            pass
-    return hash_config(durable_item)
+    return config_hash.hash_item(config, ephemeral_paths)[1]
 
 
 def hash_config(config):
-    item = sub_dict(config)
-    item_str = json.dumps(item, sort_keys=True)
-    item_hash = hashlib.md5(item_str) # nosec: not used for security
-    return item_hash.hexdigest()
+    return config_hash.hash_config(config)
 
 
 def sub_list(l):
@@ -14,9 +14,7 @@ from functools import update_wrapper, wraps
 
 from security_monkey.datastore import Account, store_exception
 from security_monkey.exceptions import BotoConnectionIssue
-from security_monkey import app, sentry, AWS_DEFAULT_REGION, ARN_PREFIX, ARN_PARTITION
-
-import boto3
+from security_monkey import app, sentry, AWS_DEFAULT_REGION
 
 
 def crossdomain(allowed_origins=None, methods=None, headers=None,
@@ -162,17 +160,10 @@ def get_regions(account, service_name):
     if not service_name:
         return None, [AWS_DEFAULT_REGION]
 
-    sts = boto3.client('sts')
-    role_name = 'SecurityMonkey'
-    if account.getCustom("role_name") and account.getCustom("role_name") != '':
-        role_name = account.getCustom("role_name")
-
-    arn = ARN_PREFIX + ':iam::' + account.identifier + ':role/' + role_name
-    role = sts.assume_role(RoleArn=arn, RoleSessionName='secmonkey')
-
-    session = boto3.Session(
-        aws_access_key_id=role['Credentials']['AccessKeyId'],
-        aws_secret_access_key=role['Credentials']['SecretAccessKey'],
-        aws_session_token=role['Credentials']['SessionToken']
-    )
-    return role, session.get_available_regions(service_name, partition_name=ARN_PARTITION)
+    # The watchers read the role from kwargs['assumed_role'].  It comes from the credential
+    # cache, so this only calls STS when the cached credentials are missing or about to expire.
+    from security_monkey.common.regions import get_available_regions, get_skipped_regions
+    from security_monkey.common.sts_connect import assume_role
+    role = assume_role(account)
+    skipped = get_skipped_regions(account)
+    return role, [region for region in get_available_regions(account, service_name) if region not in skipped]
@@ -1,9 +1,8 @@
 from flask import request, Response
 from flask.blueprints import Blueprint
-from sqlalchemy.sql.expression import cast
-from sqlalchemy import String
 from security_monkey import rbac
 from security_monkey.datastore import Item, ItemRevision, Account, Technology, ItemAudit, AuditorSettings
+from security_monkey.common.config_search import searchconfig_filter
 from sqlalchemy.orm import joinedload
 
 
@@ -49,7 +48,7 @@ def export_items():
         query = query.filter(ItemRevision.active == active)
     if 'searchconfig' in args:
         searchconfig = args['searchconfig']
-        query = query.filter(cast(ItemRevision.config, String).ilike('%{}%'.format(searchconfig)))
+        query = query.filter(searchconfig_filter(searchconfig))
 
     # Eager load the joins and leave the config column out of this.
     query = query.options(joinedload('issues'))
@@ -31,6 +31,7 @@ from security_monkey.scheduler import disable_accounts as sm_disable_accounts
 from security_monkey.scheduler import enable_accounts as sm_enable_accounts
 from security_monkey.backup import backup_config_to_json as sm_backup_config_to_json
 from security_monkey.common.utils import find_modules, load_plugins
+from security_monkey.common.audit_pool import start_audit_pool
 from security_monkey.datastore import Account
 from security_monkey.watcher import watcher_registry
 from security_monkey.reportmailer import report_mailer as sm_report_mailer
@@ -95,6 +96,8 @@ def find_changes(accounts, monitors):
 @manager.option('-s', '--skip_batch', dest='skip_batch', type=bool, default=False)
 def audit_changes(accounts, monitors, send_report, skip_batch):
     """ Runs auditors """
+    # The audit workers are forked before the first query:
+    start_audit_pool()
     monitor_names = _parse_tech_names(monitors)
     account_names = _parse_accounts(accounts)
     sm_audit_changes(account_names, monitor_names, send_report, skip_batch=skip_batch)
@@ -107,10 +110,12 @@ def delete_unjustified_issues(accounts, monitors):
     monitor_names = _parse_tech_names(monitors)
     account_names = _parse_accounts(accounts)
     from security_monkey.datastore import ItemAudit
+    from security_monkey.datastore import update_item_scores
     issues = ItemAudit.query.filter_by(justified=False).all()
     for issue in issues:
         del issue.sub_items[:]
         db.session.delete(issue)
+    update_item_scores([issue.item_id for issue in issues])
     db.session.commit()
 
 
@@ -582,6 +587,44 @@ def clean_stale_issues():
     clean_stale_issues()
 
 
+@manager.option('-f', '--fix', dest='fix', type=bool, default=False)
+def check_item_scores(fix):
+    """
+    Compares the stored item scores and issue counts with the item's issues,
+    and optionally recomputes the ones that don't match
+    """
+    from security_monkey.datastore import find_inconsistent_item_scores, update_item_scores
+    inconsistent = find_inconsistent_item_scores()
+    for item_id, score, unjustified_score, issue_count, expected_score, expected_unjustified_score, \
+            expected_issue_count in inconsistent:
+        app.logger.info("[-] Item {} has score {}/{} and {} issues, expected {}/{} and {} issues.".format(
+            item_id, score, unjustified_score, issue_count, expected_score, expected_unjustified_score,
+            expected_issue_count))
+
+    app.logger.info("[@] Found {} items with inconsistent scores.".format(len(inconsistent)))
+    if fix and inconsistent:
+        update_item_scores([row[0] for row in inconsistent])
+        db.session.commit()
+        app.logger.info("[+] Fixed the scores of {} items.".format(len(inconsistent)))
+
+
+@manager.command
+def store_guard_duty_port_probes():
+    """
+    Extracts the port probes of the GuardDuty findings from the latest revision of their items
+    """
+    from security_monkey.common.port_probes import store_port_probe
+    from security_monkey.datastore import Item, ItemRevision, Technology
+    query = db.session.query(Item.id, ItemRevision.config)
+    query = query.join((ItemRevision, ItemRevision.id == Item.latest_revision_id))
+    query = query.join((Technology, Technology.id == Item.tech_id)).filter(Technology.name == 'guardduty')
+    rows = query.all()
+    for item_id, config in rows:
+        store_port_probe(item_id, config)
+    db.session.commit()
+    app.logger.info("[+] Stored the port probes of {} GuardDuty items.".format(len(rows)))
+
+
 class APIServer(Command):
     def __init__(self, host='127.0.0.1', port=app.config.get('API_PORT'), workers=12):
         self.address = "{}:{}".format(host, port)
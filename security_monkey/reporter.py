@@ -114,25 +114,80 @@ class Reporter(object):
 
     def get_items_to_audit(self, watcher, auditor, watchers_with_changes):
         """
-        Returns the items that have changed if there are no changes in dependencies,
-        otherwise returns all slurped items for reauditing
+        Returns the items that have changed if there are no changes in dependencies.
+
+        If a support watcher or auditor changed and the auditor records its dependencies on it
+        (see Auditor.support_dependency_indexes), the items that depended on the changed or
+        deleted support items are added.  Otherwise returns all slurped items for reauditing.
         """
         watcher.full_audit_list = None
-        if auditor.support_watcher_indexes:
-            for support_watcher_index in auditor.support_watcher_indexes:
-                if support_watcher_index in watchers_with_changes:
-                    app.logger.debug("Upstream watcher changed {}. reauditing {}".format(
-                                     support_watcher_index, watcher.index))
-
-                    watcher.full_audit_list = auditor.read_previous_items()
-        if auditor.support_auditor_indexes:
-            for support_auditor_index in auditor.support_auditor_indexes:
-                if support_auditor_index in watchers_with_changes:
-                    app.logger.debug("Upstream auditor changed {}. reauditing {}".format(
-                                     support_auditor_index, watcher.index))
-                    watcher.full_audit_list = auditor.read_previous_items()
-
-        if watcher.full_audit_list:
-            return watcher.full_audit_list
-
-        return [item for item in watcher.created_items + watcher.changed_items]
+        support_item_ids = set()
+        for kind, support_indexes in (('watcher', auditor.support_watcher_indexes),
+                                      ('auditor', auditor.support_auditor_indexes)):
+            for support_index in support_indexes or []:
+                if support_index not in watchers_with_changes:
+                    continue
+
+                changed_ids = self._get_changed_item_ids(support_index)
+                if support_index in auditor.support_dependency_indexes and changed_ids is not None:
+                    support_item_ids.update(changed_ids)
+                    continue
+
+                app.logger.debug("Upstream {} changed {}. reauditing {}".format(
+                                 kind, support_index, watcher.index))
+                watcher.full_audit_list = auditor.read_previous_items()
+                return watcher.full_audit_list
+
+        items = [item for item in watcher.created_items + watcher.changed_items]
+        if support_item_ids:
+            app.logger.debug("Upstream items changed {}. reauditing the {} items that depend on them".format(
+                             sorted(support_item_ids), watcher.index))
+            locations = set([item.location() for item in items])
+            for item in auditor.read_dependent_items(support_item_ids):
+                if item.location() not in locations:
+                    items.append(item)
+
+        return items
+
+    def _get_changed_item_ids(self, index):
+        """
+        Returns the ids of the items the watcher for the index changed or deleted in this run,
+        or None if they are not all known.
+
+        Watchers that honor ephemerals save copies of their changed items, so the changed items
+        themselves have no db_item: those are found by their location, in a single query.
+        """
+        for monitor in self.all_monitors:
+            if monitor.watcher and monitor.watcher.index == index:
+                item_ids = set()
+                missing = []
+                for item in monitor.watcher.changed_items + monitor.watcher.deleted_items:
+                    db_item = getattr(item, 'db_item', None)
+                    if db_item is not None and db_item.id is not None:
+                        item_ids.add(db_item.id)
+                    else:
+                        missing.append(item)
+
+                if missing:
+                    found = self._find_item_ids(index, missing)
+                    if len(found) < len(set([item.location() for item in missing])):
+                        return None
+                    item_ids.update(found.values())
+                return item_ids
+        return None
+
+    def _find_item_ids(self, index, items):
+        """ Returns {location: item id} for the stored items of the index at the items' locations. """
+        from security_monkey.datastore import Account, Item, Technology
+        query = db.session.query(Item.id, Account.name, Item.region, Item.name)
+        query = query.join((Technology, Item.tech_id == Technology.id)).join((Account, Item.account_id == Account.id))
+        query = query.filter(Technology.name == index)
+        query = query.filter(Account.name.in_(set([item.account for item in items])))
+        query = query.filter(Item.name.in_(set([item.name for item in items])))
+
+        locations = set([item.location() for item in items])
+        found = dict()
+        for item_id, account, region, name in query:
+            if (index, account, region, name) in locations:
+                found[(index, account, region, name)] = item_id
+        return found
@@ -13,6 +13,7 @@ from apscheduler import events
 from apscheduler.scheduler import Scheduler
 from sqlalchemy.exc import OperationalError, InvalidRequestError, StatementError
 
+from security_monkey.common.audit_pool import start_audit_pool
 from security_monkey.datastore import Account, clear_old_exceptions, store_exception
 from security_monkey.monitors import get_monitors, get_monitors_and_dependencies, all_monitors
 from security_monkey.reporter import Reporter
@@ -76,6 +77,9 @@ def batch_logic(monitor, current_watcher, account_name, debug):
                                                                      region=region))
         return
 
+    # Remember the list, so a restarted job can resume at the next unprocessed batch:
+    current_watcher.save_checkpoint()
+
     while not current_watcher.done_slurping:
         app.logger.debug("Fetching a batch of {batch} items for {technology}/{account}.".format(
             batch=current_watcher.batched_size, technology=current_watcher.i_am_plural, account=account_name
@@ -84,12 +88,14 @@ def batch_logic(monitor, current_watcher, account_name, debug):
 
         audit_items = current_watcher.find_changes(current=items, exception_map=exception_map)
         _audit_specific_changes(monitor, audit_items, False, debug)
+        current_watcher.save_checkpoint()
 
     # Delete the items that no longer exist:
     app.logger.debug("Deleting all items for {technology}/{account} that no longer exist.".format(
         technology=current_watcher.i_am_plural, account=account_name
     ))
     current_watcher.find_deleted_batch(account_name)
+    current_watcher.clear_checkpoint()
 
 
 def audit_changes(accounts, monitor_names, send_report, debug=True, skip_batch=True):
@@ -204,6 +210,9 @@ def setup_scheduler():
     """Sets up the APScheduler"""
     log = logging.getLogger('apscheduler')
 
+    # The audit workers are forked before the first query and before any thread is started:
+    start_audit_pool()
+
     try:
         accounts = Account.query.filter(Account.third_party == False).filter(Account.active == True).all()  # noqa
         accounts = [account.name for account in accounts]
@@ -22,6 +22,7 @@
 
 import unittest
 from security_monkey import app, db
+from security_monkey.common.sts_connect import clear_credential_cache
 
 
 class SecurityMonkeyTestCase(unittest.TestCase):
@@ -30,6 +31,7 @@ class SecurityMonkeyTestCase(unittest.TestCase):
         self.test_app = self.app.test_client()
         db.drop_all()
         db.create_all()
+        clear_credential_cache()
         self.pre_test_setup()
 
     def pre_test_setup(self):
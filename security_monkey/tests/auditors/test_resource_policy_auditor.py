@@ -5,9 +5,11 @@ from security_monkey import db
 from security_monkey.watcher import ChangeItem
 from security_monkey.datastore import Datastore
 from security_monkey.datastore import Account, AccountType, ItemAudit
+from security_monkey.common.config_hash import hash_config
 from collections import namedtuple
 from policyuniverse.policy import Policy
 from copy import deepcopy
+import mock
 
 
 Item = namedtuple('Item', 'config account')
@@ -197,6 +199,32 @@ class ResourcePolicyTestCase(SecurityMonkeyTestCase):
         policies = [policy.policy for policy in rpa.load_resource_policies(test_item)]
         self.assertEqual([policy01, policy02, policy03, policy04], policies)
         
+    def test_load_policies_cached_during_audit(self):
+        policy = dict(Version='2012-10-08', Statement=[
+            dict(
+                Effect='Allow',
+                Principal='*',
+                Action='s3:GetObject',
+                Resource='*')])
+        test_item = Item(account=None, config=dict(Policy=policy))
+        rpa = ResourcePolicyAuditor(accounts=["012345678910"])
+
+        # Outside of an audit, the policies are parsed every time:
+        assert rpa.load_resource_policies(test_item)[0] is not rpa.load_resource_policies(test_item)[0]
+
+        rpa.policy_cache = {}
+        with mock.patch('security_monkey.auditor.hash_config', wraps=hash_config) as hash_item_config:
+            first = rpa.load_resource_policies(test_item)
+            second = rpa.load_resource_policies(test_item)
+        assert hash_item_config.call_count == 1
+        self.assertEqual([policy], [p.policy for p in first])
+        assert first[0] is second[0]
+        assert first[0].statements[0].whos_allowed() is second[0].statements[0].whos_allowed()
+
+        # A changed config is parsed again:
+        changed = Item(account=None, config=dict(Policy=dict(policy, Version='2012-10-17')))
+        assert rpa.load_resource_policies(changed)[0] is not first[0]
+
     def test_prep_for_audit(self):
         rpa = ResourcePolicyAuditor(accounts=["012345678910"])
         rpa.prep_for_audit()
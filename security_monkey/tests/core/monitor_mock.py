@@ -25,6 +25,7 @@ from collections import defaultdict
 
 RUNTIME_WATCHERS = defaultdict(list)
 RUNTIME_AUDIT_COUNTS = defaultdict(list)
+RUNTIME_DEPENDENT_READS = defaultdict(list)
 CURRENT_MONITORS = []
 
 
@@ -66,10 +67,11 @@ class MockRunnableWatcher(object):
 
 
 class MockRunnableAuditor(object):
-    def __init__(self, index, support_auditor_indexes, support_watcher_indexes):
+    def __init__(self, index, support_auditor_indexes, support_watcher_indexes, support_dependency_indexes=None):
         self.index = index
         self.support_auditor_indexes = support_auditor_indexes
         self.support_watcher_indexes = support_watcher_indexes
+        self.support_dependency_indexes = support_dependency_indexes or []
         self.items = []
 
     def audit_objects(self):
@@ -85,6 +87,10 @@ class MockRunnableAuditor(object):
     def read_previous_items(self):
         return [ChangeItem(index=self.index)]
 
+    def read_dependent_items(self, support_item_ids):
+        RUNTIME_DEPENDENT_READS[self.index].append(set(support_item_ids))
+        return [ChangeItem(index=self.index, name='dependent_item')]
+
 
 def build_mock_result(watcher_configs, auditor_configs):
     """
@@ -122,12 +128,14 @@ def mock_auditor(config):
     {
         'index': 'index1',
         'support_auditor_indexes': [],
-        'support_watcher_indexes': ['index2']
+        'support_watcher_indexes': ['index2'],
+        'support_dependency_indexes': ['index2']  # Optional
     }
     """
     return MockRunnableAuditor(config['index'],
                                config['support_auditor_indexes'],
-                               config['support_watcher_indexes'])
+                               config['support_watcher_indexes'],
+                               config.get('support_dependency_indexes'))
 
 
 def mock_all_monitors(account_name, debug=False):
@@ -25,8 +25,11 @@ from security_monkey.watcher import ChangeItem
 from security_monkey.datastore import Item, ItemAudit, Account, Technology, ItemRevision
 from security_monkey.datastore import AccountType, ItemAuditScore, AccountPatternAuditScore
 from security_monkey.auditor import Auditor
+from security_monkey.common.audit_pool import start_audit_pool, stop_audit_pool
+from security_monkey.account_manager import get_account_by_name
 
 from mixer.backend.flask import mixer
+import mock
 
 
 class AuditorTestObj(Auditor):
@@ -40,6 +43,25 @@ class AuditorTestObj(Auditor):
         self.add_issue(score=10, issue="Test issue", item=item)
 
 
+class MultiCheckAuditor(AuditorTestObj):
+    def check_name(self, item):
+        self.add_issue(score=int(item.name.split('_')[1]), issue="Name issue", item=item,
+                       notes='{} stored issues'.format(len(item.db_item.issues)))
+        self.add_issue(score=1, issue="Test issue", item=item)
+
+
+class DependentAuditorTestObj(Auditor):
+    index = 'test_index'
+    i_am_singular = "test auditor"
+    support_watcher_indexes = ['support_index']
+    support_dependency_indexes = ['support_index']
+
+    def check_support(self, item):
+        support_items = self.get_watcher_support_items('support_index', item.account)
+        self.add_support_dependencies(item, [support_item for support_item in support_items
+                                             if support_item.config.get('id') == item.config.get('uses')])
+
+
 class AuditorTestCase(SecurityMonkeyTestCase):
     def test_save_issues(self):
         mixer.init_app(self.app)
@@ -61,6 +83,30 @@ class AuditorTestCase(SecurityMonkeyTestCase):
         except AttributeError as e:
             self.fail("Auditor.save_issues() raised AttributeError unexpectedly: {}".format(e.message))
 
+    def test_iter_previous_items(self):
+        mixer.init_app(self.app)
+        test_account = mixer.blend(Account, name='test_account')
+        technology = mixer.blend(Technology, name='testtech')
+        for name, active in (('active', True), ('inactive', False)):
+            item = Item(region="us-west-2", name=name, arn=name, technology=technology, account=test_account)
+            revision = mixer.blend(ItemRevision, item=item, config={'name': name}, active=active)
+            item.latest_revision_id = revision.id
+        Item(region="us-west-2", name="no_revisions", technology=technology, account=test_account)
+
+        auditor = Auditor(accounts=[test_account.name])
+        auditor.index = technology.name
+
+        items = auditor.iter_previous_items()
+        assert not isinstance(items, list)
+        items = list(items)
+        assert len(items) == 1
+        assert items[0].name == 'active'
+        assert items[0].account == 'test_account'
+        assert items[0].config == {'name': 'active'}
+        assert items[0].db_item.name == 'active'
+
+        assert [item.name for item in auditor.read_previous_items()] == ['active']
+
     def test_link_to_support_item_issue(self):
         sub_item_id = 2
         issue_text = 'This is a test issue'
@@ -168,6 +214,186 @@ class AuditorTestCase(SecurityMonkeyTestCase):
         self.assertEquals(item.audit_issues[0].issue, 'Test issue')
         self.assertEquals(item.audit_issues[0].score, 2)
 
+    def test_audit_objects_compiles_override_scores_once(self):
+        mixer.init_app(self.app)
+        test_account_type = mixer.blend(AccountType, name='AWS')
+        test_account = mixer.blend(Account, name='test_account', account_type=test_account_type)
+        account_pattern_score = AccountPatternAuditScore(account_type=test_account_type.name,
+                                                         account_field='name', account_pattern=test_account.name,
+                                                         score=2)
+        mixer.blend(ItemAuditScore, technology='test_index', method='check_test (AuditorTestObj)',
+                    score=5, disabled=False, account_pattern_scores=[account_pattern_score])
+
+        items = [ChangeItem(index='test_index', account=test_account.name, name='item_{}'.format(i))
+                 for i in range(3)]
+
+        auditor = AuditorTestObj(accounts=[test_account.name])
+        auditor.items = items
+        assert AuditorTestObj.get_check_names() == ('check_test',)
+        with mock.patch('security_monkey.auditor.get_account_by_name', wraps=get_account_by_name) as get_account:
+            auditor.audit_objects()
+
+        assert get_account.call_count == 1
+        self.assertEquals([item.audit_issues[0].score for item in items], [2, 2, 2])
+        assert auditor.override_scores is None
+
+    def test_audit_objects_in_processes(self):
+        from security_monkey import db
+        mixer.init_app(self.app)
+        test_account_type = mixer.blend(AccountType, name='AWS')
+        test_account = mixer.blend(Account, name='test_account', account_type=test_account_type)
+        technology = mixer.blend(Technology, name='test_index')
+        for i in range(7):
+            db.session.add(Item(region='universal', name='item_{}'.format(i), arn='item_{}'.format(i),
+                                tech_id=technology.id, account_id=test_account.id))
+        db.session.commit()
+
+        def audit(processes):
+            # Like the scheduler, the workers are forked before the items are loaded:
+            assert (start_audit_pool(processes) is not None) == (processes > 1)
+            items = [ChangeItem(index='test_index', region='universal', account='test_account',
+                                name='item_{}'.format(i)) for i in range(7)]
+            for item in items:
+                item.db_item = Item.query.filter(Item.name == item.name).one()
+            auditor = MultiCheckAuditor(accounts=['test_account'])
+            auditor.items = items
+            self.app.config['AUDIT_PROCESSES'] = processes
+            try:
+                auditor.audit_objects()
+            finally:
+                self.app.config.pop('AUDIT_PROCESSES')
+                stop_audit_pool()
+            issues = [[(issue.issue, issue.score, issue.notes) for issue in item.audit_issues] for item in items]
+            auditor.save_issues()
+            return issues
+
+        serial = audit(1)
+        # The second pass sees the stored issues of the first through the items' db_item:
+        self.assertEquals(audit(2), audit(1))
+        self.assertNotEquals(audit(2), serial)
+
+    def test_save_issues_in_one_commit(self):
+        from security_monkey import db
+        mixer.init_app(self.app)
+        test_account_type = mixer.blend(AccountType, name='AWS')
+        test_account = mixer.blend(Account, name='test_account', account_type=test_account_type)
+        technology = mixer.blend(Technology, name='test_index')
+        for i in range(3):
+            db.session.add(Item(region='universal', name='item_{}'.format(i), arn='item_{}'.format(i),
+                                tech_id=technology.id, account_id=test_account.id))
+        db.session.commit()
+
+        auditor = AuditorTestObj(accounts=['test_account'])
+        auditor.items = [ChangeItem(index='test_index', region='universal', account='test_account',
+                                    name='item_{}'.format(i)) for i in range(3)]
+        auditor.audit_objects()
+
+        with mock.patch.object(db.session, 'commit', wraps=db.session.commit) as commit:
+            auditor.save_issues()
+        assert commit.call_count == 1
+
+        issues = ItemAudit.query.all()
+        self.assertEquals(len(issues), 3)
+        self.assertEquals(len(set([issue.auditor_setting_id for issue in issues])), 1)
+        self.assertEquals(issues[0].auditor_setting.auditor_class, 'AuditorTestObj')
+
+        # Nothing changed, so every issue is an existing issue:
+        auditor.save_issues()
+        assert all([len(item.confirmed_existing_issues) == 1 for item in auditor.items])
+        self.assertEquals(ItemAudit.query.count(), 3)
+
+    def test_save_issues_of_new_items_in_one_commit(self):
+        from security_monkey import db
+        mixer.init_app(self.app)
+        test_account_type = mixer.blend(AccountType, name='AWS')
+        mixer.blend(Account, name='test_account', account_type=test_account_type)
+        db.session.commit()
+
+        auditor = AuditorTestObj(accounts=['test_account'])
+        auditor.items = [ChangeItem(index='test_index', region='universal', account='test_account',
+                                    name='item_{}'.format(i)) for i in range(3)]
+        auditor.audit_objects()
+
+        with mock.patch.object(db.session, 'commit', wraps=db.session.commit) as commit:
+            auditor.save_issues()
+        assert commit.call_count == 1
+
+        self.assertEquals(Technology.query.filter(Technology.name == 'test_index').count(), 1)
+        self.assertEquals(sorted([item.name for item in Item.query.all()]), ['item_0', 'item_1', 'item_2'])
+        self.assertEquals(ItemAudit.query.count(), 3)
+
+    def test_save_issues_updates_item_scores(self):
+        from security_monkey import db
+        from security_monkey.datastore import find_inconsistent_item_scores, update_item_scores
+        mixer.init_app(self.app)
+        test_account_type = mixer.blend(AccountType, name='AWS')
+        test_account = mixer.blend(Account, name='test_account', account_type=test_account_type)
+        technology = mixer.blend(Technology, name='test_index')
+        for i in range(2):
+            db.session.add(Item(region='universal', name='item_{}'.format(i), arn='item_{}'.format(i),
+                                tech_id=technology.id, account_id=test_account.id))
+        db.session.commit()
+
+        auditor = AuditorTestObj(accounts=['test_account'])
+        auditor.items = [ChangeItem(index='test_index', region='universal', account='test_account',
+                                    name='item_{}'.format(i)) for i in range(2)]
+        auditor.audit_objects()
+        auditor.save_issues()
+
+        self.assertEquals([(item.score, item.unjustified_score, item.issue_count) for item in Item.query.all()],
+                          [(10, 10, 1), (10, 10, 1)])
+        self.assertEquals(Item.query.filter(Item.score >= 10).count(), 2)
+        self.assertEquals(find_inconsistent_item_scores(), [])
+
+        issue = ItemAudit.query.first()
+        issue.justified = True
+        update_item_scores([issue.item_id])
+        db.session.commit()
+        self.assertEquals(Item.query.filter(Item.unjustified_score >= 10).count(), 1)
+
+        issue.auditor_setting.disabled = True
+        self.assertEquals(len(find_inconsistent_item_scores()), 2)
+        update_item_scores([item.id for item in Item.query.all()])
+        db.session.commit()
+        self.assertEquals(Item.query.filter(Item.score > 0).count(), 0)
+        self.assertEquals(find_inconsistent_item_scores(), [])
+
+    def test_support_dependencies(self):
+        from security_monkey import db
+        mixer.init_app(self.app)
+        test_account_type = mixer.blend(AccountType, name='AWS')
+        test_account = mixer.blend(Account, name='test_account', account_type=test_account_type)
+        technology = mixer.blend(Technology, name='test_index')
+        support_technology = mixer.blend(Technology, name='support_index')
+
+        def add_item(tech, name, config):
+            item = Item(region='universal', name=name, arn=name, technology=tech, account=test_account)
+            revision = ItemRevision(item=item, config=config, active=True)
+            db.session.add_all([item, revision])
+            db.session.commit()
+            item.latest_revision_id = revision.id
+            db.session.commit()
+            return item
+
+        sg_0 = add_item(support_technology, 'sg_0', dict(id='sg-0'))
+        sg_1 = add_item(support_technology, 'sg_1', dict(id='sg-1'))
+        for name, uses in (('item_0', 'sg-0'), ('item_1', 'sg-1'), ('item_2', None)):
+            add_item(technology, name, dict(uses=uses))
+
+        auditor = DependentAuditorTestObj(accounts=['test_account'])
+        # Nothing has been audited with its dependencies recorded yet:
+        self.assertEquals(len(auditor.read_dependent_items([sg_0.id])), 3)
+
+        auditor.items = auditor.read_previous_items()
+        auditor.audit_objects()
+        auditor.save_issues()
+
+        self.assertEquals([item.name for item in auditor.read_dependent_items([sg_0.id])], ['item_0'])
+        self.assertEquals(sorted([item.name for item in auditor.read_dependent_items([sg_0.id, sg_1.id])]),
+                          ['item_0', 'item_1'])
+        # The dependencies are recorded per auditor:
+        self.assertEquals(len(AuditorTestObj(accounts=['test_account']).read_dependent_items([sg_0.id])), 3)
+
     def test_issue_presevation(self):
         """
         Ensure that issues are not deleted and that justifications are preserved.
@@ -19,6 +19,8 @@
 """
 import json
 
+import mock
+
 from security_monkey.datastore import Account, Technology, AccountType, ItemAudit
 from security_monkey.tests import SecurityMonkeyTestCase, db
 from security_monkey.watcher import ChangeItem
@@ -242,6 +244,47 @@ class DatabaseUtilsTestCase(SecurityMonkeyTestCase):
         assert (True, 'ephemeral', item, None) == detect_change(sti, self.account, self.technology, complete_hash,
                                                           durable_hash)
 
+    def test_detect_changes(self):
+        from security_monkey.datastore_utils import detect_changes, hash_item
+        from security_monkey.datastore import Item
+
+        self.setup_db()
+
+        items = []
+        for x in range(0, 4):
+            mod_conf = dict(ACTIVE_CONF)
+            mod_conf["name"] = "SomeRole{}".format(x)
+            mod_conf["Arn"] = ARN_PREFIX + ":iam::012345678910:role/SomeRole{}".format(x)
+            items.append(SomeTestItem().from_slurp(mod_conf, account_name=self.account.name))
+
+        hashes = [hash_item(item.config, ["IGNORE_ME"]) for item in items]
+
+        # Nothing is in the DB yet:
+        assert detect_changes(items, self.account, self.technology, hashes) == [(True, 'durable', None, 'created')] * 4
+
+        # SomeRole0 has no change, SomeRole1 an ephemeral one, SomeRole2 a durable one, SomeRole3 is new:
+        db_items = []
+        for x in range(0, 3):
+            db_item = Item(region="universal", name="SomeRole{}".format(x), arn=items[x].arn,
+                           tech_id=self.technology.id, account_id=self.account.id,
+                           latest_revision_complete_hash=hashes[x][0], latest_revision_durable_hash=hashes[x][1])
+            db.session.add(db_item)
+            db_items.append(db_item)
+        db.session.commit()
+
+        items[1].config["IGNORE_ME"] = "I am ephemeral!"
+        items[2].config["policy"] = {}
+        hashes = [hash_item(item.config, ["IGNORE_ME"]) for item in items]
+
+        assert detect_changes(items, self.account, self.technology, hashes) == [
+            (False, None, None, None),
+            (True, 'ephemeral', db_items[1], None),
+            (True, 'durable', db_items[2], 'changed'),
+            (True, 'durable', None, 'created')
+        ]
+
+        assert detect_changes([], self.account, self.technology, []) == []
+
     def test_persist_item(self):
         from security_monkey.datastore_utils import persist_item, hash_item, result_from_item
 
@@ -282,6 +325,53 @@ class DatabaseUtilsTestCase(SecurityMonkeyTestCase):
         assert db_item.latest_revision_durable_hash == new_durable_hash == durable_hash
         assert db_item.latest_revision_complete_hash == new_complete_hash != complete_hash
 
+    def test_batch_persister(self):
+        from security_monkey.datastore_utils import BatchPersister, hash_item, persist_item, result_from_item
+
+        self.setup_db()
+
+        items = []
+        for x in range(0, 3):
+            mod_conf = dict(ACTIVE_CONF)
+            mod_conf["name"] = "SomeRole{}".format(x)
+            mod_conf["Arn"] = ARN_PREFIX + ":iam::012345678910:role/SomeRole{}".format(x)
+            items.append(SomeTestItem().from_slurp(mod_conf, account_name=self.account.name))
+
+        # SomeRole0 already exists:
+        complete_hash, durable_hash = hash_item(items[0].config, [])
+        persist_item(items[0], None, self.technology, self.account, complete_hash, durable_hash, True)
+        db_item = result_from_item(items[0], self.account, self.technology)
+        first_revision_id = db_item.latest_revision_id
+
+        # An ephemeral change for SomeRole0, and two new items -- all in one commit:
+        items[0].config["IGNORE_ME"] = "I am ephemeral!"
+        persister = BatchPersister(self.technology, self.account)
+        persister.add(items[0], db_item, hash_item(items[0].config, ["IGNORE_ME"])[0], durable_hash, False)
+        for item in items[1:]:
+            complete_hash, durable_hash = hash_item(item.config, [])
+            persister.add(item, None, complete_hash, durable_hash, True)
+
+        with mock.patch.object(db.session, 'commit', wraps=db.session.commit) as commit:
+            persister.commit()
+        assert commit.call_count == 1
+
+        db_item = result_from_item(items[0], self.account, self.technology)
+        assert db_item.revisions.count() == 1
+        assert db_item.latest_revision_id == first_revision_id
+        assert db_item.revisions.first().config["IGNORE_ME"] == "I am ephemeral!"
+        assert db_item.revisions.first().date_last_ephemeral_change
+
+        for item in items[1:]:
+            db_item = result_from_item(item, self.account, self.technology)
+            complete_hash, durable_hash = hash_item(item.config, [])
+            assert db_item.arn == item.arn
+            assert db_item.revisions.count() == 1
+            assert db_item.latest_revision_id == db_item.revisions.first().id
+            assert db_item.latest_revision_complete_hash == complete_hash
+            assert db_item.latest_revision_durable_hash == durable_hash
+            assert db_item.revisions.first().active
+            assert db_item.first_seen == db_item.revisions.first().date_created
+
     def test_inactivate_old_revisions(self):
         from security_monkey.datastore_utils import inactivate_old_revisions, hash_item, persist_item, result_from_item
         from security_monkey.datastore import ItemRevision, Item
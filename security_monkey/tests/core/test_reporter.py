@@ -27,7 +27,8 @@ from moto import mock_sts
 
 from security_monkey.tests import SecurityMonkeyTestCase
 from security_monkey.datastore import Account, AccountType
-from security_monkey.tests.core.monitor_mock import RUNTIME_WATCHERS, RUNTIME_AUDIT_COUNTS
+from security_monkey.tests.core.monitor_mock import RUNTIME_WATCHERS, RUNTIME_AUDIT_COUNTS, RUNTIME_DEPENDENT_READS
+from security_monkey.tests.core.monitor_mock import CURRENT_MONITORS
 from security_monkey.tests.core.monitor_mock import build_mock_result
 from security_monkey.tests.core.monitor_mock import mock_all_monitors
 from security_monkey import db, ARN_PREFIX
@@ -94,6 +95,15 @@ auditor_configs_with_watcher_dependencies = [
     }
 ]
 
+auditor_configs_with_dependency_tracking = [
+    {
+        'index': 'index1',
+        'support_auditor_indexes': [],
+        'support_watcher_indexes': ['index2'],
+        'support_dependency_indexes': ['index2']
+    }
+]
+
 OPEN_POLICY = {
     "Statement": [
         {
@@ -125,6 +135,7 @@ class ReporterTestCase(SecurityMonkeyTestCase):
 
         RUNTIME_WATCHERS.clear()
         RUNTIME_AUDIT_COUNTS.clear()
+        RUNTIME_DEPENDENT_READS.clear()
 
     @patch('security_monkey.alerter.Alerter.report', new=mock_report)
     def test_run_with_interval_no_dependencies(self):
@@ -300,6 +311,43 @@ class ReporterTestCase(SecurityMonkeyTestCase):
                          msg="Auditor index3 should run once but ran {} times"
                          .format(RUNTIME_AUDIT_COUNTS['index3']))
 
+    def test_dependent_items_of_ephemeral_support_watcher(self):
+        """
+        Support watchers that honor ephemerals (like security groups) save copies of their changed
+        items, so the changed items have no db_item.  The reporter must still find the changed
+        support items, and only reaudit the items that depended on them.
+        """
+        from security_monkey.reporter import Reporter
+        from security_monkey.watcher import Watcher, ChangeItem
+        from security_monkey.datastore import Item
+        build_mock_result(watcher_configs, auditor_configs_with_dependency_tracking)
+
+        support_watcher = Watcher(accounts=['TEST_ACCOUNT'])
+        support_watcher.index = 'index2'
+        support_watcher.honor_ephemerals = True
+        support_watcher.ephemeral_paths = ['assigned_to']
+
+        def support_item(config):
+            return ChangeItem(index='index2', account='TEST_ACCOUNT', region='us-east-1', name='sg-1234',
+                              active=True, new_config=config)
+
+        support_item({'rules': ['tcp/22'], 'assigned_to': []}).save(support_watcher.datastore)
+        support_watcher.find_modified([support_item({'rules': ['tcp/22'], 'assigned_to': []})],
+                                      [support_item({'rules': ['tcp/0-65535'], 'assigned_to': ['i-1']})])
+        support_watcher.save()
+        assert len(support_watcher.changed_items) == 1
+        assert getattr(support_watcher.changed_items[0], 'db_item', None) is None
+
+        CURRENT_MONITORS[1].watcher = support_watcher
+        monitor = CURRENT_MONITORS[0]
+        reporter = Reporter(account="TEST_ACCOUNT")
+        items = reporter.get_items_to_audit(monitor.watcher, monitor.auditors[0], set(['index2']))
+
+        support_item_id = Item.query.filter(Item.name == 'sg-1234').one().id
+        self.assertEqual(RUNTIME_DEPENDENT_READS['index1'], [set([support_item_id])])
+        self.assertEqual([item.name for item in items], ['dependent_item'])
+        assert monitor.watcher.full_audit_list is None
+
     def add_roles(self, initial=True):
         mock_iam().start()
         mock_sts().start()
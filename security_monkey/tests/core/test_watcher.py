@@ -23,6 +23,8 @@
 import datetime
 import json
 
+import mock
+
 from security_monkey.watcher import Watcher, ChangeItem
 from security_monkey.datastore import Account, AccountType, Datastore, Item, ItemAudit, Technology, ItemRevision
 from security_monkey import db, ARN_PREFIX
@@ -226,6 +228,27 @@ class WatcherTestCase(SecurityMonkeyTestCase):
         watcher.find_modified(previous, current)
         assert len(watcher.changed_items) == 1
 
+    def test_modified_uses_stored_hashes(self):
+        from security_monkey.datastore_utils import hash_item
+        previous = ChangeItem(index='test_index', account='test_account', name='item1_name',
+                              new_config={'config': 'test1'})
+        previous.stored_complete_hash, previous.stored_durable_hash = hash_item(previous.config, [])
+        current = ChangeItem(index='test_index', account='test_account', name='item1_name',
+                             new_config={'config': 'test1'})
+
+        self._setup_account()
+        watcher = Watcher(accounts=['test_account'])
+
+        # Only the current config is hashed:
+        with mock.patch('security_monkey.datastore_utils.hash_item', wraps=hash_item) as hash_item_calls:
+            watcher.find_modified([previous], [current])
+        assert hash_item_calls.call_count == 1
+        assert len(watcher.changed_items) == 0
+
+        current.new_config = {'config': 'test2'}
+        watcher.find_modified([previous], [current])
+        assert len(watcher.changed_items) == 1
+
     def test_ephemeral_change(self):
 
         previous = [
@@ -273,8 +296,12 @@ class WatcherTestCase(SecurityMonkeyTestCase):
         watcher.honor_ephemerals = True
         watcher.ephemeral_paths = ['test_ephemeral']
 
-        watcher.find_modified(previous, current)
+        # Only ephemeral changes -- the configs never need to be copied:
+        with mock.patch('security_monkey.watcher.deepcopy') as deepcopy:
+            watcher.find_modified(previous, current)
+        assert not deepcopy.called
         assert len(watcher.changed_items) == 0
+        assert len(watcher.ephemeral_items) == 1
 
     def test_save_changed_item(self):
         self._setup_account()
@@ -490,3 +517,44 @@ class WatcherTestCase(SecurityMonkeyTestCase):
 
             assert item_revision.active
             assert len(ItemAudit.query.filter(ItemAudit.item_id == item_revision.item_id).all()) == 2
+
+    def test_resume_from_checkpoint(self):
+        from dateutil.tz import tzutc
+        from security_monkey.watchers.iam.iam_role import IAMRole
+
+        self.setup_batch_db()
+
+        watcher = IAMRole(accounts=[self.account.name])
+        watcher.current_account = (self.account, 0)
+        watcher.technology = self.technology
+        watcher.batched_size = 2
+
+        # Nothing to resume from yet:
+        assert not watcher.resume_from_checkpoint()
+
+        created = datetime.datetime(2017, 1, 2, 3, 4, 5, tzinfo=tzutc())
+        watcher.total_list = [dict(RoleName="SomeRole{}".format(x), CreateDate=created) for x in range(0, 5)]
+        watcher.save_checkpoint()
+        watcher.batch_counter = 1
+        watcher.save_checkpoint()
+
+        # A fresh watcher picks up the list and the next batch:
+        resumed = IAMRole(accounts=[self.account.name])
+        resumed.current_account = (self.account, 0)
+        resumed.technology = self.technology
+        resumed.batched_size = 2
+        resumed.done_slurping = False
+        assert resumed.resume_from_checkpoint()
+        assert resumed.total_list == watcher.total_list
+        assert resumed.batch_counter == 1
+        assert not resumed.done_slurping
+
+        # A checkpoint taken with a different batch size can't be resumed:
+        resumed.batched_size = 3
+        assert not resumed.resume_from_checkpoint()
+        assert not resumed.resume_from_checkpoint()
+
+        # Once the run completes, there is nothing left to resume:
+        watcher.save_checkpoint()
+        watcher.clear_checkpoint()
+        assert not watcher.resume_from_checkpoint()
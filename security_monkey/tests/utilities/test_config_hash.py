@@ -0,0 +1,52 @@
+"""
+.. module: security_monkey.tests.utilities.test_config_hash
+    :platform: Unix
+.. version:: $$VERSION$$
+"""
+import datetime
+
+from security_monkey.common.config_hash import hash_config, hash_item, _copy_and_hash
+from security_monkey.tests import SecurityMonkeyTestCase
+
+CONFIG = {
+    "Arn": "arn:aws:ec2:us-east-1:012345678910:vpn-connection/vpn-1234",
+    "updated_at": "2017-01-01T00:00:00Z",
+    "tunnels": [
+        {"outside_ip": "1.2.3.4", "last_status_change": "2017-01-01", "status": "UP"},
+        {"outside_ip": "5.6.7.8", "last_status_change": "2017-01-02", "status": "DOWN"}
+    ],
+    "Tags": {u"N\xe4me": u"v\xe4lue", "Team": None},
+    "Numbers": [3, 1.5, True, None, "two", [2, 1], {"b": 2, "a": 1}],
+    "+skipped": {"updated_at": "dpath never looks in here"},
+    "Dropped": datetime.datetime(2017, 1, 1),
+    "Empty": {}
+}
+
+
+class ConfigHashTestCase(SecurityMonkeyTestCase):
+    def test_matches_copy_and_delete(self):
+        for ephemeral_paths in ([],
+                                ["updated_at"],
+                                ["tunnels$*$last_status_change", "Tags$Team"],
+                                ["*$updated_at", "Numbers$6$a"],
+                                ["does$not$exist"],
+                                ["Numbers$6"],  # Deletes a list element, so this is done the old way
+                                ["**$status"]):
+            assert hash_item(CONFIG, ephemeral_paths) == _copy_and_hash(CONFIG, ephemeral_paths)
+
+    def test_durable_hash_ignores_ephemeral_changes(self):
+        complete_hash, durable_hash = hash_item(CONFIG, ["tunnels$*$last_status_change"])
+        assert complete_hash != durable_hash
+        assert complete_hash == hash_config(CONFIG)
+
+        changed = dict(CONFIG)
+        changed["tunnels"] = [dict(tunnel, last_status_change="2018-01-01") for tunnel in CONFIG["tunnels"]]
+        new_complete_hash, new_durable_hash = hash_item(changed, ["tunnels$*$last_status_change"])
+        assert new_complete_hash != complete_hash
+        assert new_durable_hash == durable_hash
+
+    def test_list_order_does_not_matter(self):
+        reordered = dict(CONFIG)
+        reordered["tunnels"] = list(reversed(CONFIG["tunnels"]))
+        reordered["Numbers"] = list(reversed(CONFIG["Numbers"]))
+        assert hash_item(reordered, ["updated_at"]) == hash_item(CONFIG, ["updated_at"])
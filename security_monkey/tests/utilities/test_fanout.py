@@ -0,0 +1,55 @@
+"""
+.. module: security_monkey.tests.utilities.test_fanout
+    :platform: Unix
+.. version:: $$VERSION$$
+"""
+import threading
+import time
+
+from security_monkey.common.fanout import fan_out
+from security_monkey.tests import SecurityMonkeyTestCase
+
+
+class FanOutTestCase(SecurityMonkeyTestCase):
+    def test_sequential_runs_on_calling_thread(self):
+        calling_thread = threading.current_thread()
+        threads = []
+
+        def func(value):
+            threads.append(threading.current_thread())
+            return value * 2
+
+        results = fan_out(func, [dict(value=x) for x in range(5)])
+        assert results == [0, 2, 4, 6, 8]
+        assert all(thread is calling_thread for thread in threads)
+
+    def test_parallel_preserves_order(self):
+        def func(value):
+            # Make the earlier calls finish last:
+            time.sleep(0.01 * (10 - value))
+            return value
+
+        results = fan_out(func, [dict(value=x) for x in range(10)], max_threads=5)
+        assert results == range(10)
+
+    def test_max_threads_per_key(self):
+        lock = threading.Lock()
+        running = dict(a=0, b=0)
+        peaks = dict(a=0, b=0)
+
+        def func(account, value):
+            with lock:
+                running[account] += 1
+                peaks[account] = max(peaks[account], running[account])
+            time.sleep(0.02)
+            with lock:
+                running[account] -= 1
+            return value
+
+        calls = [dict(account=account, value=x) for x in range(6) for account in ('a', 'b')]
+        results = fan_out(func, calls, max_threads=8, key=lambda kwargs: kwargs['account'],
+                          max_threads_per_key=2)
+
+        assert results == [call['value'] for call in calls]
+        assert peaks['a'] <= 2
+        assert peaks['b'] <= 2
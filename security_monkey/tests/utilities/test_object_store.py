@@ -0,0 +1,105 @@
+"""
+.. module: security_monkey.tests.utilities.test_object_store
+    :platform: Unix
+.. version:: $$VERSION$$
+"""
+import ipaddr
+from mixer.backend.flask import mixer
+
+from security_monkey import db
+from security_monkey.auditor import Auditor
+from security_monkey.common.object_store import CidrIndex, ObjectStore
+from security_monkey.datastore import Account, AccountType, AccountTypeCustomValues, Item, ItemRevision, Technology
+from security_monkey.tests import SecurityMonkeyTestCase
+
+
+class ObjectStoreTestCase(SecurityMonkeyTestCase):
+    def pre_test_setup(self):
+        mixer.init_app(self.app)
+        account_type = mixer.blend(AccountType, name='AWS')
+        self.account = mixer.blend(Account, name='TEST_ACCOUNT', identifier='012345678910',
+                                   account_type_id=account_type.id, third_party=False)
+        self.vpc = mixer.blend(Technology, name='vpc')
+        self.app.config['OBJECT_STORE_CHECK_INTERVAL'] = 0
+
+    def tearDown(self):
+        self.app.config.pop('OBJECT_STORE_CHECK_INTERVAL', None)
+        super(ObjectStoreTestCase, self).tearDown()
+
+    def add_vpc(self, vpc_id, cidr_block):
+        item = Item(region='us-east-1', name=vpc_id, arn=vpc_id, technology=self.vpc, account=self.account)
+        revision = ItemRevision(item=item, config=dict(id=vpc_id, cidr_block=cidr_block), active=True)
+        db.session.add_all([item, revision])
+        db.session.commit()
+        item.latest_revision_id = revision.id
+        db.session.commit()
+        return item
+
+    def test_refresh_swaps_snapshots(self):
+        self.add_vpc('vpc-11111111', '10.1.0.0/16')
+        store = ObjectStore()
+        first = store.refresh()
+
+        assert set(first['vpc']) == set(['vpc-11111111'])
+        assert first['ACCOUNTS']['FRIENDLY'] == set(['012345678910'])
+
+        item = self.add_vpc('vpc-22222222', '10.2.0.0/16')
+        second = store.refresh()
+
+        assert second is not first
+        assert set(first['vpc']) == set(['vpc-11111111'])
+        assert set(second['vpc']) == set(['vpc-11111111', 'vpc-22222222'])
+        assert store['cidr']['10.2.0.0/16'] == set(['012345678910'])
+
+        db.session.delete(item)
+        db.session.commit()
+        assert set(store.refresh()['vpc']) == set(['vpc-11111111'])
+
+    def test_refresh_is_throttled(self):
+        self.app.config['OBJECT_STORE_CHECK_INTERVAL'] = 3600
+        self.add_vpc('vpc-11111111', '10.1.0.0/16')
+        store = ObjectStore()
+        first = store.refresh()
+
+        self.add_vpc('vpc-22222222', '10.2.0.0/16')
+        assert store.refresh() is first
+        assert set(store.refresh(force=True)['vpc']) == set(['vpc-11111111', 'vpc-22222222'])
+
+    def test_cidr_index_matches_linear_scan(self):
+        cidrs = {
+            '10.0.0.0/8': frozenset(['111111111111']),
+            '10.1.0.0/16': frozenset(['222222222222']),
+            '10.1.1.1/32': frozenset(['333333333333']),
+            '54.0.0.0/24': frozenset(['222222222222']),
+            '0.0.0.0/0': frozenset(['000000000000']),
+            '2600:1f18::/36': frozenset(['444444444444']),
+            '2600:1f18:1234::/48': frozenset(['555555555555'])
+        }
+        index = CidrIndex(cidrs)
+
+        for value in ('10.1.1.1', '10.1.1.1/32', '10.1.1.0/24', '10.0.0.0/7', '54.0.0.128/25', '54.0.1.0',
+                      '0.0.0.0/0', '2600:1f18:1234:5678::1', '2600:1f18::/32', '::/0'):
+            expected = set()
+            for cidr, accounts in cidrs.items():
+                if ipaddr.IPNetwork(value) in ipaddr.IPNetwork(cidr):
+                    expected.update(accounts)
+            assert index.lookup(value) == expected
+
+    def test_account_indexes(self):
+        db.session.add(AccountTypeCustomValues(account_id=self.account.id, name='s3_name', value='TestS3Name'))
+        db.session.commit()
+
+        auditor = Auditor(accounts=['TEST_ACCOUNT'])
+        auditor.OBJECT_STORE.clear()
+        auditor.prep_for_audit()
+
+        accounts = auditor.OBJECT_STORE['ACCOUNTS']
+        assert accounts['BY_IDENTIFIER']['012345678910']['name'] == 'TEST_ACCOUNT'
+        assert auditor._get_account('s3_name', 'testS3NAME')['identifier'] == '012345678910'
+        assert auditor._get_account('name', 'test_account')['identifier'] == '012345678910'
+        assert auditor._get_account('s3_name', 'unknown') is None
+
+        same = auditor._get_same_account('TEST_ACCOUNT')
+        assert same.identifier == '012345678910'
+        assert auditor._get_same_account('TEST_ACCOUNT') is same
+        auditor.OBJECT_STORE.clear()
@@ -0,0 +1,44 @@
+"""
+.. module: security_monkey.tests.utilities.test_policy_cache
+    :platform: Unix
+.. version:: $$VERSION$$
+"""
+from policyuniverse.statement import Statement
+
+from security_monkey.common.policy_cache import CachedStatement, LRUCache, action_cache
+from security_monkey.tests import SecurityMonkeyTestCase
+
+
+class PolicyCacheTestCase(SecurityMonkeyTestCase):
+    def test_lru_cache(self):
+        cache = LRUCache(max_size=2)
+        assert cache.get('a', lambda: 1) == 1
+        assert cache.get('b', lambda: 2) == 2
+        assert cache.get('a', lambda: 'not called') == 1
+        assert cache.get('c', lambda: 3) == 3
+
+        # 'b' was the least recently used:
+        assert cache.get('b', lambda: 'computed again') == 'computed again'
+        assert cache.stats() == dict(hits=1, misses=4, size=2)
+
+    def test_statements_share_expansions(self):
+        action_cache.clear()
+        statement = dict(Effect='Allow', Action=['iam:PassRole', 'ec2:AuthorizeSecurityGroup*'], Resource='*')
+        reordered = dict(statement, Action=list(reversed(statement['Action'])), Resource='arn:aws:s3:::bucket')
+
+        first = CachedStatement(Statement(statement))
+        second = CachedStatement(Statement(reordered))
+
+        assert first.actions_expanded is second.actions_expanded
+        assert 'iam:passrole' in second.actions_expanded
+        assert first.action_summary() is second.action_summary()
+        assert action_cache.stats() == dict(hits=2, misses=2, size=2)
+
+    def test_not_action_statements_are_not_shared(self):
+        action_cache.clear()
+        not_iam = CachedStatement(Statement(dict(Effect='Allow', NotAction=['iam:*'], Resource='*')))
+        not_s3 = CachedStatement(Statement(dict(Effect='Allow', NotAction='s3:*', Resource='*')))
+
+        assert 'iam:passrole' not in not_iam.actions_expanded
+        assert 'iam:passrole' in not_s3.actions_expanded
+        assert not_iam.actions_expanded is not not_s3.actions_expanded
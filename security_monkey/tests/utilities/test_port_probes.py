@@ -0,0 +1,79 @@
+"""
+.. module: security_monkey.tests.utilities.test_port_probes
+    :platform: Unix
+.. version:: $$VERSION$$
+"""
+from security_monkey.common.port_probes import port_probe_fields
+from security_monkey.tests import SecurityMonkeyTestCase
+
+FINDING = {
+    "AccountId": "012345678910",
+    "Region": "us-east-1",
+    "Description": "EC2 instance has an unprotected port which is being probed by a known malicious host.",
+    "Severity": 2,
+    "Resource": {
+        "ResourceType": "Instance",
+        "InstanceDetails": {
+            "InstanceId": "i-036cb01d26bb09166",
+            "Tags": [{"Key": "Team", "Value": "tools"}, {"Key": "Name", "Value": "bastion"}]
+        }
+    },
+    "Service": {
+        "Count": 3,
+        "EventFirstSeen": "2018-01-08T00:43:49Z",
+        "EventLastSeen": "2018-01-08T00:44:46Z",
+        "Action": {
+            "PortProbeAction": {
+                "PortProbeDetails": [
+                    {
+                        "LocalPortDetails": {"Port": 22, "PortName": "SSH"},
+                        "RemoteIpDetails": {
+                            "IpAddressV4": "221.132.75.236",
+                            "City": {"CityName": "Seoul"},
+                            "Country": {"CountryName": "South Korea"},
+                            "GeoLocation": {"Lat": 37.5111, "Lon": 126.9743},
+                            "Organization": {"Asn": "17877", "AsnOrg": "NexG Co., LTD", "Isp": "NexG Co.",
+                                             "Org": "NexG Co."}
+                        }
+                    },
+                    {
+                        "LocalPortDetails": {"Port": 81, "PortName": "Unknown"},
+                        "RemoteIpDetails": {"IpAddressV4": "71.6.167.142"}
+                    }
+                ]
+            }
+        }
+    }
+}
+
+
+def _camel_case(value):
+    if isinstance(value, dict):
+        return {key[0].lower() + key[1:]: _camel_case(child) for key, child in value.items()}
+    if isinstance(value, list):
+        return [_camel_case(child) for child in value]
+    return value
+
+
+class PortProbesTestCase(SecurityMonkeyTestCase):
+    def test_port_probe_fields(self):
+        fields = port_probe_fields(FINDING)
+        assert fields['account_identifier'] == '012345678910'
+        assert fields['probe_count'] == 3
+        assert fields['instance_name'] == 'bastion'
+        assert fields['local_port'] == 22
+        assert fields['local_port_name'] == 'SSH'
+        assert fields['remote_ip_v4'] == '221.132.75.236'
+        assert (fields['lat'], fields['lon']) == (37.5111, 126.9743)
+        assert fields['country_name'] == 'South Korea'
+        assert fields['asn'] == '17877'
+
+    def test_cloudwatch_event(self):
+        event = {"detail-type": "GuardDuty Finding", "detail": _camel_case(FINDING)}
+        event["detail"]["service"]["action"]["portProbeAction"]["portProbeDetails"][0]["remoteIpDetails"][
+            "organization"]["asn"] = 17877
+        assert port_probe_fields(event) == port_probe_fields(FINDING)
+
+    def test_not_a_port_probe(self):
+        assert port_probe_fields({"Arn": "arn:aws:guardduty:us-east-1:012345678910:detector/1/finding/2"}) is None
+        assert port_probe_fields(dict(FINDING, Service={"Count": 1})) is None
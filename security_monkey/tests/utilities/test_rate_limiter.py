@@ -0,0 +1,93 @@
+"""
+.. module: security_monkey.tests.utilities.test_rate_limiter
+    :platform: Unix
+.. version:: $$VERSION$$
+"""
+import boto3
+import mock
+from botocore.exceptions import ClientError
+
+from security_monkey.common.rate_limiter import RateLimiter, TokenBucket, is_throttling_error
+from security_monkey.cloudaux_watcher import CloudAuxWatcher
+from security_monkey.common import sts_connect
+from security_monkey.tests import SecurityMonkeyTestCase
+from security_monkey.watcher import Watcher
+
+
+def throttling_error():
+    return ClientError({'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}}, 'DescribeThings')
+
+
+class RateLimiterTestCase(SecurityMonkeyTestCase):
+    def test_is_throttling_error(self):
+        assert is_throttling_error(throttling_error())
+        assert not is_throttling_error(ClientError({'Error': {'Code': 'AccessDenied'}}, 'DescribeThings'))
+        assert not is_throttling_error(ValueError())
+
+    def test_aimd(self):
+        bucket = TokenBucket(rate=10, min_rate=1, max_rate=12, increase=1, decrease=0.5)
+
+        bucket.throttled()
+        assert bucket.rate == 5
+        bucket.succeeded()
+        assert bucket.rate == 6
+
+        for _ in range(10):
+            bucket.succeeded()
+        assert bucket.rate == 12
+
+        for _ in range(10):
+            bucket.throttled()
+        assert bucket.rate == 1
+        assert bucket.state()['throttles'] == 11
+
+    def test_call_retries_throttled_calls(self):
+        limiter = RateLimiter()
+        responses = [throttling_error(), throttling_error(), 'result']
+
+        def func(arg, kwarg=None):
+            assert arg == 'arg' and kwarg == 'kwarg'
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        assert limiter.call(('account', 'us-east-1', 'ec2'), func, 'arg', kwarg='kwarg') == 'result'
+
+        state = limiter.state()[('account', 'us-east-1', 'ec2')]
+        assert state['calls'] == 3
+        assert state['throttles'] == 2
+
+    def test_call_raises_other_errors(self):
+        limiter = RateLimiter()
+
+        def func():
+            raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'DescribeThings')
+
+        self.assertRaises(ClientError, limiter.call, ('account', 'us-east-1', 'ec2'), func)
+
+    def test_rate_limit_key_uses_the_connection_account(self):
+        watcher = mock.Mock(index='ec2', account_identifiers=['111111111111', '222222222222'])
+        for account in ['111111111111', '222222222222']:
+            role = {
+                'Credentials': {'AccessKeyId': 'AKIA' + account, 'SecretAccessKey': 'secret', 'SessionToken': 'token'},
+                'AssumedRoleUser': {'Arn': 'arn:aws:sts::{}:assumed-role/SecurityMonkey/secmonkey'.format(account)}
+            }
+            client = sts_connect.connect(None, 'boto3.ec2.client', region='us-west-2', assumed_role=role)
+            key = Watcher._rate_limit_key.__func__(watcher, client.describe_instances)
+            assert key == (account, 'us-west-2', 'ec2')
+
+        # Connections that weren't made by sts_connect fall back on the watcher's accounts:
+        client = boto3.client('ec2', region_name='us-west-2', aws_access_key_id='AKIA', aws_secret_access_key='secret')
+        key = Watcher._rate_limit_key.__func__(watcher, client.describe_instances)
+        assert key == ('111111111111,222222222222', 'us-west-2', 'ec2')
+
+    def test_cloudaux_key_uses_the_conn_dict_account(self):
+        watcher = mock.Mock(index='ec2', service_name='ec2', accounts=['first', 'second'],
+                            account_identifiers=['111111111111', '222222222222'])
+        assert CloudAuxWatcher._get_account_name.__func__(watcher, '222222222222') == 'second'
+
+        with mock.patch('security_monkey.cloudaux_watcher.rate_limiter') as limiter:
+            CloudAuxWatcher._rate_limited_call.__func__(watcher, len, account_number='222222222222',
+                                                        region='us-west-2')
+        assert limiter.call.call_args[0][0] == ('222222222222', 'us-west-2', 'ec2')
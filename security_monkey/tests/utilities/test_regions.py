@@ -0,0 +1,69 @@
+"""
+.. module: security_monkey.tests.utilities.test_regions
+    :platform: Unix
+.. version:: $$VERSION$$
+"""
+import datetime
+
+from mock import patch
+
+from security_monkey import db
+from security_monkey.common.regions import get_available_regions, get_skipped_regions
+from security_monkey.decorators import iter_account_region
+from security_monkey.datastore import Account, AccountType, AccountTypeCustomValues, AccountRegionCache
+from security_monkey.tests import SecurityMonkeyTestCase
+
+
+class RegionCacheTestCase(SecurityMonkeyTestCase):
+    def pre_test_setup(self):
+        account_type = AccountType(name='AWS')
+        db.session.add(account_type)
+        db.session.commit()
+
+        self.account = Account(identifier="012345678910", name="testing", active=True, third_party=False,
+                               account_type_id=account_type.id)
+        self.account.custom_fields.append(
+            AccountTypeCustomValues(name='skip_regions', value='ap-east-1, me-south-1,'))
+        db.session.add(self.account)
+        db.session.commit()
+
+    def test_get_skipped_regions(self):
+        assert get_skipped_regions(self.account) == set(['ap-east-1', 'me-south-1'])
+
+    @patch('security_monkey.common.regions.fetch_available_regions')
+    def test_regions_are_cached(self, fetch):
+        fetch.return_value = ['us-east-1', 'us-west-2']
+
+        assert get_available_regions(self.account, 'ec2') == ['us-east-1', 'us-west-2']
+        assert get_available_regions(self.account, 'ec2') == ['us-east-1', 'us-west-2']
+        assert fetch.call_count == 1
+
+        cached = AccountRegionCache.query.filter(AccountRegionCache.account_id == self.account.id).one()
+        assert cached.service == 'ec2'
+
+    @patch('security_monkey.common.regions._refresh_in_background')
+    def test_stale_regions_are_refreshed_in_background(self, refresh):
+        db.session.add(AccountRegionCache(
+            account_id=self.account.id, service='ec2', regions=['us-east-1'],
+            date_refreshed=datetime.datetime.utcnow() - datetime.timedelta(days=30)))
+        db.session.commit()
+
+        assert get_available_regions(self.account, 'ec2') == ['us-east-1']
+        refresh.assert_called_once_with(self.account.id, 'ec2')
+
+    @patch('security_monkey.common.sts_connect.assume_role')
+    @patch('security_monkey.common.regions.fetch_available_regions')
+    def test_iter_account_region_passes_assumed_role(self, fetch, assume_role):
+        fetch.return_value = ['us-east-1', 'ap-east-1']
+        role = {'Credentials': {'AccessKeyId': 'AKIA', 'SecretAccessKey': 'secret', 'SessionToken': 'token'}}
+        assume_role.return_value = role
+        calls = []
+
+        @iter_account_region(index='ec2instance', accounts=['testing'], service_name='ec2')
+        def slurp(**kwargs):
+            calls.append(dict(kwargs))
+            return [], {}
+
+        slurp()
+        assert [call['region'] for call in calls] == ['us-east-1']
+        assert calls[0]['assumed_role'] is role
@@ -0,0 +1,74 @@
+"""
+.. module: security_monkey.tests.utilities.test_sts_connect
+    :platform: Unix
+.. version:: $$VERSION$$
+"""
+import datetime
+
+from dateutil.tz import tzutc
+from mock import patch, MagicMock
+
+from security_monkey import db
+from security_monkey.common.sts_connect import assume_role, get_client
+from security_monkey.datastore import Account, AccountType
+from security_monkey.tests import SecurityMonkeyTestCase
+
+
+def make_role(minutes):
+    expiration = datetime.datetime.now(tzutc()) + datetime.timedelta(minutes=minutes)
+    return {
+        'Credentials': {
+            'AccessKeyId': 'AKIA{}'.format(minutes),
+            'SecretAccessKey': 'secret',
+            'SessionToken': 'token',
+            'Expiration': expiration
+        }
+    }
+
+
+class STSConnectTestCase(SecurityMonkeyTestCase):
+    def pre_test_setup(self):
+        account_type = AccountType(name='AWS')
+        db.session.add(account_type)
+        db.session.commit()
+
+        self.account = Account(identifier="012345678910", name="testing", active=True, third_party=False,
+                               account_type_id=account_type.id)
+        db.session.add(self.account)
+        db.session.commit()
+
+    @patch('security_monkey.common.sts_connect.boto3')
+    def test_assume_role_is_cached(self, boto3):
+        sts = MagicMock()
+        sts.assume_role.return_value = make_role(60)
+        boto3.client.return_value = sts
+
+        first = assume_role(self.account)
+        second = assume_role(self.account)
+
+        assert first is second
+        assert sts.assume_role.call_count == 1
+
+    @patch('security_monkey.common.sts_connect.boto3')
+    def test_assume_role_refreshes_before_expiry(self, boto3):
+        sts = MagicMock()
+        sts.assume_role.side_effect = [make_role(2), make_role(60)]
+        boto3.client.return_value = sts
+
+        first = assume_role(self.account)
+        second = assume_role(self.account)
+
+        assert first is not second
+        assert sts.assume_role.call_count == 2
+
+    @patch('security_monkey.common.sts_connect.boto3')
+    def test_clients_are_shared(self, boto3):
+        sts = MagicMock()
+        sts.assume_role.return_value = make_role(60)
+        boto3.client.return_value = sts
+        boto3.Session.return_value.client.side_effect = lambda tech: MagicMock()
+
+        iam = get_client(self.account, 'iam')
+        assert get_client(self.account, 'iam') is iam
+        assert get_client(self.account, 'ec2', region='us-west-2') is not iam
+        assert boto3.Session.call_count == 2
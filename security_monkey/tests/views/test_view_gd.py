@@ -216,3 +216,48 @@ class GuardDutyViewsTestCase(SecurityMonkeyApiTestCase):
         assert ItemRevision.query.count() == 1
         assert ItemAudit.query.count() == 1
         assert AuditorSettings.query.count() == 1
+
+    def test_map_and_top_10_countries(self):
+        from security_monkey.common.port_probes import store_port_probe
+        from security_monkey.datastore import Technology
+
+        account_type = AccountType(name='AWS')
+        account = Account(active=True, third_party=False, name='TEST', identifier='012345678910',
+                          account_type=account_type)
+        technology = Technology(name='guardduty')
+        db.session.add_all([account_type, account, technology])
+        db.session.commit()
+
+        def add_finding(name, country, lat, lon, fixed=False):
+            config = {
+                "AccountId": "012345678910",
+                "Severity": 5,
+                "Service": {"Count": 1, "Action": {"PortProbeAction": {"PortProbeDetails": [{
+                    "LocalPortDetails": {"Port": 22, "PortName": "SSH"},
+                    "RemoteIpDetails": {"Country": {"CountryName": country},
+                                        "GeoLocation": {"Lat": lat, "Lon": lon}}}]}}}
+            }
+            item = Item(region='us-east-1', name=name, technology=technology, account=account)
+            db.session.add(item)
+            db.session.add(ItemAudit(item=item, score=5, issue='probe', justified=False, fixed=fixed))
+            db.session.flush()
+            store_port_probe(item.id, config)
+            db.session.commit()
+
+        add_finding('one', 'South Korea', 37.5, 126.9)
+        add_finding('two', 'South Korea', 37.5, 126.9)
+        add_finding('three', 'Argentina', -38.0, -57.55)
+        add_finding('fixed', 'Argentina', -38.0, -57.55, fixed=True)
+
+        r = self.test_app.get('/api/1/worldmapguarddutydata', headers=self.headers)
+        assert r.status_code == 200
+        items = json.loads(r.data)['items']
+        assert sorted([(item['countryName'], item['count']) for item in items]) == [
+            ('Argentina', 1), ('South Korea', 2), ('South Korea', 2)]
+        assert items[0]['localPortName'] == 'SSH'
+        assert items[0]['severity'] == 'Medium'
+
+        r = self.test_app.get('/api/1/top10countryguarddutydata', headers=self.headers)
+        assert r.status_code == 200
+        assert json.loads(r.data)['items'] == [{'countryName': 'South Korea', 'count': 2},
+                                               {'countryName': 'Argentina', 'count': 1}]
@@ -38,7 +38,36 @@ class ItemApiTestCase(SecurityMonkeyApiTestCase):
         assert r_json['items'][0]['first_seen'] == '2016-11-02 00:00:00'
         assert r_json['items'][0]['last_seen'] == '2016-11-03 00:00:00'
 
-    def _setup_one_two_revisions(self):
+    def test_searchconfig(self):
+        self._setup_one_two_revisions(config={'RoleName': 'TestRole', 'Tags': {'env': 'prod'}})
+        for search, count in (('testrole', 1),
+                              ('nothere', 0),
+                              ('{"Tags": {"env": "prod"}}', 1),
+                              ('{"Tags": {"env": "test"}}', 0)):
+            r = self.test_app.get('/api/1/items', query_string={'searchconfig': search}, headers=self.headers)
+            assert r.status_code == 200
+            assert len(json.loads(r.data)['items']) == count
+
+    def test_cursor_pagination(self):
+        self._setup_one_two_revisions()
+        dates = []
+        query_string = {'count': 1, 'cursor': '', 'total': 'true'}
+        while True:
+            r = self.test_app.get('/api/1/revisions', query_string=query_string, headers=self.headers)
+            assert r.status_code == 200
+            r_json = json.loads(r.data)
+            assert r_json['total'] == 2
+            dates.extend([revision['date_created'] for revision in r_json['items']])
+            if not r_json['next']:
+                break
+            query_string['cursor'] = r_json['next']
+
+        assert dates == ['2016-11-03 00:00:00', '2016-11-02 00:00:00']
+
+        r = self.test_app.get('/api/1/revisions', query_string={'cursor': 'nonsense'}, headers=self.headers)
+        assert r.status_code == 400
+
+    def _setup_one_two_revisions(self, config=None):
         account_type_result = AccountType.query.filter(AccountType.name == 'AWS').first()
         if not account_type_result:
             account_type_result = AccountType(name='AWS')
@@ -48,14 +77,14 @@ class ItemApiTestCase(SecurityMonkeyApiTestCase):
         account = Account(identifier="012345678910", name="testing",
                           account_type_id=account_type_result.id)
 
+        self.now = datetime(2016, 11, 3)
+        self.yesterday = self.now - timedelta(days=1)
+
         technology = Technology(name="iamrole")
         item = Item(region="us-west-2", name="testrole",
                     arn=ARN_PREFIX + ":iam::012345678910:role/testrole", technology=technology,
-                    account=account)
-
-        self.now = datetime(2016, 11, 3)
-        self.yesterday = self.now - timedelta(days=1)
-        item.revisions.append(ItemRevision(active=True, config={}, date_created=self.now))
+                    account=account, first_seen=self.yesterday)
+        item.revisions.append(ItemRevision(active=True, config=config or {}, date_created=self.now))
         item.revisions.append(ItemRevision(active=True, config={}, date_created=self.yesterday))
 
         db.session.add(account)
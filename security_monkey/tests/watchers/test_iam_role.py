@@ -26,7 +26,7 @@ from moto import mock_sts
 from security_monkey.datastore import Account, Technology, ExceptionLogs, AccountType
 from security_monkey.tests import SecurityMonkeyTestCase, db
 from security_monkey.watchers.iam.iam_role import IAMRole
-from security_monkey import ARN_PREFIX
+from security_monkey import ARN_PREFIX, app
 
 class IAMRoleTestCase(SecurityMonkeyTestCase):
     def pre_test_setup(self):
@@ -160,3 +160,25 @@ class IAMRoleTestCase(SecurityMonkeyTestCase):
         assert len(items) == 0
 
         mock_sts().stop()
+
+    def test_slurp_items_in_parallel(self):
+        mock_sts().start()
+
+        watcher = IAMRole(accounts=[self.account.name])
+        watcher.batched_size = 10
+        watcher.slurp_list()
+        watcher.get_method = lambda item, **kwargs: dict(item)
+
+        old_threads = app.config.get('SLURP_BATCH_MAX_THREADS')
+        app.config['SLURP_BATCH_MAX_THREADS'] = 4
+        try:
+            for batch in range(0, 2):
+                items, exceptions = watcher.slurp()
+                assert len(exceptions) == 0
+                assert [item.name for item in items] == \
+                    [role['RoleName'] for role in watcher.total_list[batch * 10:(batch + 1) * 10]]
+                assert watcher.batch_counter == batch + 1
+        finally:
+            app.config['SLURP_BATCH_MAX_THREADS'] = old_threads
+
+        mock_sts().stop()
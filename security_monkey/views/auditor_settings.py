@@ -1,5 +1,5 @@
 from security_monkey.views import AuthenticatedService
-from security_monkey.datastore import Account, AuditorSettings, Technology, ItemAudit
+from security_monkey.datastore import Account, AuditorSettings, Technology, ItemAudit, update_item_scores
 from security_monkey.views import AUDITORSETTING_FIELDS
 from security_monkey import db, rbac
 
@@ -214,5 +214,7 @@ class AuditorSettingsPut(AuthenticatedService):
         results = AuditorSettings.query.get(as_id)
         results.disabled = disabled
         db.session.add(results)
+        item_ids = db.session.query(ItemAudit.item_id).filter(ItemAudit.auditor_setting_id == results.id).distinct()
+        update_item_scores([item_id for item_id, in item_ids])
         db.session.commit()
         return 200
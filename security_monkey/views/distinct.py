@@ -18,6 +18,8 @@ from security_monkey.datastore import Account
 from security_monkey.datastore import AccountType
 from security_monkey.datastore import Technology
 from security_monkey.datastore import ItemRevision
+from security_monkey.common.pagination import InvalidCursor, add_pagination_arguments, paginate, \
+    pop_pagination_arguments
 from security_monkey import rbac
 
 from flask_restful import reqparse
@@ -57,11 +59,13 @@ class Distinct(AuthenticatedService):
                 Vary: Accept
                 Content-Type: application/json
 
+            The values are sorted.  Pass ``cursor`` to page by cursor, as with /api/1/items.
+
             :statuscode 200: no error
+            :statuscode 400: Invalid cursor
         """
 
-        self.reqparse.add_argument('count', type=int, default=30, location='args')
-        self.reqparse.add_argument('page', type=int, default=1, location='args')
+        add_pagination_arguments(self.reqparse)
         self.reqparse.add_argument('select2', type=str, default="", location='args')
         self.reqparse.add_argument('searchconfig', type=str, default="", location='args')
 
@@ -73,8 +77,7 @@ class Distinct(AuthenticatedService):
         self.reqparse.add_argument('active', type=str, default=None, location='args')
 
         args = self.reqparse.parse_args()
-        page = args.pop('page', None)
-        count = args.pop('count', None)
+        pagination = pop_pagination_arguments(args)
         q = args.pop('searchconfig', "").lower()
         select2 = args.pop('select2', "")
         for k, v in args.items():
@@ -116,6 +119,7 @@ class Distinct(AuthenticatedService):
 
         if key_id == 'tech':
             query = query.join((Technology, Technology.id == Item.tech_id))
+            distinct_key = Technology.name
             if select2:
                 query = query.distinct(Technology.name).filter(func.lower(Technology.name).like('%' + q + '%'))
             else:
@@ -123,12 +127,14 @@ class Distinct(AuthenticatedService):
         elif key_id == 'accounttype':
             query = query.join((Account, Account.id == Item.account_id)).join(
                 (AccountType, AccountType.id == Account.account_type_id))
+            distinct_key = AccountType.name
             if select2:
                 query = query.distinct(AccountType.name).filter(func.lower(AccountType.name).like('%' + q + '%'))
             else:
                 query = query.distinct(AccountType.name)
         elif key_id == 'account':
             query = query.join((Account, Account.id == Item.account_id))
+            distinct_key = Account.name
             if select2:
                 query = query.filter(Account.third_party == False)
                 query = query.distinct(Account.name).filter(func.lower(Account.name).like('%' + q + '%'))
@@ -145,13 +151,18 @@ class Distinct(AuthenticatedService):
                 filter_by = Item.arn
             else:
                 return json.loads('{ "error": "Supply key in type,region,account,name,arn" }')
+            distinct_key = filter_by
 
             if select2:
                 query = query.distinct(filter_by).filter(func.lower(filter_by).like('%' + q + '%'))
             else:
                 query = query.distinct(filter_by)
 
-        items = query.paginate(page, count, error_out=False)
+        # DISTINCT ON keeps the first row for each value, so the value must lead the ORDER BY:
+        try:
+            items = paginate(query, pagination, [(distinct_key, False)], error_out=False)
+        except InvalidCursor:
+            return {"Error": "Invalid cursor"}, 400
 
         marshaled_dict = {}
         list_distinct = []
@@ -183,5 +194,7 @@ class Distinct(AuthenticatedService):
         marshaled_dict['items'] = list_distinct
         marshaled_dict['page'] = items.page
         marshaled_dict['total'] = items.total
+        if pagination['cursor'] is not None:
+            marshaled_dict['next'] = items.next_cursor
         marshaled_dict['key_id'] = key_id
         return marshaled_dict, 200
@@ -10,10 +10,13 @@
 import datetime
 
 from flask import jsonify, request
+from sqlalchemy import and_, desc, exists, false, func
 from security_monkey import db, rbac
 from security_monkey.views import AuthenticatedService
+from security_monkey.common.port_probes import store_port_probe
 from security_monkey.datastore import (
     GuardDutyEvent,
+    GuardDutyPortProbe,
     Item,
     ItemAudit,
     Account,
@@ -21,7 +24,7 @@ from security_monkey.datastore import (
     Technology,
     AuditorSettings,
     Datastore,
-    ItemRevision)
+    update_item_scores)
 
 # Severity Levels for GuardDuty Findings
 # https://docs.aws.amazon.com/guardduty/latest/ug/guardduty_findings.html#guardduty_findings-severity
@@ -33,6 +36,42 @@ def sev_name(val):
     if 7.0 <= val <= 8.9:
         return 'High'
 
+
+def _has_open_issue():
+    """ Only the findings whose items have an issue that is neither justified nor fixed are shown. """
+    return exists().where(and_(ItemAudit.item_id == Item.id,
+                               func.coalesce(ItemAudit.justified, false()) == false(),
+                               func.coalesce(ItemAudit.fixed, false()) == false()))
+
+
+def _marshal_port_probe(probe, count):
+    return {
+        'item_id': probe.item_id,
+        'description': probe.description,
+        'severity': sev_name(probe.severity) if probe.severity is not None else None,
+        'region': probe.region,
+        'accountid': probe.account_identifier,
+        'probe_count': probe.probe_count,
+        'first_seen': probe.first_seen,
+        'last_seen': probe.last_seen,
+        'resource_type': probe.resource_type,
+        'instance_id': probe.instance_id,
+        'instance_name': probe.instance_name,
+        'lat': probe.lat,
+        'lon': probe.lon,
+        'localPort': probe.local_port,
+        'localPortName': probe.local_port_name,
+        'cityName': probe.city_name,
+        'countryName': probe.country_name,
+        'remoteIpV4': probe.remote_ip_v4,
+        'remoteOrgASN': probe.asn,
+        'remoteOrgASNOrg': probe.asn_org,
+        'remoteOrgISP': probe.isp,
+        'remoteOrg': probe.org,
+        'count': count
+    }
+
+
 # Returns a list of Map Circle Marker Points List
 class GuardDutyEventMapPointsList(AuthenticatedService):
     decorators = [rbac.allow(['View'], ["GET"])]
@@ -83,12 +122,12 @@ class GuardDutyEventMapPointsList(AuthenticatedService):
                                     "count": 1,
                                     "countryName": "Argentina",
                                     "lat": -38.0,
-                                    "localPort": 22.0,
+                                    "localPort": 22,
                                     "localPortName": "SSH",
                                     "lon": -57.55,
                                     "remoteIpV4": "186.62.51.117",
                                     "remoteOrg": "Telefonica de Argentina",
-                                    "remoteOrgASN": 22927.0,
+                                    "remoteOrgASN": "22927",
                                     "remoteOrgASNOrg": "Telefonica de Argentina",
                                     "remoteOrgISP": "Telefonica de Argentina"
                                 }
@@ -101,126 +140,27 @@ class GuardDutyEventMapPointsList(AuthenticatedService):
             :statuscode 401: Authentication Error. Please Login.
         """
 
-        # Reference query as provided by Rick
-        #     select
-        #   g.item_id,
-        #   g.config -> 'detail' -> 'service' -> 'action' -> 'portProbeAction' -> 'portProbeDetails' as "guarddutyjson"
-        # from item i
-        #   inner join itemaudit ia on i.id = ia.item_id
-        #   inner join guarddutyevent g ON i.id = g.item_id
-        # where coalesce(justified, FALSE) = FALSE
-        #   and coalesce(fixed, FALSE) = FALSE
-        #   and g.config -> 'detail' -> 'service' -> 'action' -> 'portProbeAction' -> 'portProbeDetails' is not NULL;
-        #     """
         self.reqparse.add_argument('accounts', type=str, default=None, location='args')
         args = self.reqparse.parse_args()
         for k, v in args.items():
             if not v:
                 del args[k]
 
-
-        # @pritam: 25 July, 2018
-        # With implementation of GuardDuty Data Injection using Custom Watcher, changing the source of GuardDutyEvent
-        # data for this query to ItemRevision Table
-        #            inner join itemrevision g ON i.id = g.item_id
-        # select g.item_id,
-        #            g.config -> 'Service' -> 'Action' -> 'PortProbeAction' -> 'PortProbeDetails' as "guarddutyjson"
-        #          from item i
-        #            inner join itemaudit ia on i.id = ia.item_id
-        #            inner join itemrevision g ON i.latest_revision_id = g.id
-        #          where coalesce(justified, FALSE) = FALSE
-        #            and coalesce(fixed, FALSE) = FALSE
-        #            and g.config -> 'Service' -> 'Action' -> 'PortProbeAction' -> 'PortProbeDetails' is not NULL;
-
-
-        # Adding following additonal output data fields for display details modal popup of Map
-        #        g.config -> 'Description' as "description",
-        #        g.config -> 'Severity' as "severity",
-        #        g.config -> 'Region' as "region",
-        #        g.config -> 'Service' -> 'Count' as "count",
-        #        g.config -> 'AccountId' as "accountid"
-
-
-        # Read more about filtering:
-        # https://docs.sqlalchemy.org/en/latest/orm/query.html
-        from sqlalchemy.sql.functions import coalesce
-        query = ItemRevision.query.with_entities(
-            ItemRevision.item_id,
-            ItemRevision.config[('Service', 'Action', 'PortProbeAction','PortProbeDetails')].label('portprobedetails'),
-            ItemRevision.config[('Description')].label('description'),
-            ItemRevision.config[('Severity')].label('severity'),
-            ItemRevision.config[('Region')].label('region'),
-            ItemRevision.config[('Service')].label('service'),
-            ItemRevision.config[('Resource')].label('resource'),
-            ItemRevision.config[('AccountId')].label('accountid'),
-            ) \
-            .join((Item, Item.latest_revision_id == ItemRevision.id), (ItemAudit, Item.id == ItemAudit.item_id)) \
-            .filter((coalesce(ItemAudit.justified, False) == False), (coalesce(ItemAudit.fixed, False) == False),
-                    (ItemRevision.config[
-                         ('Service', 'Action', 'PortProbeAction', 'PortProbeDetails')] != None))
+        # The port probes are extracted when the findings are stored (see common.port_probes).
+        # Each probe is counted with the others from the same location:
+        query = db.session.query(GuardDutyPortProbe, func.count(GuardDutyPortProbe.id).over(
+            partition_by=(GuardDutyPortProbe.lat, GuardDutyPortProbe.lon)).label('count'))
+        query = query.join((Item, Item.id == GuardDutyPortProbe.item_id))
+        query = query.filter(GuardDutyPortProbe.lat != None, GuardDutyPortProbe.lon != None)
+        query = query.filter(_has_open_issue())
 
         if 'accounts' in args:
             accounts = args['accounts'].split(',')
             query = query.join((Account, Account.id == Item.account_id))
             query = query.filter(Account.name.in_(accounts))
 
-        records = query.all()
-        items = []
-
-        def flatten_structure( rec):
-            result = dict(rec.__dict__)
-
-            if result.has_key('service'):
-                result.pop('service')
-            if result.has_key('resource'):
-                result.pop('resource')
-            if result.has_key('portprobedetails'):
-                result.pop('portprobedetails')
-
-            result.update(flatten_json(rec.portprobedetails[0]))
-            result['probe_count'] = rec.service['Count']
-            result['first_seen'] = rec.service['EventFirstSeen']
-            result['last_seen'] = rec.service['EventLastSeen']
-            result['resource_type'] = rec.resource['ResourceType']
-            result['instance_id'] = rec.resource['InstanceDetails']['InstanceId']
-
-            instance_tag_name = [k['Value'] for k in rec.resource['InstanceDetails']['Tags'] if k['Key']=='Name' ]
-            if instance_tag_name:
-                result['instance_name'] = instance_tag_name[0]
-            else:
-                result['instance_name'] = 'NA'
-
-            if result.has_key('_labels'):
-                result.pop('_labels')
-
-            # Convert Severity from float to Text
-            result['severity'] = sev_name(result['severity'])
-
-            return result
-
-        if len(records) > 0:
-            import pandas as pd
-            from ..flatten import flatten_json
-            flatten_records = (flatten_structure(record) for record in records)
-            fulldata_dataFrame = pd.DataFrame(flatten_records).rename(
-                columns={'RemoteIpDetails_GeoLocation_Lat': 'lat',
-                         'RemoteIpDetails_GeoLocation_Lon': 'lon',
-                         'LocalPortDetails_Port': 'localPort',
-                         'LocalPortDetails_portName': 'localPortName',
-                         'RemoteIpDetails_City_CityName': 'cityName',
-                         'RemoteIpDetails_Country_CountryName': 'countryName',
-                         'RemoteIpDetails_IpAddressV4': 'remoteIpV4',
-                         'RemoteIpDetails_Organization_Asn': 'remoteOrgASN',
-                         'RemoteIpDetails_Organization_AsnOrg': 'remoteOrgASNOrg',
-                         'RemoteIpDetails_Organization_Isp': 'remoteOrgISP',
-                         'RemoteIpDetails_Organization_Org': 'remoteOrg',
-                         'counts': 'count'})
-
-            # Removing drop duplicates as each Probe will probably have different info to be displayed in popup
-            mapdata_dataframe = fulldata_dataFrame.groupby(['lat', 'lon']).size().reset_index(name='count').merge(
-                fulldata_dataFrame, on=['lat', 'lon'], how='left')
-
-            items = mapdata_dataframe.to_dict('records')
+        query = query.order_by(GuardDutyPortProbe.lat, GuardDutyPortProbe.lon, GuardDutyPortProbe.id)
+        items = [_marshal_port_probe(probe, count) for probe, count in query]
 
         marshaled_dict = {
             'page': 1,
@@ -302,70 +242,20 @@ class GuardDutyEventTop10Countries(AuthenticatedService):
             if not v:
                 del args[k]
 
-        # Reference query as provided by Rick
-        #     select
-        #   g.item_id,
-        #   g.config -> 'detail' -> 'service' -> 'action' -> 'portProbeAction' -> 'portProbeDetails' as "guarddutyjson"
-        # from item i
-        #   inner join itemaudit ia on i.id = ia.item_id
-        #   inner join guarddutyevent g ON i.id = g.item_id
-        # where coalesce(justified, FALSE) = FALSE
-        #   and coalesce(fixed, FALSE) = FALSE
-        #   and g.config -> 'detail' -> 'service' -> 'action' -> 'portProbeAction' -> 'portProbeDetails' is not NULL;
-        #     """
-
-        # @pritam: 25 July, 2018
-        # With implementation of GuardDuty Data Injection using Custom Watcher, changing the source of GuardDutyEvent
-        # data for this query to ItemRevision Table
-        # select g.item_id,
-        #            g.config -> 'Service' -> 'Action' -> 'PortProbeAction' -> 'PortProbeDetails' as "guarddutyjson"
-        #          from item i
-        #            inner join itemaudit ia on i.id = ia.item_id
-        #            inner join itemrevision g ON i.latest_revision_id = g.id
-        #          where coalesce(justified, FALSE) = FALSE
-        #            and coalesce(fixed, FALSE) = FALSE
-        #            and g.config -> 'Service' -> 'Action' -> 'PortProbeAction' -> 'PortProbeDetails' is not NULL;
-
-        # Read more about filtering:
-        # https://docs.sqlalchemy.org/en/latest/orm/query.html
-        from sqlalchemy.sql.functions import coalesce
-        query = ItemRevision.query.with_entities(
-            ItemRevision.item_id, ItemRevision.config[('Service', 'Action', 'PortProbeAction',
-                                                           'PortProbeDetails')]) \
-            .join((Item, Item.latest_revision_id == ItemRevision.id), (ItemAudit, Item.id == ItemAudit.item_id)) \
-            .filter((coalesce(ItemAudit.justified, False) == False), (coalesce(ItemAudit.fixed, False) == False),
-                    (ItemRevision.config[
-                         ('Service', 'Action', 'PortProbeAction', 'PortProbeDetails')] != None))
+        query = db.session.query(GuardDutyPortProbe.country_name.label('countryName'),
+                                 func.count(GuardDutyPortProbe.id).label('count'))
+        query = query.join((Item, Item.id == GuardDutyPortProbe.item_id))
+        query = query.filter(GuardDutyPortProbe.country_name != None)
+        query = query.filter(_has_open_issue())
 
         if 'accounts' in args:
             accounts = args['accounts'].split(',')
             query = query.join((Account, Account.id == Item.account_id))
             query = query.filter(Account.name.in_(accounts))
 
-        records = query.all()
-        items = []
-
-        if len(records) > 0:
-            import pandas as pd
-            from ..flatten import flatten_json
-            flatten_records = (flatten_json(record[1][0]) for record in records)
-            fulldata_dataFrame = pd.DataFrame(flatten_records).rename(
-                columns={'RemoteIpDetails_GeoLocation_Lat': 'lat',
-                         'RemoteIpDetails_GeoLocation_Lon': 'lon',
-                         'LocalPortDetails_Port': 'localPort',
-                         'LocalPortDetails_portName': 'localPortName',
-                         'RemoteIpDetails_City_CityName': 'cityName',
-                         'RemoteIpDetails_Country_CountryName': 'countryName',
-                         'RemoteIpDetails_IpAddressV4': 'remoteIpV4',
-                         'RemoteIpDetails_Organization_Asn': 'remoteOrgASN',
-                         'RemoteIpDetails_Organization_AsnOrg': 'remoteOrgASNOrg',
-                         'RemoteIpDetails_Organization_Isp': 'remoteOrgISP',
-                         'RemoteIpDetails_Organization_Org': 'remoteOrg',
-                         'counts': 'count'})
-
-            # Sorting and Limiting the resultset to 10
-            items = fulldata_dataFrame.groupby(['countryName']).size().reset_index(
-                name='count').sort_values(['count'], ascending=False).head(10).to_dict('records')
+        query = query.group_by(GuardDutyPortProbe.country_name)
+        query = query.order_by(desc('count'), GuardDutyPortProbe.country_name).limit(10)
+        items = [dict(countryName=country_name, count=count) for country_name, count in query]
 
         marshaled_dict = {
             'page': 1,
@@ -439,6 +329,8 @@ class GuardDutyEventService(AuthenticatedService):
             auditor_setting_id=auditor_settings.id,
         )
         db.session.add(issue)
+        update_item_scores([item.id])
+        store_port_probe(item.id, config)
         db.session.commit()
         db.session.refresh(issue)
 
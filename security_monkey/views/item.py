@@ -23,11 +23,12 @@ from security_monkey.datastore import Account
 from security_monkey.datastore import AccountType
 from security_monkey.datastore import Technology
 from security_monkey.datastore import ItemRevision
+from security_monkey.common.config_search import searchconfig_filter
+from security_monkey.common.pagination import InvalidCursor, add_pagination_arguments, paginate, \
+    pop_pagination_arguments
 from security_monkey import rbac, AWS_DEFAULT_REGION
 
 from flask_restful import marshal, reqparse
-from sqlalchemy.sql.expression import cast
-from sqlalchemy import String
 from sqlalchemy.orm import joinedload
 
 
@@ -190,12 +191,16 @@ class ItemList(AuthenticatedService):
                     }
                 }
 
+            Pass ``cursor`` (empty for the first page) to page by cursor instead of by page number.
+            The response then has the ``next`` cursor, which is null on the last page, and only
+            has a ``total`` when ``total=true`` is passed.
+
             :statuscode 200: no error
+            :statuscode 400: Invalid cursor
             :statuscode 401: Authenciation Error. Please Login.
         """
 
-        self.reqparse.add_argument('count', type=int, default=30, location='args')
-        self.reqparse.add_argument('page', type=int, default=1, location='args')
+        add_pagination_arguments(self.reqparse)
         self.reqparse.add_argument('regions', type=str, default=None, location='args')
         self.reqparse.add_argument('accounts', type=str, default=None, location='args')
         self.reqparse.add_argument('accounttypes', type=str, default=None, location='args')
@@ -210,8 +215,7 @@ class ItemList(AuthenticatedService):
         self.reqparse.add_argument('min_unjustified_score', type=int, default=False, location='args')
         args = self.reqparse.parse_args()
 
-        page = args.pop('page', None)
-        count = args.pop('count', None)
+        pagination = pop_pagination_arguments(args)
         for k, v in args.items():
             if not v:
                 del args[k]
@@ -249,7 +253,7 @@ class ItemList(AuthenticatedService):
             query = query.filter(ItemRevision.active == active)
         if 'searchconfig' in args:
             searchconfig = args['searchconfig']
-            query = query.filter(cast(ItemRevision.config, String).ilike('%{}%'.format(searchconfig)))
+            query = query.filter(searchconfig_filter(searchconfig))
         if 'min_score' in args:
             min_score = args['min_score']
             query = query.filter(Item.score >= min_score)
@@ -262,15 +266,18 @@ class ItemList(AuthenticatedService):
         query = query.options(joinedload('account'))
         query = query.options(joinedload('technology'))
 
-        query = query.order_by(ItemRevision.date_created.desc())
-
-        items = query.paginate(page, count)
+        try:
+            items = paginate(query, pagination, [(ItemRevision.date_created, True), (Item.id, True)])
+        except InvalidCursor:
+            return {"Error": "Invalid cursor"}, 400
 
         marshaled_dict = {
             'page': items.page,
             'total': items.total,
             'auth': self.auth_dict
         }
+        if pagination['cursor'] is not None:
+            marshaled_dict['next'] = items.next_cursor
 
         marshaled_items = []
         for item in items.items:
@@ -289,10 +296,7 @@ class ItemList(AuthenticatedService):
                                           #'last_rev': item.revisions[0].config,
                                       }.items())
             else:
-                first_seen_query = ItemRevision.query.filter(
-                    ItemRevision.item_id == item.id
-                ).order_by(ItemRevision.date_created.asc())
-                first_seen = str(first_seen_query.first().date_created)
+                first_seen = str(item.first_seen)
                 last_seen = str(item.revisions.first().date_created)
                 active = item.revisions.first().active
                 item_marshaled = dict(item_marshaled.items() +
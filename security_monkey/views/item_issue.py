@@ -25,9 +25,12 @@ from security_monkey.datastore import AccountType
 from security_monkey.datastore import Technology
 from security_monkey.datastore import ItemRevision
 from security_monkey.datastore import AuditorSettings
+from security_monkey.common.pagination import InvalidCursor, add_pagination_arguments, paginate, \
+    pop_pagination_arguments
 from security_monkey import AWS_DEFAULT_REGION
 
 from flask_restful import marshal
+from sqlalchemy import false, func
 
 
 class ItemAuditList(AuthenticatedService):
@@ -83,12 +86,14 @@ class ItemAuditList(AuthenticatedService):
                     }
                 }
 
+             Pass ``cursor`` to page by cursor, as with /api/1/items.
+
              :statuscode 200: no error
+             :statuscode 400: Invalid cursor
              :statuscode 401: Authentication failure. Please login.
         """
 
-        self.reqparse.add_argument('count', type=int, default=30, location='args')
-        self.reqparse.add_argument('page', type=int, default=1, location='args')
+        add_pagination_arguments(self.reqparse)
         self.reqparse.add_argument('regions', type=str, default=None, location='args')
         self.reqparse.add_argument('accounts', type=str, default=None, location='args')
         self.reqparse.add_argument('accounttypes', type=str, default=None, location='args')
@@ -102,8 +107,7 @@ class ItemAuditList(AuthenticatedService):
         self.reqparse.add_argument('summary', type=str, default=None, location='args')
         args = self.reqparse.parse_args()
 
-        page = args.pop('page', None)
-        count = args.pop('count', None)
+        pagination = pop_pagination_arguments(args)
         for k, v in args.items():
             if not v:
                 del args[k]
@@ -152,19 +156,24 @@ class ItemAuditList(AuthenticatedService):
             query = query.filter(ItemAudit.justified == justified)
         if 'summary' in args:
             # Summary wants to order by oldest issues
-            # TODO: Add date_created column to ItemAudit, and have summary order by date_created
-            # Order by justified_date until date_created exists
-            query = query.order_by(ItemAudit.justified_date.asc())
+            sort_keys = [(ItemAudit.date_created, False), (ItemAudit.id, False)]
         else:
-            query = query.order_by(ItemAudit.justified, ItemAudit.score.desc())
+            sort_keys = [(func.coalesce(ItemAudit.justified, false()), False),
+                         (func.coalesce(ItemAudit.score, 0), True),
+                         (ItemAudit.id, True)]
 
-        issues = query.paginate(page, count)
+        try:
+            issues = paginate(query, pagination, sort_keys)
+        except InvalidCursor:
+            return {"Error": "Invalid cursor"}, 400
 
         marshaled_dict = {
             'page': issues.page,
             'total': issues.total,
             'auth': self.auth_dict
         }
+        if pagination['cursor'] is not None:
+            marshaled_dict['next'] = issues.next_cursor
 
         items_marshaled = []
         for issue in issues.items:
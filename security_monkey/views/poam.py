@@ -8,9 +8,11 @@
 """
 from sqlalchemy.orm import joinedload, aliased, load_only, defer
 
-from security_monkey import db, rbac
+from security_monkey import rbac
 from security_monkey.views import AuthenticatedService
-from security_monkey.datastore import Item, ItemAudit, Account, Technology, ItemRevision
+from security_monkey.datastore import Item, ItemAudit, Account, Technology
+from security_monkey.common.pagination import InvalidCursor, add_pagination_arguments, paginate, \
+    pop_pagination_arguments
 from sqlalchemy import func, text, null as sqlnull, false, between
 
 
@@ -73,13 +75,16 @@ class POAMItemList(AuthenticatedService):
                     }
                 }
 
+            Pass ``cursor`` to page by cursor, as with /api/1/items.
+
             :statuscode 200: no error
+            :statuscode 400: Invalid cursor
             :statuscode 401: Authentication Error. Please Login.
         """
 
         # SQL Query base for implementation
         # select
-        #     distinct concat('sa_poam-', ia.id) as "poam_id",
+        #     concat('sa_poam-', ia.id) as "poam_id",
         #         i.id as "item_id",
         #         acc.name as "account",
         #         t.name as "control",
@@ -88,7 +93,7 @@ class POAMItemList(AuthenticatedService):
         #             ia.notes, ', ', i.region, ', ', i.name
         #         ) as "weakness_description",
         #         ia.score,
-        #         ir.create_date,
+        #         i.first_seen as "create_date",
         #         ia.action_instructions as "poam_comments"
         #     from
         #         item i
@@ -98,15 +103,6 @@ class POAMItemList(AuthenticatedService):
         #             or (p_account_id is null)
         #         )
         #         inner join technology t ON i.tech_id = t.id
-        #         inner join (
-        #             select
-        #                 item_id,
-        #                 min(date_created) as "create_date"
-        #             from
-        #                 itemrevision
-        #             group by
-        #                 item_id
-        #         ) ir on i.id = ir.item_id
         #         inner join account acc ON i.account_id = acc.id
         #     where
         #         ia.justified = FALSE
@@ -114,18 +110,17 @@ class POAMItemList(AuthenticatedService):
         #         and i.arn is not null
         #         and ia.score > 1
         #     order by
-        #         ir.create_date asc,
-        #         ia.score desc
+        #         i.first_seen asc,
+        #         ia.score desc,
+        #         ia.id asc
 
         self.reqparse.add_argument('accounts', type=str, default=None, location='args')
-        self.reqparse.add_argument('count', type=int, default=10, location='args')
-        self.reqparse.add_argument('page', type=int, default=1, location='args')
+        add_pagination_arguments(self.reqparse, count=10)
         self.reqparse.add_argument('sev', type=str, default=None, location='args')
         self.reqparse.add_argument('tech', type=str, default=None, location='args')
 
         args = self.reqparse.parse_args()
-        page = args.pop('page', None)
-        count = args.pop('count', None)
+        pagination = pop_pagination_arguments(args)
         for k, v in args.items():
             if not v:
                 del args[k]
@@ -133,18 +128,8 @@ class POAMItemList(AuthenticatedService):
         # Read more about filtering:
         # https://docs.sqlalchemy.org/en/latest/orm/query.html
         query = Item.query.join((ItemAudit, Item.id == ItemAudit.item_id)) \
-            .options(load_only(Item.id)) \
-            .distinct()
+            .options(load_only(Item.id))
         query = query.join((Technology, Technology.id == Item.tech_id))
-
-        # Subquery on ItemRevision Table
-        itemrevision_subquery = db.session \
-            .query(ItemRevision, func.min(ItemRevision.date_created).label('create_date')) \
-            .options(load_only("item_id")) \
-            .group_by(ItemRevision.item_id) \
-            .subquery()
-
-        query = query.join(itemrevision_subquery, Item.id == itemrevision_subquery.c.item_id)
         query = query.join((Account, Account.id == Item.account_id))
 
         # Add Select Columns
@@ -155,7 +140,7 @@ class POAMItemList(AuthenticatedService):
             .add_column(ItemAudit.issue.label('weakness_name')) \
             .add_column(func.concat(ItemAudit.notes, ',', Item.region, ',', Item.name).label('weakness_description')) \
             .add_column(ItemAudit.score.label('score')) \
-            .add_column(itemrevision_subquery.c.create_date.label('create_date')) \
+            .add_column(Item.first_seen.label('create_date')) \
             .add_column(ItemAudit.action_instructions.label('poam_comments'))
 
         # Filters
@@ -184,22 +169,24 @@ class POAMItemList(AuthenticatedService):
 
 
 
-        # Order By
-        query = query.order_by(itemrevision_subquery.c.create_date)
-        query = query.order_by(ItemAudit.score.desc())
-
         # Eager load the joins
         query = query.options(joinedload('account'))
         query = query.options(joinedload('technology'))
 
-        # Paginate
-        items = query.paginate(page, count)
+        # Order By and Paginate
+        sort_keys = [(Item.first_seen, False), (ItemAudit.score, True), (ItemAudit.id, False)]
+        try:
+            items = paginate(query, pagination, sort_keys)
+        except InvalidCursor:
+            return {"Error": "Invalid cursor"}, 400
 
         marshaled_dict = {
             'page': items.page,
             'total': items.total,
             'auth': self.auth_dict
         }
+        if pagination['cursor'] is not None:
+            marshaled_dict['next'] = items.next_cursor
 
         marshaled_items = []
         for row in items.items:
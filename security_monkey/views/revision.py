@@ -24,11 +24,12 @@ from security_monkey.datastore import Technology
 from security_monkey.datastore import ItemRevision
 from security_monkey import rbac, AWS_DEFAULT_REGION
 from security_monkey.common.utils import sub_dict
+from security_monkey.common.config_search import searchconfig_filter
+from security_monkey.common.pagination import InvalidCursor, add_pagination_arguments, paginate, \
+    pop_pagination_arguments
 from collections import OrderedDict
 
 from flask_restful import marshal, reqparse
-from sqlalchemy.sql.expression import cast
-from sqlalchemy import String
 
 
 class RevisionGet(AuthenticatedService):
@@ -168,12 +169,14 @@ class RevisionList(AuthenticatedService):
                     }
                 }
 
+            Pass ``cursor`` to page by cursor, as with /api/1/items.
+
             :statuscode 200: no error
+            :statuscode 400: Invalid cursor
             :statuscode 401: Authentication Error. Please Login.
         """
 
-        self.reqparse.add_argument('count', type=int, default=30, location='args')
-        self.reqparse.add_argument('page', type=int, default=1, location='args')
+        add_pagination_arguments(self.reqparse)
         self.reqparse.add_argument('active', type=str, default=None, location='args')
         self.reqparse.add_argument('regions', type=str, default=None, location='args')
         self.reqparse.add_argument('accounts', type=str, default=None, location='args')
@@ -184,8 +187,7 @@ class RevisionList(AuthenticatedService):
         self.reqparse.add_argument('searchconfig', type=str, default=None, location='args')
         args = self.reqparse.parse_args()
 
-        page = args.pop('page', None)
-        count = args.pop('count', None)
+        pagination = pop_pagination_arguments(args)
         for k, v in args.items():
             if not v:
                 del args[k]
@@ -218,15 +220,19 @@ class RevisionList(AuthenticatedService):
             query = query.filter(ItemRevision.active == active)
         if 'searchconfig' in args:
             searchconfig = args['searchconfig']
-            query = query.filter(cast(ItemRevision.config, String).ilike('%{}%'.format(searchconfig)))
-        query = query.order_by(ItemRevision.date_created.desc())
-        revisions = query.paginate(page, count)
+            query = query.filter(searchconfig_filter(searchconfig))
+        try:
+            revisions = paginate(query, pagination, [(ItemRevision.date_created, True), (ItemRevision.id, True)])
+        except InvalidCursor:
+            return {"Error": "Invalid cursor"}, 400
 
         marshaled_dict = {
             'page': revisions.page,
             'total': revisions.total,
             'auth': self.auth_dict
         }
+        if pagination['cursor'] is not None:
+            marshaled_dict['next'] = revisions.next_cursor
 
         items_marshaled = []
         for revision in revisions.items:
@@ -8,21 +8,21 @@
 .. moduleauthor:: Patrick Kelley <pkelley@netflix.com> @monkeysecurity
 
 """
-from botocore.exceptions import ClientError
 
 from common.PolicyDiff import PolicyDiff
 from common.utils import sub_dict
 from security_monkey import app
 from security_monkey.datastore import Account, IgnoreListEntry, db
-from security_monkey.datastore import Technology, WatcherConfig, store_exception
+from security_monkey.datastore import Technology, WatcherConfig, WatcherCheckpoint, store_exception
 from security_monkey.common.jinja import get_jinja_env
+from security_monkey.common.rate_limiter import rate_limiter
+from security_monkey.common.sts_connect import get_connection_account
 from security_monkey.alerters.custom_alerter import report_watcher_changes
 
-from boto.exception import BotoServerError
-import time
-
 import datastore
+import datetime
 from copy import deepcopy
+import dateutil.parser
 import dpath.util
 from dpath.exceptions import PathNotFound
 
@@ -30,6 +30,27 @@ watcher_registry = {}
 abstract_classes = set(['Watcher', 'CloudAuxWatcher', 'CloudAuxBatchedWatcher'])
 
 
+def _encode_checkpoint(value):
+    """ List output can hold datetimes (IAM CreateDate, ...). Tag them so they survive the JSON column. """
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, dict):
+        return {k: _encode_checkpoint(v) for k, v in value.iteritems()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_checkpoint(v) for v in value]
+    return value
+
+
+def _decode_checkpoint(value):
+    if isinstance(value, dict):
+        if value.keys() == ['__datetime__']:
+            return dateutil.parser.parse(value['__datetime__'])
+        return {k: _decode_checkpoint(v) for k, v in value.iteritems()}
+    if isinstance(value, list):
+        return [_decode_checkpoint(v) for v in value]
+    return value
+
+
 class WatcherType(type):
     def __init__(cls, name, bases, attrs):
         super(WatcherType, cls).__init__(name, bases, attrs)
@@ -44,7 +65,6 @@ class Watcher(object):
     index = 'abstract'
     i_am_singular = 'Abstract'
     i_am_plural = 'Abstracts'
-    rate_limit_delay = 0
     ignore_list = []
     interval = 60    #in minutes
     active = True
@@ -68,7 +88,6 @@ class Watcher(object):
         self.changed_items = []
         self.ephemeral_items = []
         # TODO: grab these from DB, keyed on account
-        self.rate_limit_delay = 0
         self.honor_ephemerals = False
         self.ephemeral_paths = []
 
@@ -124,6 +143,59 @@ class Watcher(object):
         self.done_slurping = False
         self.batch_counter = 0
 
+    def _get_checkpoint(self):
+        return WatcherCheckpoint.query.filter(
+            WatcherCheckpoint.account_id == self.current_account[0].id,
+            WatcherCheckpoint.tech_id == self.technology.id).first()
+
+    def resume_from_checkpoint(self):
+        """
+        Should be run right after prep_for_batch_slurp. Restores the item list and batch counter that
+        an unfinished run saved for the current account and technology. Checkpoints older than
+        BATCH_CHECKPOINT_TTL seconds, or made with a different batch size, are thrown away.
+        :return: True if the watcher was restored and slurp_list doesn't need to list anything.
+        """
+        checkpoint = self._get_checkpoint()
+        if not checkpoint:
+            return False
+
+        ttl = datetime.timedelta(seconds=app.config.get('BATCH_CHECKPOINT_TTL', 86400))
+        if checkpoint.batched_size != self.batched_size or \
+                checkpoint.date_created + ttl < datetime.datetime.utcnow():
+            self.clear_checkpoint()
+            return False
+
+        self.total_list = _decode_checkpoint(checkpoint.total_list or [])
+        self.batch_counter = checkpoint.batch_counter
+        self.done_slurping = self.batch_counter * self.batched_size >= len(self.total_list)
+        app.logger.info("Resuming {technology}/{account} at batch #{batch} of {total} items.".format(
+            technology=self.index, account=self.current_account[0].name, batch=self.batch_counter + 1,
+            total=len(self.total_list)))
+        return True
+
+    def save_checkpoint(self):
+        """
+        Records the current batch counter for the account and technology. The item list is only
+        written when the checkpoint is first created, which is right after slurp_list.
+        """
+        checkpoint = self._get_checkpoint()
+        if not checkpoint:
+            checkpoint = WatcherCheckpoint(account_id=self.current_account[0].id, tech_id=self.technology.id,
+                                           total_list=_encode_checkpoint(self.total_list),
+                                           batched_size=self.batched_size)
+
+        checkpoint.batch_counter = self.batch_counter
+        checkpoint.date_updated = datetime.datetime.utcnow()
+        db.session.add(checkpoint)
+        db.session.commit()
+
+    def clear_checkpoint(self):
+        """ The run for the account and technology is complete; the next one must list everything again. """
+        WatcherCheckpoint.query.filter(
+            WatcherCheckpoint.account_id == self.current_account[0].id,
+            WatcherCheckpoint.tech_id == self.technology.id).delete(synchronize_session=False)
+        db.session.commit()
+
     def check_ignore_list(self, name):
         """
         See if the given item has a name flagging it to be ignored by security_monkey.
@@ -137,48 +209,35 @@ class Watcher(object):
 
         return False
 
+    def _rate_limit_key(self, awsfunc):
+        """
+        Builds the (account, region, service) key the shared rate limiter uses for awsfunc.
+        The region and service come from the boto3 client or boto connection awsfunc is bound to,
+        and the account is the one sts_connect made that connection for.
+        """
+        conn = getattr(awsfunc, '__self__', None)
+        service_model = getattr(getattr(conn, 'meta', None), 'service_model', None)
+        if service_model is not None:  # Botocore
+            service = service_model.service_name
+            region = conn.meta.region_name
+        elif conn is not None:  # Boto
+            service = type(conn).__name__
+            region = getattr(getattr(conn, 'region', None), 'name', None)
+        else:
+            service = self.index
+            region = None
+
+        account = get_connection_account(conn) if conn is not None else None
+        if account is None:
+            account = ','.join(self.account_identifiers)
+        return account, region, service
+
     def wrap_aws_rate_limited_call(self, awsfunc, *args, **nargs):
-        attempts = 0
-
-        def increase_delay():
-            if self.rate_limit_delay == 0:
-                self.rate_limit_delay = 1
-                app.logger.warn(('Being rate-limited by AWS. Increasing delay on tech {} ' +
-                                'in account {} from 0 to 1 second. Attempt {}')
-                                .format(self.index, self.accounts, attempts))
-            elif self.rate_limit_delay < 4:
-                self.rate_limit_delay = self.rate_limit_delay * 2
-                app.logger.warn(('Still being rate-limited by AWS. Increasing delay on tech {} ' +
-                                'in account {} to {} seconds. Attempt {}')
-                                .format(self.index, self.accounts, self.rate_limit_delay, attempts))
-            else:
-                app.logger.warn(('Still being rate-limited by AWS. Keeping delay on tech {} ' +
-                                'in account {} at {} seconds. Attempt {}')
-                                .format(self.index, self.accounts, self.rate_limit_delay, attempts))
-
-        while True:
-            attempts = attempts + 1
-            try:
-                if self.rate_limit_delay > 0:
-                    time.sleep(self.rate_limit_delay)
-
-                retval = awsfunc(*args, **nargs)
-
-                if self.rate_limit_delay > 0:
-                    app.logger.warn("Successfully Executed Rate-Limited Function. "
-                                    "Tech: {} Account: {}. Removing sleep period."
-                                    .format(self.index, self.accounts))
-                    self.rate_limit_delay = 0
-
-                return retval
-            except BotoServerError as e:  # Boto
-                if not e.error_code == 'Throttling':
-                    raise e
-                increase_delay()
-            except ClientError as e:  # Botocore
-                if not e.response["Error"]["Code"] == "Throttling":
-                    raise e
-                increase_delay()
+        """
+        Calls awsfunc through the process-wide rate limiter, which paces and retries
+        throttled calls for every watcher hitting the same account, region and service.
+        """
+        return rate_limiter.call(self._rate_limit_key(awsfunc), awsfunc, *args, **nargs)
 
     def created(self):
         """
@@ -313,6 +372,8 @@ class Watcher(object):
         item_locations = list(set(curr_map).intersection(set(prev_map)))
         item_locations = [item_location for item_location in item_locations if not self.location_in_exception_map(item_location, exception_map)]
 
+        from security_monkey.datastore_utils import hash_item
+        ephemeral_paths = self.ephemeral_paths if self.ephemerals_skipped() else []
         for location in item_locations:
             prev_item = prev_map[location]
             curr_item = curr_map[location]
@@ -320,24 +381,31 @@ class Watcher(object):
             eph_change_item = None
             dur_change_item = None
 
+            # Identical hashes mean identical configs; only compare the configs when they differ.
+            # The previous item's hashes were stored with its latest revision:
+            try:
+                prev_complete_hash, prev_durable_hash = self._stored_hashes(prev_item, ephemeral_paths)
+                curr_complete_hash, curr_durable_hash = hash_item(curr_item.config, ephemeral_paths)
+            except (TypeError, ValueError):
+                # Not JSON serializable -- just compare everything:
+                prev_complete_hash = prev_durable_hash = None
+                curr_complete_hash = curr_durable_hash = False
+
+            if prev_complete_hash == curr_complete_hash:
+                continue
+
             if not sub_dict(prev_item.config) == sub_dict(curr_item.config):
                 eph_change_item = ChangeItem.from_items(old_item=prev_item, new_item=curr_item)
 
             if self.ephemerals_skipped():
-                # deepcopy configs before filtering
-                dur_prev_item = deepcopy(prev_item)
-                dur_curr_item = deepcopy(curr_item)
-                # filter-out ephemeral paths in both old and new config dicts
-                for path in self.ephemeral_paths:
-                    for cfg in [dur_prev_item.config, dur_curr_item.config]:
-                        try:
-                            dpath.util.delete(cfg, path, separator='$')
-                        except PathNotFound:
-                            pass
-
-                # now, compare only non-ephemeral paths
-                if not sub_dict(dur_prev_item.config) == sub_dict(dur_curr_item.config):
-                    dur_change_item = ChangeItem.from_items(old_item=dur_prev_item, new_item=dur_curr_item)
+                # filter-out ephemeral paths in both old and new config dicts, if anything durable changed
+                if prev_durable_hash != curr_durable_hash:
+                    dur_prev_item = self._without_ephemerals(prev_item)
+                    dur_curr_item = self._without_ephemerals(curr_item)
+
+                    # now, compare only non-ephemeral paths
+                    if not sub_dict(dur_prev_item.config) == sub_dict(dur_curr_item.config):
+                        dur_change_item = ChangeItem.from_items(old_item=dur_prev_item, new_item=dur_curr_item)
 
                 # store all changes, divided in specific categories
                 if eph_change_item:
@@ -352,6 +420,16 @@ class Watcher(object):
                 self.changed_items.append(eph_change_item)
                 app.logger.debug("%s: changes in item %s/%s/%s" % (self.i_am_singular, eph_change_item.account, eph_change_item.region, eph_change_item.name))
 
+    def _without_ephemerals(self, item):
+        """ Returns a copy of the item with the ephemeral paths removed from its config. """
+        durable_item = deepcopy(item)
+        for path in self.ephemeral_paths:
+            try:
+                dpath.util.delete(durable_item.config, path, separator='$')
+            except PathNotFound:
+                pass
+        return durable_item
+
     def find_changes(self, current=None, exception_map=None):
         """
         Identify changes between the configuration I have and what I had
@@ -376,13 +454,21 @@ class Watcher(object):
         # Given the list of items, find new items that don't yet exist:
         durable_items = []
 
-        from security_monkey.datastore_utils import hash_item, detect_change, persist_item
-        for item in items:
-            complete_hash, durable_hash = hash_item(item.config, self.ephemeral_paths)
+        from security_monkey.datastore_utils import hash_item, detect_change, detect_changes, BatchPersister
+        hashes = [hash_item(item.config, self.ephemeral_paths) for item in items]
+        changes = detect_changes(items, self.current_account[0], self.technology, hashes)
+        persister = BatchPersister(self.technology, self.current_account[0])
+
+        seen = set()
+        for item, (complete_hash, durable_hash), change in zip(items, hashes, changes):
+            is_change, change_type, db_item, created_changed = change
 
-            # Detect if a change occurred:
-            is_change, change_type, db_item, created_changed = detect_change(
-                item, self.current_account[0], self.technology, complete_hash, durable_hash)
+            # The same item listed twice in a batch -- compare it against the first copy:
+            if (item.name, item.region) in seen:
+                persister.commit()
+                is_change, change_type, db_item, created_changed = detect_change(
+                    item, self.current_account[0], self.technology, complete_hash, durable_hash)
+            seen.add((item.name, item.region))
 
             if not is_change:
                 continue
@@ -400,9 +486,9 @@ class Watcher(object):
                 db_item.config = db_item.revisions.first().config
                 self.changed_items.append(ChangeItem.from_items(old_item=db_item, new_item=item))
 
-            persist_item(item, db_item, self.technology, self.current_account[0], complete_hash,
-                         durable_hash, is_durable)
+            persister.add(item, db_item, complete_hash, durable_hash, is_durable)
 
+        persister.commit()
         return durable_items
 
     def find_deleted_batch(self, exception_map):
@@ -425,6 +511,18 @@ class Watcher(object):
             self.deleted_items.append(change_item)
 
 
+    def _stored_hashes(self, item, ephemeral_paths):
+        """
+        Returns the (complete, durable) hashes stored for a previous item by read_previous_items,
+        or hashes its config if they were never stored.
+        """
+        complete_hash = getattr(item, 'stored_complete_hash', None)
+        durable_hash = getattr(item, 'stored_durable_hash', None)
+        if complete_hash is None or (ephemeral_paths and durable_hash is None):
+            from security_monkey.datastore_utils import hash_item
+            return hash_item(item.config, ephemeral_paths)
+        return complete_hash, durable_hash if ephemeral_paths else complete_hash
+
     def read_previous_items(self):
         """
         Pulls the last-recorded configuration from the database.
@@ -441,6 +539,8 @@ class Watcher(object):
                                       account=item.account.name,
                                       name=item.name,
                                       new_config=item_revision.config)
+                new_item.stored_complete_hash = item.latest_revision_complete_hash
+                new_item.stored_durable_hash = item.latest_revision_durable_hash
                 prev_list.append(new_item)
 
         return prev_list
@@ -10,7 +10,8 @@
 from security_monkey.watcher import Watcher
 from security_monkey.watcher import ChangeItem
 from security_monkey.exceptions import BotoConnectionIssue
-from security_monkey import app
+from security_monkey.common.port_probes import store_port_probe
+from security_monkey import app, db
 
 
 class GuardDuty(Watcher):
@@ -57,6 +58,16 @@ class GuardDuty(Watcher):
 
         return item_list, exception_map
 
+    def save(self):
+        """
+        Saves the new findings, then replaces the port probes of the ones that were saved.
+        """
+        super(GuardDuty, self).save()
+        for item in self.created_items + self.changed_items + self.deleted_items:
+            if getattr(item, 'db_item', None) is not None:
+                store_port_probe(item.db_item.id, item.new_config)
+        db.session.commit()
+
     """
     Get a list of all detector ids associated with the client
     """
@@ -61,6 +61,8 @@ class GitHubRepo(Watcher):
     def slurp_list(self):
         app.logger.debug("Preparing for GitHub repository listing...")
         self.prep_for_batch_slurp()
+        if self.resume_from_checkpoint():
+            return self.total_list, {}
 
         @record_exception(source="{index}-list-watcher".format(index=self.index))
         def fetch_repo_list(**kwargs):